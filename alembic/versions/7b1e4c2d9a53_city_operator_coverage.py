@@ -0,0 +1,48 @@
+"""City operator coverage summary table
+
+Revision ID: 7b1e4c2d9a53
+Revises: 240e7df557fc
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "7b1e4c2d9a53"
+down_revision = "240e7df557fc"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "city_operator_coverage",
+        sa.Column("city", sa.String(length=100), nullable=False),
+        sa.Column("operator", sa.String(length=50), nullable=False),
+        sa.Column("2G", sa.Boolean(), nullable=True),
+        sa.Column("3G", sa.Boolean(), nullable=True),
+        sa.Column("4G", sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["city"],
+            ["city.name"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["operator"],
+            ["operator.name"],
+        ),
+        sa.PrimaryKeyConstraint("city", "operator"),
+    )
+    op.execute(
+        """
+        INSERT INTO city_operator_coverage (city, operator, "2G", "3G", "4G")
+        SELECT city, operator, bool_or("2G"), bool_or("3G"), bool_or("4G")
+        FROM network_coverage
+        WHERE city IS NOT NULL AND operator IS NOT NULL
+        GROUP BY city, operator
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("city_operator_coverage")
@@ -0,0 +1,28 @@
+"""Ingest job states, shared by every api worker
+
+Revision ID: a9c3e5f71d28
+Revises: d4a7c1e9f306
+Create Date: 2026-10-18 23:48:19.270561
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "a9c3e5f71d28"
+down_revision = "d4a7c1e9f306"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ingest_job",
+        sa.Column("id", sa.String(length=32), nullable=False),
+        sa.Column("state", sa.JSON(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("ingest_job")
@@ -0,0 +1,29 @@
+"""Dataset version, polled by the api workers
+
+Revision ID: b2e8f4a6c913
+Revises: f7c3d9a2b514
+Create Date: 2026-10-18 21:07:36.512904
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "b2e8f4a6c913"
+down_revision = "f7c3d9a2b514"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    table = op.create_table(
+        "dataset_version",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.bulk_insert(table, [{"id": 1, "version": 0}])
+
+
+def downgrade() -> None:
+    op.drop_table("dataset_version")
@@ -0,0 +1,44 @@
+"""Antenna sites with lambert93 coordinates
+
+Revision ID: c3f58a1e6b20
+Revises: 7b1e4c2d9a53
+Create Date: 2026-10-18 11:47:05.902113
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "c3f58a1e6b20"
+down_revision = "7b1e4c2d9a53"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Coordinates were not kept so far: antennas are filled by the next ingest
+    op.create_table(
+        "antenna",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("operator", sa.String(length=50), nullable=False),
+        sa.Column("city", sa.String(length=100), nullable=True),
+        sa.Column("x", sa.Float(), nullable=False),
+        sa.Column("y", sa.Float(), nullable=False),
+        sa.Column("2G", sa.Boolean(), nullable=True),
+        sa.Column("3G", sa.Boolean(), nullable=True),
+        sa.Column("4G", sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["city"],
+            ["city.name"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["operator"],
+            ["operator.name"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("operator", "x", "y", "2G", "3G", "4G"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("antenna")
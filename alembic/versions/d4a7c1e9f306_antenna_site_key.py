@@ -0,0 +1,36 @@
+"""Antenna sites unique on operator and position, networks updated in place
+
+Revision ID: d4a7c1e9f306
+Revises: b2e8f4a6c913
+Create Date: 2026-10-18 23:12:05.803417
+
+"""
+from alembic import op
+
+revision = "d4a7c1e9f306"
+down_revision = "b2e8f4a6c913"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # a site ingested again with other networks was a new row: keep the last one
+    op.execute(
+        "DELETE FROM antenna USING antenna AS newer "
+        "WHERE antenna.operator_id = newer.operator_id "
+        "AND antenna.x = newer.x AND antenna.y = newer.y "
+        "AND antenna.id < newer.id"
+    )
+    op.drop_constraint("antenna_operator_id_x_y_2G_3G_4G_key", "antenna")
+    op.create_unique_constraint(
+        "antenna_operator_id_x_y_key", "antenna", ["operator_id", "x", "y"]
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint("antenna_operator_id_x_y_key", "antenna")
+    op.create_unique_constraint(
+        "antenna_operator_id_x_y_2G_3G_4G_key",
+        "antenna",
+        ["operator_id", "x", "y", "2G", "3G", "4G"],
+    )
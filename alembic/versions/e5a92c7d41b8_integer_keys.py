@@ -0,0 +1,125 @@
+"""Integer surrogate keys for city and operator, lookup indexes
+
+Revision ID: e5a92c7d41b8
+Revises: c3f58a1e6b20
+Create Date: 2026-10-18 15:20:37.514092
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "e5a92c7d41b8"
+down_revision = "c3f58a1e6b20"
+branch_labels = None
+depends_on = None
+
+# tables referencing city and operator by name
+CHILD_TABLES = ("network_coverage", "city_operator_coverage", "antenna")
+PARENT_TABLES = {"city": "city", "operator": '"operator"'}
+
+
+def upgrade() -> None:
+    for parent, quoted in PARENT_TABLES.items():
+        op.execute(f"ALTER TABLE {quoted} ADD COLUMN id SERIAL")
+
+    # move the references by name to references by id, dropping the name
+    # columns drops their foreign keys and unique constraints too
+    for table in CHILD_TABLES:
+        for parent, quoted in PARENT_TABLES.items():
+            op.add_column(table, sa.Column(f"{parent}_id", sa.Integer()))
+            op.execute(
+                f"UPDATE {table} SET {parent}_id = {parent}.id "
+                f"FROM {quoted} AS {parent} WHERE {parent}.name = {table}.{parent}"
+            )
+            op.drop_column(table, parent)
+    # rows without city or operator were never served
+    op.execute(
+        "DELETE FROM network_coverage WHERE city_id IS NULL OR operator_id IS NULL"
+    )
+
+    for parent in PARENT_TABLES:
+        op.drop_constraint(f"{parent}_pkey", parent, type_="primary")
+        op.create_primary_key(f"{parent}_pkey", parent, ["id"])
+        op.create_unique_constraint(f"{parent}_name_key", parent, ["name"])
+    op.create_index("ix_operator_code", "operator", ["code"])
+
+    for table in CHILD_TABLES:
+        op.alter_column(table, "operator_id", nullable=False)
+        for parent in PARENT_TABLES:
+            op.create_foreign_key(
+                f"{table}_{parent}_id_fkey", table, parent, [f"{parent}_id"], ["id"]
+            )
+    op.alter_column("network_coverage", "city_id", nullable=False)
+    op.create_unique_constraint(
+        "network_coverage_city_id_operator_id_2G_3G_4G_key",
+        "network_coverage",
+        ["city_id", "operator_id", "2G", "3G", "4G"],
+    )
+    op.create_index(
+        "ix_network_coverage_operator_id", "network_coverage", ["operator_id"]
+    )
+    op.create_primary_key(
+        "city_operator_coverage_pkey",
+        "city_operator_coverage",
+        ["city_id", "operator_id"],
+    )
+    op.create_index(
+        "ix_city_operator_coverage_city_id",
+        "city_operator_coverage",
+        ["city_id"],
+        postgresql_include=["operator_id", "2G", "3G", "4G"],
+    )
+    op.create_unique_constraint(
+        "antenna_operator_id_x_y_2G_3G_4G_key",
+        "antenna",
+        ["operator_id", "x", "y", "2G", "3G", "4G"],
+    )
+    op.create_index("ix_antenna_city_id", "antenna", ["city_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_antenna_city_id", "antenna")
+    op.drop_index("ix_city_operator_coverage_city_id", "city_operator_coverage")
+    op.drop_index("ix_network_coverage_operator_id", "network_coverage")
+    op.drop_index("ix_operator_code", "operator")
+
+    for table in CHILD_TABLES:
+        for parent, quoted in PARENT_TABLES.items():
+            length = 100 if parent == "city" else 50
+            op.add_column(table, sa.Column(parent, sa.String(length=length)))
+            op.execute(
+                f"UPDATE {table} SET {parent} = {parent}.name "
+                f"FROM {quoted} AS {parent} WHERE {parent}.id = {table}.{parent}_id"
+            )
+            op.drop_column(table, f"{parent}_id")
+
+    for parent in PARENT_TABLES:
+        op.drop_constraint(f"{parent}_name_key", parent, type_="unique")
+        op.drop_constraint(f"{parent}_pkey", parent, type_="primary")
+        op.drop_column(parent, "id")
+        op.create_primary_key(f"{parent}_pkey", parent, ["name"])
+
+    for table in CHILD_TABLES:
+        for parent in PARENT_TABLES:
+            op.create_foreign_key(
+                f"{table}_{parent}_fkey", table, parent, [parent], ["name"]
+            )
+    op.alter_column("antenna", "operator", nullable=False)
+    op.create_unique_constraint(
+        "network_coverage_city_operator_2G_3G_4G_key",
+        "network_coverage",
+        ["city", "operator", "2G", "3G", "4G"],
+    )
+    op.alter_column("city_operator_coverage", "city", nullable=False)
+    op.alter_column("city_operator_coverage", "operator", nullable=False)
+    op.create_primary_key(
+        "city_operator_coverage_pkey",
+        "city_operator_coverage",
+        ["city", "operator"],
+    )
+    op.create_unique_constraint(
+        "antenna_operator_x_y_2G_3G_4G_key",
+        "antenna",
+        ["operator", "x", "y", "2G", "3G", "4G"],
+    )
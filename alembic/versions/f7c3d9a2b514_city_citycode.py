@@ -0,0 +1,43 @@
+"""INSEE citycode on city, names kept for display
+
+Revision ID: f7c3d9a2b514
+Revises: e5a92c7d41b8
+Create Date: 2026-10-18 18:42:11.208734
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+revision = "f7c3d9a2b514"
+down_revision = "e5a92c7d41b8"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # existing cities get their citycode on the next ingest (crud.claim_cities)
+    op.add_column("city", sa.Column("code", sa.String(length=5)))
+    op.create_unique_constraint("city_code_key", "city", ["code"])
+    # homonym communes share a name
+    op.drop_constraint("city_name_key", "city", type_="unique")
+    op.create_index("ix_city_name", "city", ["name"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_city_name", "city")
+    # names are unique again: homonyms of a first city are dropped, with their rows
+    for table in ("network_coverage", "city_operator_coverage", "antenna"):
+        op.execute(
+            f"DELETE FROM {table} WHERE city_id IN ("
+            "SELECT id FROM city AS homonym WHERE EXISTS ("
+            "SELECT 1 FROM city WHERE city.name = homonym.name "
+            "AND city.id < homonym.id))"
+        )
+    op.execute(
+        "DELETE FROM city AS homonym WHERE EXISTS ("
+        "SELECT 1 FROM city WHERE city.name = homonym.name AND city.id < homonym.id)"
+    )
+    op.create_unique_constraint("city_name_key", "city", ["name"])
+    op.drop_constraint("city_code_key", "city", type_="unique")
+    op.drop_column("city", "code")
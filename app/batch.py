@@ -0,0 +1,212 @@
+"""
+Batch Module
+
+Network coverage of many adresses: adresses are geocoded concurrently,
+coverages are fetched for the newly resolved cities with one call at most
+every interval seconds, a geocoded adress waiting at most interval seconds,
+and results are streamed as NDJSON lines as soon as they are ready
+"""
+import asyncio
+import csv
+import io
+import json
+import time
+
+from app.cache import normalize_address
+
+
+def parse_adresses(body, content_type, max_adresses):
+    """
+    Read adresses from a json list, a csv body (first column) or a text body
+    (one adress per line), with an optional "adress" header
+    :param body: request body
+    :param content_type: request content type
+    :param max_adresses: max number of adresses
+    :return: list of adresses
+    """
+    if "json" in content_type:
+        adresses = json.loads(body)
+        if not isinstance(adresses, list) or not all(
+            isinstance(adress, str) for adress in adresses
+        ):
+            raise ValueError("You must provide a list of adresses")
+    else:
+        text = body.decode("utf-8-sig")
+        if "csv" in content_type:
+            rows = csv.reader(io.StringIO(text))
+            adresses = [row[0] for row in rows if row and row[0].strip()]
+        else:
+            adresses = [line for line in text.splitlines() if line.strip()]
+        if adresses and adresses[0].strip().lower() == "adress":
+            adresses = adresses[1:]
+    if not adresses:
+        raise ValueError("At least one adress is required")
+    if len(adresses) > max_adresses:
+        raise ValueError(f"Too many adresses, max is {max_adresses}")
+    return adresses
+
+
+def to_line(adress, city, coverage, error=None):
+    """
+    NDJSON line of an adress result
+    :return: bytes
+    """
+    line = {"adress": adress, "city": city}
+    if error:
+        line["error"] = error
+    else:
+        line["coverage"] = coverage
+    return json.dumps(line, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+async def geocode_concurrently(adresses, geocode):
+    """
+    Geocode adresses concurrently, the concurrency is capped by the geocoder
+    :param adresses: adresses by key
+    :param geocode: async function, adress -> properties
+    :return: async iterator of lists of (key, properties or exception),
+     each list being the geocodes completed together
+    """
+    pending = {
+        asyncio.ensure_future(geocode(adress)): key for key, adress in adresses.items()
+    }
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            yield [
+                (
+                    pending.pop(task),
+                    task.exception() if task.exception() else task.result(),
+                )
+                for task in done
+            ]
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def geocode_in_bulk(adresses, search_csv):
+    """
+    Geocode adresses with a single bulk call
+    :param adresses: adresses by key
+    :param search_csv: async function, list of adresses -> list of properties
+    :return: async iterator of a single list of (key, properties or exception)
+    """
+    results = await search_csv(list(adresses.values()))
+    yield [
+        (key, properties or ValueError(f"No result found for adress: {adress}"))
+        for (key, adress), properties in zip(adresses.items(), results)
+    ]
+
+
+async def batch_waves(waves, interval, max_size):
+    """
+    Group geocoded waves: a group is released once max_size results are
+    waiting or at the latest interval seconds after the previous one,
+    without waiting for the next wave, and at the end
+    :param waves: async iterator of lists of (key, properties or exception)
+    :param interval: min seconds between two groups
+    :param max_size: number of results releasing a group at once
+    :return: async iterator of lists of (key, properties or exception)
+    """
+    batch = []
+    released_at = time.monotonic()
+    next_wave = asyncio.ensure_future(waves.__anext__())
+    try:
+        while True:
+            timeout = None
+            if batch:
+                timeout = max(interval - (time.monotonic() - released_at), 0)
+            done, _ = await asyncio.wait({next_wave}, timeout=timeout)
+            if done:
+                try:
+                    batch.extend(next_wave.result())
+                except StopAsyncIteration:
+                    break
+                next_wave = asyncio.ensure_future(waves.__anext__())
+            if batch and (
+                len(batch) >= max_size or time.monotonic() - released_at >= interval
+            ):
+                yield batch
+                batch = []
+                released_at = time.monotonic()
+    finally:
+        # stops the geocodes when the client goes away
+        next_wave.cancel()
+    if batch:
+        yield batch
+
+
+def describe(properties, city, coverages):
+    """
+    Result of a geocoded adress
+    :param properties: properties of the geocoder result, or its exception
+    :param city: (citycode, city) of the result, None on error
+    :param coverages: coverage by (citycode, city)
+    :return: city name, coverage, error
+    """
+    name = city[1] if city else None
+    if isinstance(properties, Exception):
+        error = str(properties) or repr(properties)
+    elif not any(city):
+        error = "This adress is not linked to a city"
+    elif coverages[city] is None:
+        error = f"This adress does not correspond to a city in db: city: {name}"
+    elif not coverages[city]:
+        error = f"No data found for city: {name}"
+    else:
+        error = None
+    return name, coverages.get(city), error
+
+
+async def fetch_coverages(results, coverages, get_coverages):
+    """
+    Fetch the coverage of the cities not fetched yet, with one call
+    :param results: list of (key, properties or exception)
+    :param coverages: coverage by (citycode, city), updated in place
+    :param get_coverages: async function,
+     (citycode, city) of cities -> coverage by (citycode, city)
+    :return: list of (key, city name, coverage, error)
+    """
+    cities = {
+        key: (properties.get("citycode"), properties.get("city"))
+        for key, properties in results
+        if not isinstance(properties, Exception)
+    }
+    new_cities = {city for city in cities.values() if any(city)} - coverages.keys()
+    if new_cities:
+        found = await get_coverages(new_cities)
+        coverages.update({city: found.get(city) for city in new_cities})
+    return [
+        (key, *describe(properties, cities.get(key), coverages))
+        for key, properties in results
+    ]
+
+
+async def coverage_batch(  # pylint: disable=R0913
+    adresses, geocoded, get_coverages, interval=0.2, max_size=1000
+):
+    """
+    Stream the network coverage of each adress
+    :param adresses: list of adresses
+    :param geocoded: function, adresses by key -> async iterator of geocoded waves,
+     geocode_concurrently or geocode_in_bulk
+    :param get_coverages: async function,
+     (citycode, city) of cities -> coverage by (citycode, city)
+    :param interval: min seconds between two coverage fetches
+    :param max_size: number of geocoded adresses fetched at once without waiting
+    :return: async iterator of NDJSON lines
+    """
+    # identical adresses are geocoded once
+    positions = {}
+    for adress in adresses:
+        positions.setdefault(normalize_address(adress), []).append(adress)
+    unique = {key: values[0] for key, values in positions.items()}
+
+    coverages = {}
+    async for results in batch_waves(geocoded(unique), interval, max_size):
+        for key, name, coverage, error in await fetch_coverages(
+            results, coverages, get_coverages
+        ):
+            for adress in positions[key]:
+                yield to_line(adress, name, coverage, error)
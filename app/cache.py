@@ -0,0 +1,272 @@
+"""
+Cache Module
+
+TTL + LRU cache with pluggable backends, used in front of the forward geocoder
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+
+load_dotenv()
+
+
+def normalize_address(adress):
+    """
+    Normalize an adress to be used as cache key:
+    lower case, no accents, no punctuation, single spaces
+    :param adress: Adress
+    :return: normalized adress
+    """
+    adress = unicodedata.normalize("NFKD", adress)
+    adress = "".join(char for char in adress if not unicodedata.combining(char))
+    return " ".join(re.sub(r"[^\w]+", " ", adress.lower()).split())
+
+
+class MemoryBackend:
+    """
+    In-process backend, evicting the least recently used entries
+    """
+
+    # reads and writes never wait on the disk
+    blocking = False
+
+    def __init__(self, max_size):
+        """
+        :param max_size: max number of entries
+        """
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """
+        :param key: key
+        :return: (value, expires_at) or None
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, expires_at):
+        """
+        :param key: key
+        :param value: value
+        :param expires_at: timestamp after which the entry is stale
+        """
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        """
+        :param key: key
+        """
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        """
+        Remove every entry
+        """
+        with self.lock:
+            self.entries.clear()
+
+
+class SqliteBackend:
+    """
+    On-disk backend surviving restarts, evicting the least recently used entries.
+    Values must be json serializable
+    """
+
+    # writes commit to disk, async callers run them in a threadpool
+    blocking = True
+
+    def __init__(self, path, max_size, touch_interval=60.0):
+        """
+        :param path: sqlite file
+        :param max_size: max number of entries
+        :param touch_interval: min seconds between two writes of the access time
+         of an entry, so that most hits are reads only
+        """
+        self.max_size = max_size
+        self.touch_interval = touch_interval
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT, expires_at REAL, accessed_at REAL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)"
+        )
+        self.connection.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT count(*) FROM cache").fetchone()[0]
+
+    def get(self, key):
+        """
+        :param key: key
+        :return: (value, expires_at) or None
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value, expires_at, accessed_at FROM cache WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[2] >= self.touch_interval:
+                self.connection.execute(
+                    "UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+                self.connection.commit()
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, expires_at):
+        """
+        :param key: key
+        :param value: json serializable value
+        :param expires_at: timestamp after which the entry is stale
+        """
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, time.time()),
+            )
+            self.connection.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache "
+                "ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_size,),
+            )
+            self.connection.commit()
+
+    def delete(self, key):
+        """
+        :param key: key
+        """
+        with self.lock:
+            self.connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self.connection.commit()
+
+    def clear(self):
+        """
+        Remove every entry
+        """
+        with self.lock:
+            self.connection.execute("DELETE FROM cache")
+            self.connection.commit()
+
+
+class TTLCache:
+    """
+    Cache with entries expiring after ttl seconds, and hit/miss counters
+    """
+
+    def __init__(self, backend, ttl):
+        """
+        :param backend: MemoryBackend or SqliteBackend
+        :param ttl: time to live (seconds) of an entry
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.backend)
+
+    def get(self, key):
+        """
+        :param key: key
+        :return: cached value, None when missing or expired
+        """
+        entry = self.backend.get(key)
+        if entry is not None and entry[1] < time.time():
+            self.backend.delete(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key, value):
+        """
+        :param key: key
+        :param value: value
+        """
+        self.backend.set(key, value, time.time() + self.ttl)
+
+    async def get_async(self, key):
+        """
+        get, off the event loop when the backend blocks
+        :param key: key
+        :return: cached value, None when missing or expired
+        """
+        if self.backend.blocking:
+            return await run_in_threadpool(self.get, key)
+        return self.get(key)
+
+    async def set_async(self, key, value):
+        """
+        set, off the event loop when the backend blocks
+        :param key: key
+        :param value: value
+        """
+        if self.backend.blocking:
+            await run_in_threadpool(self.set, key, value)
+        else:
+            self.set(key, value)
+
+    def clear(self):
+        """
+        Remove every entry
+        """
+        self.backend.clear()
+
+    def stats(self):
+        """
+        :return: hits, misses and size of the cache
+        """
+        return {"hits": self.hits, "misses": self.misses, "size": len(self)}
+
+
+def cache_from_env(prefix):
+    """
+    Build a cache from <prefix>_BACKEND (memory, sqlite or none), <prefix>_PATH,
+    <prefix>_TTL and <prefix>_MAX_SIZE env vars
+    :param prefix: env vars prefix
+    :return: TTLCache, None when disabled
+    """
+    backend = os.getenv(f"{prefix}_BACKEND", "memory")
+    max_size = int(os.getenv(f"{prefix}_MAX_SIZE", "10000"))
+    ttl = int(os.getenv(f"{prefix}_TTL", "86400"))
+    if backend == "none":
+        return None
+    if backend == "memory":
+        return TTLCache(MemoryBackend(max_size), ttl)
+    if backend == "sqlite":
+        path = os.getenv(f"{prefix}_PATH", f"{prefix.lower()}.sqlite")
+        return TTLCache(SqliteBackend(path, max_size), ttl)
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+
+geocoding_cache = cache_from_env("GEOCODING_CACHE")
@@ -0,0 +1,179 @@
+"""
+CLI Module
+
+Command line ingest of a local csv file, without going through the api:
+runs the same ingest as the api jobs (app.jobs.ingest_file), with a checkpoint
+written after each committed chunk, so that an interrupted ingest (crash while
+geocoding or loading) resumes after its last committed chunk instead of
+starting over.
+Also updates the coverage grid file with the antennas added since its last update.
+
+Usage: python -m app.cli ingest FILE [--workers N] [--chunk-size N]
+    [--database-url URL] [--checkpoint FILE] [--restart]
+       python -m app.cli grid FILE [--database-url URL] [--rebuild]
+"""
+import argparse
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.db import crud
+from app.db.database import engine_options
+from app.grid import update_grid_file
+from app.jobs import IngestProgress, ingest_file
+from app.log import logger
+
+load_dotenv()
+
+
+def file_identity(path, chunk_size):
+    """
+    What a checkpoint is valid for: the same file content, read by the same chunks
+    :param path: csv file
+    :param chunk_size: number of rows per chunk
+    :return: json structure
+    """
+    stat = os.stat(path)
+    return {
+        "file": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "chunk_size": chunk_size,
+    }
+
+
+def load_checkpoint(path, identity):
+    """
+    :param path: checkpoint file
+    :param identity: file_identity of the csv file being ingested
+    :return: save_to_db state to resume from, None when there is nothing to resume
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as file:
+        checkpoint = json.load(file)
+    if checkpoint["identity"] != identity:
+        logger.warning(f"Checkpoint {path} is for another file or chunk size, ignored")
+        return None
+    return checkpoint["state"]
+
+
+def save_checkpoint(path, identity, state):
+    """
+    Write the checkpoint atomically, a crash never leaves a partial one
+    :param path: checkpoint file
+    :param identity: file_identity of the csv file being ingested
+    :param state: save_to_db state
+    """
+    with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+        json.dump({"identity": identity, "state": state}, file)
+    os.replace(f"{path}.tmp", path)
+
+
+def use_database(url):
+    """
+    Point the ingest to another db than DB_STRING
+    :param url: db url
+    """
+    engine = create_engine(url, **engine_options(url))
+    if url.startswith("sqlite"):
+        engine = engine.execution_options(
+            schema_translate_map={os.getenv("SCHEMA"): None}
+        )
+    crud.engine = engine
+
+
+def ingest(path, chunk_size=None, workers=1, checkpoint=None, restart=False):
+    """
+    Ingest a csv file, resuming from its checkpoint when there is one
+    :param path: csv file
+    :param chunk_size: number of rows per chunk, INGEST_CHUNK_SIZE env var by default
+    :param workers: number of processes geocoding chunks
+    :param checkpoint: checkpoint file, next to the csv file by default
+    :param restart: ignore the checkpoint and start over
+    :return: ingest report
+    """
+    chunk_size = chunk_size or int(os.getenv("INGEST_CHUNK_SIZE", "10000"))
+    checkpoint = checkpoint or f"{path}.checkpoint.json"
+    identity = file_identity(path, chunk_size)
+    resume = None if restart else load_checkpoint(checkpoint, identity)
+    if resume:
+        logger.info(
+            f"Resuming {path} after chunk {resume['chunks'] - 1}, "
+            f"{resume['rows']} rows already saved"
+        )
+
+    progress = IngestProgress()
+    with open(path, "rb") as file:
+        report = ingest_file(
+            file,
+            progress,
+            chunk_size=chunk_size,
+            workers=workers,
+            resume=resume,
+            on_chunk=lambda state: save_checkpoint(checkpoint, identity, state),
+        )
+    logger.info(f"Seconds by stage: {progress.stage_seconds}")
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return report
+
+
+def main(argv=None):
+    """
+    Parse the command line and run the command
+    :param argv: arguments, sys.argv by default
+    """
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest_parser = commands.add_parser("ingest", help="Ingest a local csv file")
+    ingest_parser.add_argument("file", help="csv file, ; separated")
+    ingest_parser.add_argument(
+        "--workers", type=int, default=1, help="Processes geocoding chunks"
+    )
+    ingest_parser.add_argument(
+        "--chunk-size", type=int, help="Rows per chunk, INGEST_CHUNK_SIZE by default"
+    )
+    ingest_parser.add_argument("--database-url", help="Target db, DB_STRING by default")
+    ingest_parser.add_argument(
+        "--checkpoint", help="Checkpoint file, FILE.checkpoint.json by default"
+    )
+    ingest_parser.add_argument(
+        "--restart", action="store_true", help="Ignore the checkpoint, start over"
+    )
+    grid_parser = commands.add_parser(
+        "grid", help="Add the new antennas to a coverage grid file"
+    )
+    grid_parser.add_argument("file", help="Grid file, COVERAGE_GRID_FILE to serve it")
+    grid_parser.add_argument("--database-url", help="Source db, DB_STRING by default")
+    grid_parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Build the grid again from every antenna, once antennas were updated",
+    )
+    args = parser.parse_args(argv)
+
+    if args.database_url:
+        use_database(args.database_url)
+    if args.command == "grid":
+        with Session(crud.engine) as database:
+            grid = update_grid_file(args.file, database, rebuild=args.rebuild)
+        print(f"{args.file}: up to antenna {grid.antenna_id}")
+        return
+    report = ingest(
+        args.file,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        checkpoint=args.checkpoint,
+        restart=args.restart,
+    )
+    json.dump(report, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
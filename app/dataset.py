@@ -0,0 +1,105 @@
+"""
+Dataset Module
+
+Version of the data in db, shared by every api worker: each write (ingest,
+add/delete endpoints) bumps it, and each worker polls it to reload what it
+derived from the data (snapshot, antenna index, grid, cached responses),
+whichever worker or process wrote
+"""
+import asyncio
+import os
+import threading
+
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+
+from app.db import crud
+from app.db.database import SessionLocal
+from app.log import logger
+
+load_dotenv()
+
+
+class DatasetWatcher:
+    """
+    Last dataset version seen by the worker, and the listeners called
+    when it changes
+    """
+
+    def __init__(self, interval):
+        """
+        :param interval: seconds between two polls of the dataset version
+        """
+        self.interval = interval
+        self.version = None
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.task = None
+
+    def on_change(self, listener):
+        """
+        Register a listener, called with the new version in a worker thread
+        :param listener: callable
+        """
+        self.listeners.append(listener)
+
+    def check(self, database=None):
+        """
+        Read the dataset version, and call the listeners when it changed
+        since the last check. Blocking: run it in a threadpool from async code
+        :param database: db, a new session is used when not given
+        :return: dataset version
+        """
+        if database is None:
+            with SessionLocal() as session:
+                return self.check(session)
+        with self.lock:
+            version = crud.get_dataset_version(database)
+            if version != self.version:
+                logger.info(f"Dataset version {version}, was {self.version}")
+                self.version = version
+                for listener in self.listeners:
+                    try:
+                        listener(version)
+                    except Exception:  # pylint: disable=W0703
+                        logger.exception(f"Error when reloading dataset {version}")
+            return version
+
+    def bump(self, database):
+        """
+        Start a new dataset version after a write, and reload at once
+        :param database: db session, the write being committed
+        :return: dataset version
+        """
+        crud.bump_dataset_version(database)
+        database.commit()
+        return self.check(database)
+
+    async def watch(self):
+        """
+        Poll the dataset version every interval seconds
+        """
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await run_in_threadpool(self.check)
+            except Exception:  # pylint: disable=W0703
+                logger.exception("Error when polling the dataset version")
+
+    def start(self):
+        """
+        Start polling in the running event loop
+        """
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.watch())
+
+    def stop(self):
+        """
+        Stop polling
+        """
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+
+dataset_watcher = DatasetWatcher(float(os.getenv("DATASET_POLL_INTERVAL", "5")))
@@ -0,0 +1,123 @@
+"""
+Bulk Module
+
+Bulk loading of dataframes: COPY FROM STDIN through a staging table on
+PostgreSQL, executemany INSERT on other databases (sqlite for tests)
+"""
+import io
+
+from sqlalchemy.dialects import sqlite
+
+
+def bulk_insert(connection, table, dataframe):
+    """
+    Insert every row of the dataframe into the table
+    :param connection: db connection, inside a transaction
+    :param table: sqlalchemy Table
+    :param dataframe: dataframe, with cols named after the table columns
+    :return: number of inserted rows
+    """
+    if dataframe.empty:
+        return 0
+    if connection.dialect.name == "postgresql":
+        return copy_insert(connection, table, dataframe)
+    return executemany_insert(connection, table.insert(), dataframe)
+
+
+def bulk_upsert(connection, table, dataframe, index_elements=None, update_columns=()):
+    """
+    Insert the rows of the dataframe, rows conflicting with an existing one
+    are skipped (ON CONFLICT DO NOTHING), or update it when update_columns is given
+    :param connection: db connection, inside a transaction
+    :param table: sqlalchemy Table
+    :param dataframe: dataframe, with cols named after the table columns
+    :param index_elements: columns of the unique constraint, required to update
+    :param update_columns: columns updated on conflict
+    :return: number of inserted or updated rows
+    """
+    if dataframe.empty:
+        return 0
+    if update_columns and not index_elements:
+        raise ValueError("index_elements are required to update on conflict")
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        preparer = connection.dialect.identifier_preparer
+        if update_columns:
+            updates = ", ".join(
+                f"{preparer.quote(column)} = EXCLUDED.{preparer.quote(column)}"
+                for column in update_columns
+            )
+            changed = " OR ".join(
+                f"existing.{preparer.quote(column)} IS DISTINCT FROM "
+                f"EXCLUDED.{preparer.quote(column)}"
+                for column in update_columns
+            )
+            conflict = ", ".join(preparer.quote(column) for column in index_elements)
+            on_conflict = (
+                f"ON CONFLICT ({conflict}) DO UPDATE SET {updates} WHERE {changed}"
+            )
+        else:
+            on_conflict = "ON CONFLICT DO NOTHING"
+        return copy_insert(connection, table, dataframe, on_conflict=on_conflict)
+    if dialect != "sqlite":
+        raise ValueError(f"Upsert is not supported on {dialect}")
+    statement = sqlite.insert(table)
+    if update_columns:
+        statement = statement.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={column: statement.excluded[column] for column in update_columns},
+        )
+    else:
+        statement = statement.on_conflict_do_nothing()
+    return executemany_insert(connection, statement, dataframe)
+
+
+def executemany_insert(connection, statement, dataframe):
+    """
+    Insert the dataframe with a single executemany INSERT
+    :param connection: db connection, inside a transaction
+    :param statement: insert statement
+    :param dataframe: dataframe, with cols named after the table columns
+    :return: number of inserted rows
+    """
+    records = dataframe.astype(object).where(dataframe.notna(), None)
+    result = connection.execute(statement, records.to_dict("records"))
+    return result.rowcount
+
+
+def copy_insert(connection, table, dataframe, on_conflict=""):
+    """
+    Stream the dataframe into a temporary staging table with COPY FROM STDIN,
+    then merge the staging table into the real one
+    :param connection: db connection (psycopg2), inside a transaction
+    :param table: sqlalchemy Table
+    :param dataframe: dataframe, with cols named after the table columns
+    :param on_conflict: ON CONFLICT clause of the merge
+    :return: number of inserted rows
+    """
+    preparer = connection.dialect.identifier_preparer
+    target = preparer.format_table(table)
+    staging = preparer.quote(f"staging_{table.name}")
+    columns = ", ".join(preparer.quote(column) for column in dataframe.columns)
+
+    buffer = io.StringIO()
+    dataframe.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute(f"DROP TABLE IF EXISTS pg_temp.{staging}")
+        cursor.execute(
+            f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS "
+            f"SELECT {columns} FROM {target} WITH NO DATA"
+        )
+        cursor.copy_expert(
+            f"COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+        cursor.execute(
+            f"INSERT INTO {target} AS existing ({columns}) "
+            f"SELECT {columns} FROM {staging} {on_conflict}"
+        )
+        return cursor.rowcount
+    finally:
+        cursor.close()
@@ -1,20 +1,30 @@
 """
 Crud Module
 """
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
 from typing import Optional
 
 import sqlalchemy
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.db import models, schemas
+from app.db.bulk import bulk_upsert
 from app.db.database import db_add, db_delete, engine
-from app.utils import (add_city_to_dataframe, csv_to_dataframe, find_operator,
-                       logger)
+from app.log import logger
+from app.operators import get_operator_registry
 
 
 def get_operator(database: Session, code: str):
     """
-    Query the database to retrieve operator
+    Query the database to retrieve operator, through the code index.
+    Not served by the operator registry: it only maps mccmnc.json codes to
+    names, while callers need the db row (its id) and operators added through
+    the api may have other codes. The code index finds the row in one probe
     :param database: db
     :param code: Operator code
     :return: Operator
@@ -77,6 +87,16 @@ def get_cities(database: Session):
     return database.query(models.City).all()
 
 
+def get_city_by_code(database: Session, code: str):
+    """
+    Query the database to retrieve city by INSEE citycode
+    :param database: db
+    :param code: citycode
+    :return: City model
+    """
+    return database.query(models.City).filter(models.City.code == code).first()
+
+
 @db_add
 def create_city(database: Session, city: schemas.PydanticCity):  # pylint: disable=W0613
     """
@@ -85,7 +105,7 @@ def create_city(database: Session, city: schemas.PydanticCity):  # pylint: disab
     :param city: city
     :return: city model
     """
-    db_city = models.City(name=city.name)
+    db_city = models.City(name=city.name, code=city.code)
     return db_city
 
 
@@ -108,99 +128,855 @@ def get_coverage_network(database: Session, operator: Optional[str] = None, city
     :param city: city
     :return: Result set from db
     """
-    if not operator:
-        return (
-            database.query(models.NetworkCoverage)
-            .filter(
-                models.NetworkCoverage.city == city,
-            )
-            .all()
-        )
-    return (
+    query = (
         database.query(models.NetworkCoverage)
-        .filter(
-            models.NetworkCoverage.operator == operator,
-            models.NetworkCoverage.city == city,
+        .join(models.City)
+        .filter(models.City.name == city)
+    )
+    if operator:
+        query = query.join(models.Operator).filter(models.Operator.name == operator)
+    return query.all()
+
+
+def city_key():
+    """
+    Lookup key of a city: its INSEE citycode,
+    its name for the cities stored without one (added through the api)
+    :return: sql expression
+    """
+    return sqlalchemy.func.coalesce(models.City.code, models.City.name)
+
+
+def city_key_filter(keys):
+    """
+    Match cities by key, through the citycode and name indexes
+    :param keys: city keys
+    :return: sql condition
+    """
+    return sqlalchemy.or_(
+        models.City.code.in_(keys),
+        sqlalchemy.and_(models.City.code.is_(None), models.City.name.in_(keys)),
+    )
+
+
+def network_coverage_statement(cities, operator=None):
+    """
+    Select the aggregated coverage of cities, by city key and operator name
+    :param cities: city keys
+    :param operator: operator name (optionnal)
+    :return: select of (city key, operator, 2G, 3G, 4G)
+    """
+    summary = models.CityOperatorCoverage
+    statement = (
+        sqlalchemy.select(
+            city_key(),
+            models.Operator.name,
+            summary.two_g,
+            summary.three_g,
+            summary.four_g,
         )
-        .all()
+        .join(summary, summary.city_id == models.City.id)
+        .join(models.Operator, models.Operator.id == summary.operator_id)
+        .where(city_key_filter(cities))
     )
+    if operator:
+        statement = statement.where(models.Operator.name == operator)
+    return statement
 
 
-def get_network_coverage(database: Session, city: str):
+def coverage_by_city(rows, results=None):
     """
     Create return structure when retrieving network coverage
+    :param rows: rows of (city, operator, 2G, 3G, 4G)
+    :param results: json structure updated in place, a new one by default
+    :return: json structure, by city
+    """
+    results = {} if results is None else results
+    for city, operator, two_g, three_g, four_g in rows:
+        results.setdefault(city, {})[operator] = {
+            "2G": two_g,
+            "3G": three_g,
+            "4G": four_g,
+        }
+    return results
+
+
+def filter_coverage(coverage, operator=None, technology=None):
+    """
+    Keep an operator and / or a technology of a city coverage
+    :param coverage: json structure of a city
+    :param operator: operator name (optionnal)
+    :param technology: 2G, 3G or 4G (optionnal)
+    :return: json structure
+    """
+    if operator:
+        coverage = {name: value for name, value in coverage.items() if name == operator}
+    if technology:
+        coverage = {
+            name: {technology: value[technology]} for name, value in coverage.items()
+        }
+    return coverage
+
+
+def get_network_coverage(database: Session, city: str, operator=None, technology=None):
+    """
+    Create return structure when retrieving network coverage,
+    from the coverage aggregated by city and operator at ingest
     :param database: db
+    :param city: city key, see city_key
+    :param operator: operator name (optionnal)
+    :param technology: 2G, 3G or 4G (optionnal)
+    :return: json structure
+    """
+    rows = database.execute(network_coverage_statement([city], operator))
+    return filter_coverage(coverage_by_city(rows).get(city, {}), technology=technology)
+
+
+def get_network_coverage_by_cities(database: Session, cities):
+    """
+    Network coverage of many cities at once
+    :param database: db
+    :param cities: city keys, see city_key
+    :return: json structure of each city found, by city key
+    """
+    cities = list(cities)
+    results = {}
+    for start in range(0, len(cities), 1000):
+        rows = database.execute(
+            network_coverage_statement(cities[start : start + 1000])
+        )
+        coverage_by_city(rows, results)
+    return results
+
+
+def get_all_network_coverage(database: Session):
+    """
+    Query the whole aggregated coverage, one row per city and operator.
+    Cities without coverage come with a None operator
+    :param database: db
+    :return: Result set of (city key, operator, 2G, 3G, 4G)
+    """
+    summary = models.CityOperatorCoverage
+    return database.execute(
+        sqlalchemy.select(
+            city_key(),
+            models.Operator.name,
+            summary.two_g,
+            summary.three_g,
+            summary.four_g,
+        )
+        .outerjoin(summary, summary.city_id == models.City.id)
+        .outerjoin(models.Operator, models.Operator.id == summary.operator_id)
+    )
+
+
+def get_antennas(database: Session):
+    """
+    Query every antenna site
+    :param database: db
+    :return: Result set of (operator, x, y, 2G, 3G, 4G)
+    """
+    antenna = models.Antenna
+    return database.execute(
+        sqlalchemy.select(
+            models.Operator.name,
+            antenna.x,
+            antenna.y,
+            antenna.two_g,
+            antenna.three_g,
+            antenna.four_g,
+        ).join(models.Operator, models.Operator.id == antenna.operator_id)
+    )
+
+
+def get_antennas_after(database: Session, antenna_id=0):
+    """
+    Query the antenna sites added after an antenna.
+    A site whose networks change is updated in place and keeps its id:
+    what was built from the previous rows must be built again
+    :param database: db
+    :param antenna_id: last antenna id already read
+    :return: Result set of (id, operator, x, y, 2G, 3G, 4G), ordered by id
+    """
+    antenna = models.Antenna
+    return database.execute(
+        sqlalchemy.select(
+            antenna.id,
+            models.Operator.name,
+            antenna.x,
+            antenna.y,
+            antenna.two_g,
+            antenna.three_g,
+            antenna.four_g,
+        )
+        .join(models.Operator, models.Operator.id == antenna.operator_id)
+        .where(antenna.id > antenna_id)
+        .order_by(antenna.id)
+    )
+
+
+def get_last_antenna_id(database: Session):
+    """
+    :param database: db
+    :return: highest antenna id, 0 when there is no antenna
+    """
+    return (
+        database.execute(
+            sqlalchemy.select(sqlalchemy.func.max(models.Antenna.id))
+        ).scalar()
+        or 0
+    )
+
+
+def get_dataset_version(database: Session):
+    """
+    :param database: db
+    :return: version of the data in db, 0 before the first write
+    """
+    return (
+        database.execute(
+            sqlalchemy.select(models.DatasetVersion.version).where(
+                models.DatasetVersion.id == 1
+            )
+        ).scalar()
+        or 0
+    )
+
+
+def bump_dataset_version(connection):
+    """
+    Start a new dataset version, once data is written.
+    Every api worker drops its snapshot and cached responses on the next poll
+    :param connection: db connection or session, inside the writing transaction
+    """
+    table = models.DatasetVersion.__table__  # pylint: disable=E1101
+    updated = connection.execute(
+        sqlalchemy.update(table)
+        .where(table.c.id == 1)
+        .values(version=table.c.version + 1)
+    )
+    if not updated.rowcount:
+        connection.execute(sqlalchemy.insert(table).values(id=1, version=1))
+
+
+def keyset_page(statement, model, after=None, limit=None, after_id=None):
+    """
+    Order a select by name then id, through the name index, and keep the page
+    after a (name, id) cursor: homonym cities split across pages are neither
+    skipped nor repeated, and a page holds at most limit rows
+    :param statement: select
+    :param model: City or Operator
+    :param after: name of the last row of the previous page
+    :param after_id: id of the last row of the previous page,
+     every row named after is skipped when not given
+    :param limit: page size
+    :return: select
+    """
+    statement = statement.order_by(model.name, model.id)
+    if after is not None and after_id is not None:
+        statement = statement.where(
+            sqlalchemy.or_(
+                model.name > after,
+                sqlalchemy.and_(model.name == after, model.id > after_id),
+            )
+        )
+    elif after is not None:
+        statement = statement.where(model.name > after)
+    if limit is not None:
+        statement = statement.limit(limit)
+    return statement
+
+
+# Async reads, on an AsyncSession
+async def get_operator_async(database: AsyncSession, code: str):
+    """
+    Query the database to retrieve operator, see get_operator
+    :param database: async db
+    :param code: Operator code
+    :return: Operator
+    """
+    if not str(code).isdigit():
+        return None
+    # asyncpg binds parameters with their python type, codes are integers in db
+    result = await database.execute(
+        sqlalchemy.select(models.Operator).where(models.Operator.code == int(code))
+    )
+    return result.scalars().first()
+
+
+async def get_operators_async(
+    database: AsyncSession, after=None, limit=None, after_id=None
+):
+    """
+    Query the database to retrieve operators, by name
+    :param database: async db
+    :param after: name of the last operator of the previous page (keyset pagination)
+    :param limit: max number of operators
+    :param after_id: id of the last operator of the previous page
+    :return: Operators
+    """
+    result = await database.execute(
+        keyset_page(
+            sqlalchemy.select(models.Operator),
+            models.Operator,
+            after,
+            limit,
+            after_id=after_id,
+        )
+    )
+    return result.scalars().all()
+
+
+async def get_city_async(database: AsyncSession, city: str):
+    """
+    Query the database to retrieve city
+    :param database: async db
     :param city: city
+    :return: City model
+    """
+    result = await database.execute(
+        sqlalchemy.select(models.City).where(models.City.name == city)
+    )
+    return result.scalars().first()
+
+
+async def get_city_by_key_async(database: AsyncSession, key: str):
+    """
+    Query the database to retrieve city by key, see city_key
+    :param database: async db
+    :param key: citycode, or name of a city without citycode
+    :return: City model
+    """
+    result = await database.execute(
+        sqlalchemy.select(models.City).where(city_key_filter([key]))
+    )
+    return result.scalars().first()
+
+
+async def get_cities_async(
+    database: AsyncSession, after=None, limit=None, after_id=None
+):
+    """
+    Query the database to retrieve cities, by name
+    :param database: async db
+    :param after: name of the last city of the previous page (keyset pagination)
+    :param limit: max number of cities
+    :param after_id: id of the last city of the previous page
+    :return: Cities
+    """
+    result = await database.execute(
+        keyset_page(
+            sqlalchemy.select(models.City),
+            models.City,
+            after,
+            limit,
+            after_id=after_id,
+        )
+    )
+    return result.scalars().all()
+
+
+async def stream_rows_async(  # pylint: disable=R0913
+    database: AsyncSession,
+    model,
+    fields,
+    after=None,
+    limit=None,
+    size=1000,
+    after_id=None,
+):
+    """
+    Stream the rows of a table by name from a server-side cursor,
+    without loading them as orm objects
+    :param database: async db
+    :param model: City or Operator
+    :param fields: names of the columns streamed, the fields of the response schema
+    :param after: name of the last row of the previous page (keyset pagination)
+    :param limit: max number of rows
+    :param size: number of rows fetched at once
+    :param after_id: id of the last row of the previous page
+    :return: async iterator of lists of row dicts
+    """
+    columns = [
+        model.__table__.columns[name] for name in fields
+    ]  # pylint: disable=E1101
+    statement = keyset_page(
+        sqlalchemy.select(*columns), model, after, limit, after_id=after_id
+    )
+    result = await database.stream(statement)
+    async for rows in result.mappings().partitions(size):
+        yield [dict(row) for row in rows]
+
+
+async def get_network_coverage_async(
+    database: AsyncSession, city: str, operator=None, technology=None
+):
+    """
+    Network coverage of a city, see get_network_coverage
+    :param database: async db
+    :param city: city key, see city_key
+    :param operator: operator name (optionnal)
+    :param technology: 2G, 3G or 4G (optionnal)
     :return: json structure
     """
-    res = get_coverage_network(database=database, city=city)
+    rows = await database.execute(network_coverage_statement([city], operator))
+    return filter_coverage(coverage_by_city(rows).get(city, {}), technology=technology)
 
+
+async def get_network_coverage_by_cities_async(database: AsyncSession, cities):
+    """
+    Network coverage of many cities at once, see get_network_coverage_by_cities
+    :param database: async db
+    :param cities: city keys, see city_key
+    :return: json structure of each city found, by city key
+    """
+    cities = list(cities)
     results = {}
-    for elem in res:
-        if not results.get(elem.operator):
-            networks = {
-                "2G": elem.two_g,
-                "3G": elem.three_g,
-                "4G": elem.four_g,
-            }
-
-        else:
-            networks = {
-                "2G": elem.two_g or results.get(elem.operator).get("2G"),
-                "3G": elem.three_g or results.get(elem.operator).get("3G"),
-                "4G": elem.four_g or results.get(elem.operator).get("4G"),
-            }
-        results.update({elem.operator: networks})
+    for start in range(0, len(cities), 1000):
+        rows = await database.execute(
+            network_coverage_statement(cities[start : start + 1000])
+        )
+        coverage_by_city(rows, results)
     return results
 
 
-def save_to_db(file):
+def refresh_city_operator_coverage(connection, city_ids, batch_size=1000):
     """
-    Save data to db. Using dataframe.to_sql() to save multiple rows
-    :param file: csv file
-    :return: Boolean, just insert
+    Rebuild the aggregated coverage of the given cities from network_coverage
+    :param connection: db connection, inside a transaction
+    :param city_ids: ids of the cities to rebuild
+    :param batch_size: max number of cities per statement
     """
+    coverage = models.NetworkCoverage.__table__  # pylint: disable=E1101
+    summary = models.CityOperatorCoverage.__table__  # pylint: disable=E1101
+    city_ids = list(city_ids)
+    for start in range(0, len(city_ids), batch_size):
+        batch = city_ids[start : start + batch_size]
+        connection.execute(summary.delete().where(summary.c.city_id.in_(batch)))
+        connection.execute(
+            summary.insert().from_select(
+                ["city_id", "operator_id", "2G", "3G", "4G"],
+                sqlalchemy.select(
+                    coverage.c.city_id,
+                    coverage.c.operator_id,
+                    *(
+                        sqlalchemy.func.max(
+                            sqlalchemy.cast(coverage.c[network], sqlalchemy.Integer)
+                        )
+                        > 0
+                        for network in ("2G", "3G", "4G")
+                    ),
+                )
+                .where(coverage.c.city_id.in_(batch))
+                .group_by(coverage.c.city_id, coverage.c.operator_id),
+            )
+        )
 
-    try:
-        network_cov_df = csv_to_dataframe(file)
 
-        logger.info("Saving Cities")
-        network_cov_df = add_city_to_dataframe(network_cov_df)
-        city_df = network_cov_df[["city"]].drop_duplicates()
-        city_df.rename(columns={"city": "name"}, inplace=True)
-        city_df.to_sql(
-            "city", con=engine, if_exists="append", index=False, chunksize=1000
+def get_ids(connection, table, values, key="name"):
+    """
+    Query the ids of rows by a unique column
+    :param connection: db connection
+    :param table: city or operator Table
+    :param values: values of the column
+    :param key: column name
+    :return: dict of ids by value
+    """
+    values = list(values)
+    ids = {}
+    for start in range(0, len(values), 1000):
+        ids.update(
+            connection.execute(
+                sqlalchemy.select(table.c[key], table.c.id).where(
+                    table.c[key].in_(values[start : start + 1000])
+                )
+            ).all()
         )
+    return ids
 
-        logger.info("Saving Operators")
-        network_cov_df["operator"] = network_cov_df.apply(
-            lambda row: find_operator(int(row["Operateur"])), axis=1
+
+def claim_cities(connection, city_df):
+    """
+    Give their citycode to the cities stored by name only (before citycodes),
+    so that they are updated instead of duplicated.
+    A name shared by homonym communes is given to the first one
+    :param connection: db connection, inside a transaction
+    :param city_df: dataframe with code and name cols
+    """
+    table = models.City.__table__  # pylint: disable=E1101
+    names = city_df["name"].drop_duplicates().to_list()
+    unclaimed = set()
+    for start in range(0, len(names), 1000):
+        unclaimed.update(
+            connection.execute(
+                sqlalchemy.select(table.c.name).where(
+                    table.c.code.is_(None),
+                    table.c.name.in_(names[start : start + 1000]),
+                )
+            ).scalars()
         )
-        operator_df = network_cov_df[["operator", "Operateur"]].drop_duplicates()
-        operator_df.rename(
-            columns={"operator": "name", "Operateur": "code"}, inplace=True
+    for code, name in city_df[["code", "name"]].itertuples(index=False):
+        if name not in unclaimed:
+            continue
+        unclaimed.discard(name)
+        connection.execute(
+            table.update()
+            .where(table.c.name == name, table.c.code.is_(None))
+            .values(code=code)
         )
-        operator_df.to_sql(
-            "operator", con=engine, if_exists="append", index=False, chunksize=1000
+
+
+def with_ids(dataframe, city_ids, operator_ids):
+    """
+    Replace the citycodes and operator names of a dataframe by their ids
+    :param dataframe: dataframe with citycode and operator cols
+    :param city_ids: dict of city ids by citycode
+    :param operator_ids: dict of operator ids by name
+    :return: dataframe with city_id and operator_id cols first
+    """
+    others = [column for column in dataframe if column not in ("citycode", "operator")]
+    return dataframe.assign(
+        city_id=dataframe["citycode"].map(city_ids),
+        operator_id=dataframe["operator"].map(operator_ids),
+    )[["city_id", "operator_id", *others]]
+
+
+def key_columns(key):
+    """
+    :param key: column, or tuple of columns
+    :return: list of columns
+    """
+    return [key] if isinstance(key, str) else list(key)
+
+
+def get_existing_rows(connection, table, dataframe, key):
+    """
+    Query the rows of the table sharing a key value with the dataframe
+    :param connection: db connection
+    :param table: sqlalchemy Table
+    :param dataframe: dataframe, with cols named after the table columns
+    :param key: column, or tuple of columns, used to filter the table
+    :return: set of tuples, with the dataframe cols
+    """
+    columns = key_columns(key)
+    values = list(dataframe[columns].drop_duplicates().itertuples(index=False))
+    if len(columns) == 1:
+        values = [value[0] for value in values]
+        key_column = table.c[columns[0]]
+    else:
+        values = [tuple(value) for value in values]
+        key_column = sqlalchemy.tuple_(*(table.c[name] for name in columns))
+    rows = set()
+    for start in range(0, len(values), 1000):
+        rows.update(
+            tuple(row)
+            for row in connection.execute(
+                sqlalchemy.select(
+                    *(table.c[column] for column in dataframe.columns)
+                ).where(key_column.in_(values[start : start + 1000]))
+            )
         )
+    return rows
+
+
+def upsert_delta(connection, table, dataframe, key, update_columns=()):
+    """
+    Write the rows of the dataframe not already in the table
+    :param connection: db connection, inside a transaction
+    :param table: sqlalchemy Table
+    :param dataframe: dataframe, with cols named after the table columns
+    :param key: column, or tuple of columns, used to filter the existing rows,
+     also the conflict target when update_columns is given
+    :param update_columns: columns updated when the key exists with other values
+    :return: report of inserted, updated and skipped rows
+    """
+    columns = key_columns(key)
+    existing = get_existing_rows(connection, table, dataframe, key)
+    positions = [dataframe.columns.get_loc(column) for column in columns]
+    existing_keys = {tuple(row[i] for i in positions) for row in existing}
+    rows = list(dataframe.itertuples(index=False, name=None))
+    delta = dataframe[[row not in existing for row in rows]]
+    written = bulk_upsert(
+        connection,
+        table,
+        delta,
+        index_elements=columns if update_columns else None,
+        update_columns=update_columns,
+    )
+    updated = 0
+    if update_columns:
+        updated = sum(
+            row in existing_keys
+            for row in delta[columns].itertuples(index=False, name=None)
+        )
+    return {
+        "inserted": written - updated,
+        "updated": updated,
+        "skipped": len(dataframe) - written,
+    }
+
+
+def geocode_chunk(network_cov_df, stage=lambda name: None):
+    """
+    Project a chunk of the csv file and link each row to its city.
+    Needs no db, so chunks can be geocoded in worker processes
+    :param network_cov_df: chunk of the csv file
+    :param stage: called with the name of each stage when it starts
+    :return: number of rows of the chunk, geocoded chunk
+    """
+    # ingest stack (pandas, pyproj), only loaded by the processes ingesting
+    from app.utils import add_city_to_dataframe  # pylint: disable=C0415
+
+    stage("projection")
+    return len(network_cov_df), add_city_to_dataframe(network_cov_df, stage=stage)
+
+
+def geocode_chunks(chunks, workers=1, stage=lambda name: None):
+    """
+    Geocode chunks in order, in a pool of worker processes when workers > 1,
+    with at most workers chunks ahead of the one being loaded
+    :param chunks: iterable of chunks of the csv file
+    :param workers: number of worker processes
+    :param stage: called with the name of each stage when it starts
+    :return: iterator of (number of rows, geocoded chunk)
+    """
+    if workers <= 1:
+        for network_cov_df in chunks:
+            yield geocode_chunk(network_cov_df, stage=stage)
+        return
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context) as executor:
+        pending = deque()
+        for network_cov_df in chunks:
+            pending.append(executor.submit(geocode_chunk, network_cov_df))
+            if len(pending) > workers:
+                stage("geocoding")
+                yield pending.popleft().result()
+        while pending:
+            stage("geocoding")
+            yield pending.popleft().result()
 
+
+def resolve_operators(network_cov_df, report):
+    """
+    Name the operator of each row from its code, through the operator registry.
+    Rows of unknown operators are skipped
+    :param network_cov_df: chunk of the csv file
+    :param report: ingest report, unknown operator codes updated in place
+    :return: dataframe with an operator col
+    """
+    network_cov_df["operator"], unknown_operators = get_operator_registry().resolve(
+        network_cov_df["Operateur"]
+    )
+    if unknown_operators:
+        logger.warning(f"Rows with unknown operators skipped: {unknown_operators}")
+        report["unknown_operators"] = sorted(
+            set(report["unknown_operators"]).union(unknown_operators)
+        )
+        network_cov_df = network_cov_df.dropna(subset=["operator"])
+    return network_cov_df
+
+
+def save_cities(connection, city_df):
+    """
+    Write the cities of a chunk, by citycode
+    :param connection: db connection, inside a transaction
+    :param city_df: dataframe with code and name cols
+    :return: report of inserted, updated and skipped rows, dict of ids by citycode
+    """
+    table = models.City.__table__  # pylint: disable=E1101
+    claim_cities(connection, city_df)
+    counts = upsert_delta(connection, table, city_df, "code", update_columns=["name"])
+    return counts, get_ids(connection, table, city_df["code"], key="code")
+
+
+def save_operators(connection, network_cov_df):
+    """
+    Write the operators of a chunk, by name
+    :param connection: db connection, inside a transaction
+    :param network_cov_df: chunk of the csv file, with an operator col
+    :return: report of inserted, updated and skipped rows, dict of ids by name
+    """
+    table = models.Operator.__table__  # pylint: disable=E1101
+    operator_df = (
+        network_cov_df[["operator", "Operateur"]]
+        .drop_duplicates(subset="operator")
+        .rename(columns={"operator": "name", "Operateur": "code"})
+    )
+    counts = upsert_delta(
+        connection, table, operator_df, "name", update_columns=["code"]
+    )
+    return counts, get_ids(connection, table, operator_df["name"])
+
+
+def save_network_coverage(connection, network_cov_df, city_ids, operator_ids):
+    """
+    Write the network coverage rows of a chunk
+    :param connection: db connection, inside a transaction
+    :param network_cov_df: chunk of the csv file, with citycode and operator cols
+    :param city_ids: dict of city ids by citycode
+    :param operator_ids: dict of operator ids by name
+    :return: report of inserted, updated and skipped rows
+    """
+    network_coverage_df = (
+        network_cov_df[["operator", "citycode", "2G", "3G", "4G"]]
+        .drop_duplicates()
+        .astype({"2G": bool, "3G": bool, "4G": bool})
+    )
+    return upsert_delta(
+        connection,
+        models.NetworkCoverage.__table__,  # pylint: disable=E1101
+        with_ids(network_coverage_df, city_ids, operator_ids),
+        "city_id",
+    )
+
+
+def save_antennas(connection, network_cov_df, city_ids, operator_ids):
+    """
+    Write the antenna sites of a chunk, a site already in db with other
+    networks gets the networks of the chunk
+    :param connection: db connection, inside a transaction
+    :param network_cov_df: chunk of the csv file, with citycode and operator cols
+    :param city_ids: dict of city ids by citycode
+    :param operator_ids: dict of operator ids by name
+    :return: report of inserted, updated and skipped rows
+    """
+    antenna_df = (
+        network_cov_df[["operator", "citycode", "x", "y", "2G", "3G", "4G"]]
+        .drop_duplicates(subset=["operator", "x", "y"], keep="last")
+        .astype({"x": float, "y": float, "2G": bool, "3G": bool, "4G": bool})
+    )
+    return upsert_delta(
+        connection,
+        models.Antenna.__table__,  # pylint: disable=E1101
+        with_ids(antenna_df, city_ids, operator_ids),
+        ("operator_id", "x", "y"),
+        update_columns=("2G", "3G", "4G"),
+    )
+
+
+def save_chunk_to_db(network_cov_df, report, stage=lambda name: None):
+    """
+    Save a geocoded chunk of data to db, in a single transaction.
+    Only rows not already in db are written, using bulk_upsert
+    (COPY on PostgreSQL) to save multiple rows
+    :param network_cov_df: chunk of the csv file, with citycode and city cols
+    :param report: inserted, updated and skipped rows by table,
+     and unknown operator codes, updated in place
+    :param stage: called with the name of each stage when it starts
+    :return: ids of the cities of the chunk
+    """
+    city_df = (
+        network_cov_df[["citycode", "city"]]
+        .drop_duplicates(subset="citycode")
+        .rename(columns={"citycode": "code", "city": "name"})
+    )
+    stage("operators")
+    network_cov_df = resolve_operators(network_cov_df, report)
+
+    with engine.begin() as connection:
+        logger.info("Saving Cities")
+        stage("loading city")
+        counts = {}
+        counts["city"], city_ids = save_cities(connection, city_df)
+        logger.info("Saving Operators")
+        stage("loading operator")
+        counts["operator"], operator_ids = save_operators(connection, network_cov_df)
         logger.info("Saving Network Coverage")
-        network_coverage_df = network_cov_df[
-            ["operator", "city", "2G", "3G", "4G"]
-        ].drop_duplicates()
-        network_coverage_df.to_sql(
-            "network_coverage",
-            con=engine,
-            if_exists="append",
-            index=False,
-            chunksize=1000,
-            dtype={
-                "2G": sqlalchemy.types.Boolean,
-                "3G": sqlalchemy.types.Boolean,
-                "4G": sqlalchemy.types.Boolean,
-            },
+        stage("loading network_coverage")
+        counts["network_coverage"] = save_network_coverage(
+            connection, network_cov_df, city_ids, operator_ids
         )
+        logger.info("Saving Antennas")
+        stage("loading antenna")
+        counts["antenna"] = save_antennas(
+            connection, network_cov_df, city_ids, operator_ids
+        )
+    for table, table_counts in counts.items():
+        for count, value in table_counts.items():
+            report[table][count] += value
+    return city_ids.values()
+
+
+def new_ingest_state():
+    """
+    :return: save_to_db state before its first chunk
+    """
+    return {
+        "chunks": 0,
+        "rows": 0,
+        "city_ids": [],
+        "report": {
+            **{
+                table: {"inserted": 0, "updated": 0, "skipped": 0}
+                for table in ("city", "operator", "network_coverage", "antenna")
+            },
+            "unknown_operators": [],
+        },
+    }
+
+
+def record_chunk(state, chunk_rows, city_ids):
+    """
+    Count a committed chunk in the save_to_db state, updated in place
+    :param state: save_to_db state
+    :param chunk_rows: number of rows of the chunk
+    :param city_ids: ids of the cities of the chunk
+    """
+    state.update(
+        chunks=state["chunks"] + 1,
+        rows=state["rows"] + chunk_rows,
+        city_ids=sorted(set(state["city_ids"]).union(city_ids)),
+    )
+
+
+def save_to_db(  # pylint: disable=R0913
+    file, chunk_size=None, progress=None, workers=1, resume=None, on_chunk=None
+):
+    """
+    Save data to db, streaming the csv file by chunks:
+    each chunk is projected, linked to cities and operators, and only
+    its new or changed rows are written before the next one is read.
+    Loading the same file twice is a no-op.
+    Each chunk is committed on its own: with the state given to on_chunk,
+    an interrupted ingest resumes after its last committed chunk.
+    The dataset version is left to the caller, see app.jobs.ingest_file
+    :param file: csv file
+    :param chunk_size: number of rows per chunk, INGEST_CHUNK_SIZE env var by default
+    :param progress: called with the current stage and the number of rows processed
+    :param workers: number of processes geocoding chunks
+    :param resume: state of an interrupted ingest of the same file and chunk size
+    :param on_chunk: called with the state after each committed chunk
+    :return: inserted, updated and skipped rows by table, unknown operator codes
+    """
+    from app.utils import csv_to_dataframe_chunks  # pylint: disable=C0415
+
+    chunk_size = chunk_size or int(os.getenv("INGEST_CHUNK_SIZE", "10000"))
+    state = resume or new_ingest_state()
+
+    def stage(name):
+        if progress:
+            progress(name, state["rows"])
+
+    try:
+        stage("reading")
+        with closing(
+            csv_to_dataframe_chunks(file, chunk_size, skip=state["chunks"])
+        ) as chunks:
+            for chunk_rows, network_cov_df in geocode_chunks(chunks, workers, stage):
+                logger.info(f"Saving chunk {state['chunks']}: {chunk_rows} rows")
+                city_ids = save_chunk_to_db(network_cov_df, state["report"], stage)
+                record_chunk(state, chunk_rows, city_ids)
+                if on_chunk:
+                    on_chunk(state)
+                stage("reading")
+
+        logger.info("Saving City Operator Coverage")
+        stage("summary")
+        with engine.begin() as connection:
+            refresh_city_operator_coverage(connection, state["city_ids"])
     except Exception as exc:
         logger.exception("Error occured when saving to db")
         raise exc
-    return True
+    logger.info(f"Saved to db: {state['report']}")
+    return state["report"]
@@ -8,14 +8,51 @@ from functools import wraps
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import registry, sessionmaker
 
 load_dotenv()
 
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
 
-engine = create_engine(os.getenv("DB_STRING"), pool_pre_ping=True)
+
+def engine_options(url):
+    """
+    Pool options from DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE (seconds)
+    and DB_POOL_PRE_PING env vars
+    :param url: db url
+    :return: create_engine kwargs
+    """
+    options = {
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    }
+    if not url.startswith("sqlite"):
+        options["pool_size"] = int(os.getenv("DB_POOL_SIZE", "5"))
+        options["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    return options
+
+
+def async_url(url):
+    """
+    Same db with an asyncio driver: asyncpg for PostgreSQL, aiosqlite for sqlite
+    :param url: db url
+    :return: async db url
+    """
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme.split('+')[0], scheme)}://{rest}"
+
+
+engine = create_engine(os.getenv("DB_STRING"), **engine_options(os.getenv("DB_STRING")))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(
+    async_url(os.getenv("DB_STRING")), **engine_options(os.getenv("DB_STRING"))
+)
+AsyncSessionLocal = sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 mapper_registry = registry()
 Base = mapper_registry.generate_base()
 
@@ -32,6 +69,15 @@ def get_db():
         database.close()
 
 
+async def get_async_db():
+    """
+    Generator to get async database session
+    :return: async database session
+    """
+    async with AsyncSessionLocal() as database:
+        yield database
+
+
 def db_add(func):
     """Decorator for adding data.
     :param func: function
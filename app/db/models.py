@@ -5,8 +5,8 @@ Models module
 import os
 
 from dotenv import load_dotenv
-from sqlalchemy import (Boolean, Column, ForeignKey, Integer, Sequence, String,
-                        UniqueConstraint)
+from sqlalchemy import (JSON, Boolean, Column, Float, ForeignKey, Index,
+                        Integer, Sequence, String, UniqueConstraint)
 
 from .database import Base
 
@@ -21,8 +21,9 @@ class Operator(Base):
     __tablename__ = "operator"
     __table_args__ = {"schema": os.getenv("SCHEMA")}
 
-    name = Column(String(50), nullable=False, primary_key=True)
-    code = Column(Integer, nullable=False)
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50), nullable=False, unique=True)
+    code = Column(Integer, nullable=False, index=True)
 
 
 class City(Base):
@@ -33,7 +34,11 @@ class City(Base):
     __tablename__ = "city"
     __table_args__ = {"schema": os.getenv("SCHEMA")}
 
-    name = Column(String(100), nullable=False, primary_key=True)
+    id = Column(Integer, primary_key=True)
+    # display name, homonym communes share it
+    name = Column(String(100), nullable=False, index=True)
+    # INSEE citycode, the lookup key. None for cities added without one
+    code = Column(String(5), unique=True)
 
 
 class NetworkCoverage(Base):
@@ -43,13 +48,86 @@ class NetworkCoverage(Base):
 
     __tablename__ = "network_coverage"
     __table_args__ = (
-        UniqueConstraint("city", "operator", "2G", "3G", "4G"),
+        UniqueConstraint("city_id", "operator_id", "2G", "3G", "4G"),
+        Index("ix_network_coverage_operator_id", "operator_id"),
         {"schema": os.getenv("SCHEMA")},
     )
 
     id = Column(Integer, Sequence("network_coverage_seq"), primary_key=True)
-    city = Column(ForeignKey(City.name))
-    operator = Column(ForeignKey(Operator.name))
+    city_id = Column(ForeignKey(City.id), nullable=False)
+    operator_id = Column(ForeignKey(Operator.id), nullable=False)
     two_g = Column("2G", Boolean, default=False)
     three_g = Column("3G", Boolean, default=False)
     four_g = Column("4G", Boolean, default=False)
+
+
+class CityOperatorCoverage(Base):
+    """
+    Defines the CityOperatorCoverage table:
+    network coverage of an operator in a city, aggregated at ingest.
+    Lookups by city are answered from the covering index only
+    """
+
+    __tablename__ = "city_operator_coverage"
+    __table_args__ = (
+        Index(
+            "ix_city_operator_coverage_city_id",
+            "city_id",
+            postgresql_include=["operator_id", "2G", "3G", "4G"],
+        ),
+        {"schema": os.getenv("SCHEMA")},
+    )
+
+    city_id = Column(ForeignKey(City.id), primary_key=True)
+    operator_id = Column(ForeignKey(Operator.id), primary_key=True)
+    two_g = Column("2G", Boolean, default=False)
+    three_g = Column("3G", Boolean, default=False)
+    four_g = Column("4G", Boolean, default=False)
+
+
+class Antenna(Base):
+    """
+    Defines the Antenna table: antenna sites with their lambert93 coords
+    """
+
+    __tablename__ = "antenna"
+    __table_args__ = (
+        UniqueConstraint("operator_id", "x", "y"),
+        Index("ix_antenna_city_id", "city_id"),
+        {"schema": os.getenv("SCHEMA")},
+    )
+
+    id = Column(Integer, primary_key=True)
+    operator_id = Column(ForeignKey(Operator.id), nullable=False)
+    city_id = Column(ForeignKey(City.id))
+    x = Column(Float, nullable=False)
+    y = Column(Float, nullable=False)
+    two_g = Column("2G", Boolean, default=False)
+    three_g = Column("3G", Boolean, default=False)
+    four_g = Column("4G", Boolean, default=False)
+
+
+class DatasetVersion(Base):
+    """
+    Defines the DatasetVersion table: a single row, incremented by every write,
+    polled by the api workers to drop what they derived from older data
+    """
+
+    __tablename__ = "dataset_version"
+    __table_args__ = {"schema": os.getenv("SCHEMA")}
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class IngestJob(Base):
+    """
+    Defines the IngestJob table: state of each ingest job, written by the
+    ingest processes and read by every api worker
+    """
+
+    __tablename__ = "ingest_job"
+    __table_args__ = {"schema": os.getenv("SCHEMA")}
+
+    id = Column(String(32), primary_key=True)
+    state = Column(JSON, nullable=False)
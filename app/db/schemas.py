@@ -2,22 +2,43 @@
 Schema module
 """
 
+from typing import Optional
+
 from pydantic import BaseModel
 from pydantic_sqlalchemy import sqlalchemy_to_pydantic
 
 from app.db import models
 
-PydanticOperator = sqlalchemy_to_pydantic(models.Operator)
-PydanticCity = sqlalchemy_to_pydantic(models.City)
+PydanticOperator = sqlalchemy_to_pydantic(models.Operator, exclude=["id"])
+PydanticCity = sqlalchemy_to_pydantic(models.City, exclude=["id", "code"])
 PydanticNetworkCoverage = sqlalchemy_to_pydantic(models.NetworkCoverage)
 
 
+class PydanticCityItem(PydanticCity):
+    """
+    Define Pydantic model for a City of /cities, in json and NDJSON,
+    with its id for the after_id of the next page
+    """
+
+    id: int
+
+
+class PydanticOperatorItem(PydanticOperator):
+    """
+    Define Pydantic model for an Operator of /operators, in json and NDJSON,
+    with its id for the after_id of the next page
+    """
+
+    id: int
+
+
 class PydanticCityNoId(BaseModel):
     """
     Define Pydantic model for City table
     """
 
     name: str
+    code: Optional[str] = None
 
 
 class PydanticOperatorNoId(BaseModel):
@@ -34,5 +55,5 @@ class PydanticNetworkCoverageNoId(BaseModel):
     Define Pydantic model for Network coverage table
     """
 
-    city: int
-    operator: int
+    city_id: int
+    operator_id: int
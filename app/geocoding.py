@@ -0,0 +1,204 @@
+"""
+Geocoding Module
+
+Async client for the api-adresse forward search, sharing one keep-alive
+connection pool for the whole app
+"""
+import asyncio
+import csv
+import io
+import os
+import time
+from dataclasses import dataclass
+
+import httpx
+from dotenv import load_dotenv
+
+from app.log import logger
+from app.metrics import GEOCODER_ERRORS, GEOCODER_LATENCY
+
+load_dotenv()
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+@dataclass(frozen=True)
+class GeocoderSettings:
+    """
+    Timeout, retry and concurrency settings of the geocoding client
+    """
+
+    # timeout (seconds) of each request
+    timeout: float = 5.0
+    # number of retries on timeout, connection error or 5xx
+    retries: int = 2
+    # max in-flight requests, also the pool size
+    max_concurrency: int = 20
+    # base delay (seconds) between retries, doubled each time
+    backoff: float = 0.2
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build the settings from GEOCODER_* env vars
+        :return: GeocoderSettings
+        """
+        return cls(
+            timeout=float(os.getenv("GEOCODER_TIMEOUT", "5")),
+            retries=int(os.getenv("GEOCODER_RETRIES", "2")),
+            max_concurrency=int(os.getenv("GEOCODER_MAX_CONCURRENCY", "20")),
+        )
+
+
+class GeocodingClient:
+    """
+    Pooled async client for api-adresse.
+    The pool is opened on app startup (start) and closed on shutdown (close)
+    """
+
+    def __init__(
+        self,
+        base_url="https://api-adresse.data.gouv.fr",
+        settings=GeocoderSettings(),
+        transport=None,
+    ):
+        """
+        :param base_url: api-adresse base url
+        :param settings: GeocoderSettings
+        :param transport: httpx transport, to target a stub ASGI app in tests
+        """
+        self.base_url = base_url
+        self.settings = settings
+        self.transport = transport
+        self.client = None
+        self.semaphore = None
+        self.loop = None
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build the client from GEOCODER_* env vars
+        :return: GeocodingClient
+        """
+        return cls(
+            base_url=os.getenv("GEOCODER_URL", "https://api-adresse.data.gouv.fr"),
+            settings=GeocoderSettings.from_env(),
+        )
+
+    async def start(self):
+        """
+        Open the connection pool
+        """
+        if self.client is not None and self.loop is asyncio.get_running_loop():
+            return
+        # a pool opened in another event loop can not be reused
+        self.loop = asyncio.get_running_loop()
+        self.semaphore = asyncio.Semaphore(self.settings.max_concurrency)
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=self.settings.timeout,
+            limits=httpx.Limits(
+                max_connections=self.settings.max_concurrency,
+                max_keepalive_connections=self.settings.max_concurrency,
+            ),
+            transport=self.transport,
+        )
+
+    async def close(self):
+        """
+        Close the connection pool
+        """
+        if self.client is None:
+            return
+        await self.client.aclose()
+        self.client = None
+        self.semaphore = None
+        self.loop = None
+
+    async def request(self, method, path, **kwargs):
+        """
+        HTTP request with concurrency cap and retries
+        :param method: HTTP method
+        :param path: path relative to base url
+        :param kwargs: httpx request arguments
+        :return: httpx response
+        """
+        await self.start()
+        retries = self.settings.retries
+        for attempt in range(retries + 1):
+            try:
+                async with self.semaphore:
+                    start = time.perf_counter()
+                    res = await self.client.request(method, path, **kwargs)
+                GEOCODER_LATENCY.labels(path).observe(time.perf_counter() - start)
+                if res.is_error:
+                    GEOCODER_ERRORS.labels(path, str(res.status_code)).inc()
+                if res.status_code not in RETRY_STATUS_CODES:
+                    res.raise_for_status()
+                    return res
+                error = httpx.HTTPStatusError(
+                    f"Geocoder answered {res.status_code}",
+                    request=res.request,
+                    response=res,
+                )
+            except httpx.TransportError as exc:
+                GEOCODER_ERRORS.labels(path, type(exc).__name__).inc()
+                error = exc
+            logger.warning(f"Geocoder call failed ({attempt + 1}): {error!r}")
+            if attempt < retries:
+                await asyncio.sleep(self.settings.backoff * 2**attempt)
+        raise error
+
+    async def get(self, path, params):
+        """
+        GET with concurrency cap and retries
+        :param path: path relative to base url
+        :param params: query params
+        :return: json response
+        """
+        res = await self.request("GET", path, params=params)
+        return res.json()
+
+    async def search(self, adress):
+        """
+        Forward search: retrieve the best match of an adress
+        :param adress: Adress
+        :return: properties of the best match (city, citycode, ...)
+        """
+        data_gouv_adress = await self.get(
+            "/search/", params={"q": adress, "autocomplete": 0}
+        )
+        features = data_gouv_adress.get("features")
+        if not features:
+            raise ValueError(f"No result found for adress: {adress}")
+        return features[0].get("properties")
+
+    async def search_csv(self, adresses):
+        """
+        Bulk forward search of many adresses in a single call
+        :param adresses: list of adresses
+        :return: list of properties of the best matches (city, citycode, ...),
+         in the same order, None when an adress has no match
+        """
+        data = io.StringIO()
+        writer = csv.writer(data)
+        writer.writerow(["adress"])
+        writer.writerows([adress] for adress in adresses)
+        res = await self.request(
+            "POST",
+            "/search/csv/",
+            files={"data": ("adresses.csv", data.getvalue(), "text/csv")},
+            data={"columns": "adress"},
+        )
+        results = []
+        for row in csv.DictReader(io.StringIO(res.text)):
+            properties = {
+                key[len("result_") :]: value
+                for key, value in row.items()
+                if key.startswith("result_") and value
+            }
+            results.append(properties or None)
+        return results
+
+
+geocoding_client = GeocodingClient.from_env()
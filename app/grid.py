@@ -0,0 +1,335 @@
+"""
+Grid Module
+
+Precomputed coverage grid, for point lookups without geocoder, commune
+table nor projection: metropolitan France is cut into fixed cells of
+COVERAGE_GRID_CELL degrees, and each cell holds the networks bitmask of
+every operator with an antenna within COVERAGE_GRID_DISTANCE meters of its
+center. A lookup is a single array index.
+
+The grid is saved with the snapshot file layout, and mapped read-only by
+the api workers. Antennas are only ever inserted, so the grid is updated
+by adding the antennas with an id above the last one it holds
+"""
+import math
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy
+from dotenv import load_dotenv
+
+from app.db import crud
+from app.db.database import SessionLocal
+from app.log import logger
+from app.snapshot import MappedFileStore
+from app.snapshot_file import NETWORKS, map_array_file, write_array_file
+
+load_dotenv()
+
+MAGIC = b"NCOVGRID"
+# lon min, lat min, lon max, lat max: metropolitan France and Corsica
+BOUNDS = (-5.5, 41.0, 10.0, 51.5)
+EARTH_RADIUS = 6371008.8
+GRID_CELL = float(os.getenv("COVERAGE_GRID_CELL", "0.01"))
+GRID_DISTANCE = float(os.getenv("COVERAGE_GRID_DISTANCE", "1000"))
+
+
+class CoverageGrid:  # pylint: disable=R0902
+    """
+    (rows, cols, operators) array of networks bitmasks,
+    bit i is set when NETWORKS[i] is available
+    """
+
+    def __init__(  # pylint: disable=R0913
+        self,
+        cell=GRID_CELL,
+        distance=GRID_DISTANCE,
+        bounds=BOUNDS,
+        operators=(),
+        masks=None,
+        antenna_id=0,
+    ):
+        """
+        :param cell: cell size (degrees)
+        :param distance: max distance (meters) between a cell center and an antenna
+        :param bounds: lon min, lat min, lon max, lat max
+        :param operators: operator of each column of masks
+        :param masks: (rows, cols, operators) array, empty grid when not given
+        :param antenna_id: last antenna id added to the grid
+        """
+        self.cell = cell
+        self.distance = distance
+        self.bounds = tuple(bounds)
+        lon_min, lat_min, lon_max, lat_max = self.bounds
+        self.shape = (
+            math.ceil(round((lat_max - lat_min) / cell, 6)),
+            math.ceil(round((lon_max - lon_min) / cell, 6)),
+        )
+        self.operators = list(operators)
+        if masks is None:
+            masks = numpy.zeros((*self.shape, len(self.operators)), dtype="u1")
+        self.masks = masks
+        self.antenna_id = antenna_id
+        self.path = None
+        self.loaded_at = datetime.now(timezone.utc)
+
+    def settings(self):
+        """
+        :return: cell, distance and bounds, a grid built with others is rebuilt
+        """
+        return {"cell": self.cell, "distance": self.distance, "bounds": self.bounds}
+
+    def cell_of(self, lon, lat):
+        """
+        :param lon: longitude
+        :param lat: latitude
+        :return: (row, col) of the cell holding the position, None outside the grid
+        """
+        lon_min, lat_min, _, _ = self.bounds
+        row = math.floor((lat - lat_min) / self.cell)
+        col = math.floor((lon - lon_min) / self.cell)
+        if 0 <= row < self.shape[0] and 0 <= col < self.shape[1]:
+            return row, col
+        return None
+
+    def lookup(self, lon, lat):
+        """
+        Networks available in the cell holding a gps position, by operator
+        :param lon: longitude
+        :param lat: latitude
+        :return: json structure
+        """
+        cell = self.cell_of(lon, lat)
+        if cell is None:
+            raise ValueError("Position outside the coverage grid")
+        return {
+            operator: {
+                network: bool(mask & (1 << i)) for i, network in enumerate(NETWORKS)
+            }
+            for operator, mask in zip(self.operators, self.masks[cell].tolist())
+        }
+
+    def operator_columns(self, operators):
+        """
+        Column of each operator, new operators get a new column
+        :param operators: operator names
+        :return: array of column indexes
+        """
+        names, inverse = numpy.unique(numpy.asarray(operators), return_inverse=True)
+        new = [name for name in names.tolist() if name not in self.operators]
+        if new:
+            self.masks = numpy.concatenate(
+                [self.masks, numpy.zeros((*self.shape, len(new)), dtype="u1")], axis=2
+            )
+            self.operators.extend(new)
+        columns = numpy.array([self.operators.index(name) for name in names.tolist()])
+        return columns[inverse]
+
+    def rasterize(self, operators, lon, lat, masks):  # pylint: disable=R0914
+        """
+        OR the networks of each antenna into the cells whose center is within
+        distance of it, and the cell holding it
+        :param operators: operator of each antenna
+        :param lon: longitude of each antenna
+        :param lat: latitude of each antenna
+        :param masks: networks bitmask of each antenna
+        """
+        lon = numpy.asarray(lon, dtype="float64")
+        lat = numpy.asarray(lat, dtype="float64")
+        masks = numpy.asarray(masks, dtype="u1")
+        columns = self.operator_columns(operators)
+        if not self.masks.flags.writeable:
+            self.masks = self.masks.copy()
+        lon_min, lat_min, _, lat_max = self.bounds
+        row = numpy.floor((lat - lat_min) / self.cell).astype("int64")
+        col = numpy.floor((lon - lon_min) / self.cell).astype("int64")
+        # cells of the grid within distance, at the latitude where they are the narrowest
+        cell_meters = math.radians(self.cell) * EARTH_RADIUS
+        narrowest = math.cos(math.radians(max(abs(lat_min), abs(lat_max))))
+        row_reach = math.ceil(self.distance / cell_meters)
+        col_reach = math.ceil(self.distance / (cell_meters * narrowest))
+        scale = numpy.cos(numpy.radians(lat))
+        for d_row in range(-row_reach, row_reach + 1):
+            for d_col in range(-col_reach, col_reach + 1):
+                rows, cols = row + d_row, col + d_col
+                d_lat = lat_min + (rows + 0.5) * self.cell - lat
+                d_lon = (lon_min + (cols + 0.5) * self.cell - lon) * scale
+                inside = (
+                    (rows >= 0)
+                    & (rows < self.shape[0])
+                    & (cols >= 0)
+                    & (cols < self.shape[1])
+                )
+                if d_row or d_col:
+                    inside &= (
+                        numpy.radians(numpy.hypot(d_lat, d_lon)) * EARTH_RADIUS
+                        <= self.distance
+                    )
+                numpy.bitwise_or.at(
+                    self.masks,
+                    (rows[inside], cols[inside], columns[inside]),
+                    masks[inside],
+                )
+
+    def add(self, rows):
+        """
+        Add antennas to the grid
+        :param rows: iterable of (id, operator, x, y, 2G, 3G, 4G), lambert93 coords
+        :return: number of antennas added
+        """
+        from app.projection import lambert93_to_wgs84  # pylint: disable=C0415
+
+        rows = list(rows)
+        if not rows:
+            return 0
+        ids, operators, lambert_x, lambert_y, *networks = zip(*rows)
+        masks = sum(
+            numpy.array(values, dtype="bool").astype("u1") << i
+            for i, values in enumerate(networks)
+        )
+        lon, lat = lambert93_to_wgs84(lambert_x, lambert_y)  # pylint: disable=E0633
+        self.rasterize(operators, lon, lat, masks)
+        self.antenna_id = max(self.antenna_id, max(ids))
+        return len(rows)
+
+    def update(self, database):
+        """
+        Add the antennas inserted since the last update
+        :param database: db
+        :return: number of antennas added
+        """
+        return self.add(crud.get_antennas_after(database, self.antenna_id))
+
+    def save(self, path):
+        """
+        Write the grid to a file, atomically replacing the previous one
+        :param path: grid file
+        """
+        write_array_file(
+            path,
+            MAGIC,
+            {
+                **self.settings(),
+                "operators": self.operators,
+                "antenna_id": self.antenna_id,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            },
+            {"masks": self.masks},
+        )
+        self.path = path
+
+    @classmethod
+    def load(cls, path):
+        """
+        Map a grid file, read-only
+        :param path: grid file
+        :return: CoverageGrid
+        """
+        header, arrays = map_array_file(path, MAGIC)
+        grid = cls(
+            cell=header["cell"],
+            distance=header["distance"],
+            bounds=header["bounds"],
+            operators=header["operators"],
+            masks=arrays["masks"],
+            antenna_id=header["antenna_id"],
+        )
+        grid.path = path
+        return grid
+
+
+def update_grid_file(path, database=None, rebuild=False):
+    """
+    Add the new antennas of the db to a grid file. The grid is built again
+    when the file is absent, was built with other settings, or holds antennas
+    no longer in db
+    :param path: grid file
+    :param database: db, a new session is used when not given
+    :param rebuild: build the grid again from every antenna,
+     needed once antennas were updated
+    :return: CoverageGrid
+    """
+    if database is None:
+        with SessionLocal() as session:
+            return update_grid_file(path, session, rebuild)
+    grid = None
+    if not rebuild and os.path.exists(path):
+        try:
+            grid = CoverageGrid.load(path)
+        except (OSError, ValueError) as exc:
+            logger.warning(f"Coverage grid file ignored: {exc}")
+    if (
+        grid is None
+        or grid.settings() != CoverageGrid().settings()
+        or grid.antenna_id > crud.get_last_antenna_id(database)
+    ):
+        grid = CoverageGrid()
+    added = grid.update(database)
+    grid.save(path)
+    logger.info(
+        f"Coverage grid written to {path}: {added} antennas added, "
+        f"up to antenna {grid.antenna_id}"
+    )
+    return grid
+
+
+class GridStore(MappedFileStore):
+    """
+    Holds the current grid, swapped atomically on reload
+    """
+
+    def __init__(self, file=None):
+        """
+        :param file: grid file, mapped instead of building the grid from db when present
+        """
+        super().__init__(file)
+        self.grid = None
+
+    def current(self):
+        """
+        :return: current grid, None before the first load
+        """
+        return self.grid
+
+    def load(self, database=None):
+        """
+        Map the grid file when present, or else build the grid from the
+        antennas of the db, and swap it with the current one
+        :param database: db, a new session is used when not given
+        :return: new grid
+        """
+        self.checked_at = time.monotonic()
+        self.file_mtime = self.stat_file()
+        if self.file_mtime is not None and database is None:
+            try:
+                grid = CoverageGrid.load(self.file)
+                self.grid = grid
+                logger.info(
+                    f"Coverage grid mapped from {self.file}: "
+                    f"up to antenna {grid.antenna_id}"
+                )
+                return grid
+            except (OSError, ValueError) as exc:
+                logger.warning(f"Coverage grid file ignored: {exc}")
+        if database is None:
+            with SessionLocal() as session:
+                return self.load(session)
+        # antennas may have been updated since the current grid was built
+        grid = CoverageGrid()
+        added = grid.update(database)
+        self.grid = grid
+        logger.info(f"Coverage grid built: {added} antennas")
+        return grid
+
+    def lookup(self, lon, lat):
+        """
+        Point lookup in the current grid, see ensure_loaded
+        :param lon: longitude
+        :param lat: latitude
+        :return: json structure
+        """
+        return self.loaded().lookup(lon, lat)
+
+
+grid_store = GridStore(file=os.getenv("COVERAGE_GRID_FILE"))
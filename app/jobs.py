@@ -0,0 +1,291 @@
+"""
+Jobs Module
+
+Background ingest jobs, run in a process pool so that uploads never block
+the event loop. Job states live in db, updated by the worker processes and
+read by every api worker, whichever one accepted the upload
+"""
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import sqlalchemy
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+
+from app.db import crud, models
+from app.grid import update_grid_file
+from app.log import logger
+from app.snapshot import export_snapshot_file
+
+load_dotenv()
+
+
+def now():
+    """
+    :return: current utc time, iso formatted
+    """
+    return datetime.now(timezone.utc).isoformat()
+
+
+class IngestProgress:
+    """
+    Current stage, rows processed and seconds spent in each stage of an ingest,
+    fed by the progress calls of crud.save_to_db
+    """
+
+    def __init__(self, on_update=None):
+        """
+        :param on_update: called with the IngestProgress after each stage change
+        """
+        self.on_update = on_update
+        self.start = time.monotonic()
+        self.stage = None
+        self.stage_start = self.start
+        self.rows = 0
+        self.stage_seconds = {}
+
+    def __call__(self, stage, rows):
+        """
+        :param stage: stage starting
+        :param rows: rows processed so far
+        """
+        timestamp = time.monotonic()
+        if self.stage is not None:
+            self.stage_seconds[self.stage] = round(
+                self.stage_seconds.get(self.stage, 0.0) + timestamp - self.stage_start,
+                4,
+            )
+        self.stage, self.stage_start, self.rows = stage, timestamp, rows
+        if self.on_update:
+            self.on_update(self)
+
+    def rows_per_second(self):
+        """
+        :return: rows processed per second since the start of the ingest
+        """
+        elapsed = self.stage_start - self.start
+        return round(self.rows / elapsed, 1) if elapsed else 0.0
+
+
+def ingest_file(file, progress, **options):
+    """
+    Save a csv file to db, write the snapshot (COVERAGE_SNAPSHOT_FILE) and grid
+    (COVERAGE_GRID_FILE) files derived from it, then start a new dataset version:
+    api workers reload once the files they map are up to date
+    :param file: csv file
+    :param progress: IngestProgress
+    :param options: crud.save_to_db options
+    :return: ingest report
+    """
+    report = crud.save_to_db(file, progress=progress, **options)
+    with Session(crud.engine) as database:
+        if os.getenv("COVERAGE_SNAPSHOT_FILE"):
+            progress("snapshot", progress.rows)
+            export_snapshot_file(os.getenv("COVERAGE_SNAPSHOT_FILE"), database)
+        if os.getenv("COVERAGE_GRID_FILE"):
+            progress("grid", progress.rows)
+            # the grid only adds antennas, updated ones need a new grid
+            update_grid_file(
+                os.getenv("COVERAGE_GRID_FILE"),
+                database,
+                rebuild=bool(report["antenna"]["updated"]),
+            )
+        crud.bump_dataset_version(database)
+        database.commit()
+    progress("done", progress.rows)
+    return report
+
+
+class JobStore:
+    """
+    Job states by job id, read and written like a dict, kept in db
+    """
+
+    def __getitem__(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        return job
+
+    def __setitem__(self, job_id, job):
+        with Session(crud.engine) as database:
+            database.merge(models.IngestJob(id=job_id, state=job))
+            database.commit()
+
+    def get(self, job_id):
+        """
+        :param job_id: job id
+        :return: job state, None when unknown
+        """
+        with Session(crud.engine) as database:
+            job = database.get(models.IngestJob, job_id)
+            return dict(job.state) if job is not None else None
+
+    def values(self):
+        """
+        :return: every job state, by queue time
+        """
+        with Session(crud.engine) as database:
+            states = database.scalars(sqlalchemy.select(models.IngestJob.state))
+            return sorted(
+                (dict(state) for state in states), key=lambda job: job["queued_at"]
+            )
+
+
+def run_ingest_job(job_id, path, jobs, chunk_size=None):
+    """
+    Run ingest_file on a csv file, reporting progress into the job states.
+    Executed in a worker process
+    :param job_id: job id
+    :param path: csv file
+    :param jobs: JobStore
+    :param chunk_size: number of rows per chunk
+    :return: ingest report, None on failure
+    """
+    jobs[job_id] = {**jobs[job_id], "status": "running", "started_at": now()}
+
+    def update(progress):
+        jobs[job_id] = {
+            **jobs[job_id],
+            "stage": progress.stage,
+            "rows_processed": progress.rows,
+            "rows_per_second": progress.rows_per_second(),
+            "stage_seconds": dict(progress.stage_seconds),
+        }
+
+    try:
+        with open(path, "rb") as file:
+            report = ingest_file(file, IngestProgress(update), chunk_size=chunk_size)
+    except Exception as exc:  # pylint: disable=W0703
+        jobs[job_id] = {
+            **jobs[job_id],
+            "status": "failed",
+            "error": str(exc),
+            "finished_at": now(),
+        }
+        return None
+    jobs[job_id] = {
+        **jobs[job_id],
+        "status": "done",
+        "report": report,
+        "finished_at": now(),
+    }
+    return report
+
+
+class JobManager:
+    """
+    Queue ingest jobs in a process pool of max_workers processes,
+    which is also the limit of concurrent ingests
+    """
+
+    def __init__(self, max_workers=1, executor_class=ProcessPoolExecutor):
+        """
+        :param max_workers: max number of concurrent ingests
+        :param executor_class: concurrent.futures executor class
+        """
+        self.max_workers = max_workers
+        self.executor_class = executor_class
+        self.executor = None
+        self.jobs = JobStore()
+        self.callbacks = []
+
+    def start(self):
+        """
+        Start the worker pool
+        """
+        if self.executor is not None:
+            return
+        if self.executor_class is ProcessPoolExecutor:
+            self.executor = ProcessPoolExecutor(
+                self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            self.executor = self.executor_class(self.max_workers)
+
+    def shutdown(self):
+        """
+        Stop the worker pool, cancelling queued jobs
+        """
+        if self.executor is None:
+            return
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = None
+
+    def on_done(self, callback):
+        """
+        Register a callback, called with the job state after each job
+        :param callback: callable
+        """
+        self.callbacks.append(callback)
+
+    def submit(self, path, chunk_size=None):
+        """
+        Queue an ingest of a csv file, the file is removed once ingested
+        :param path: csv file
+        :param chunk_size: number of rows per chunk
+        :return: job id
+        """
+        self.start()
+        job_id = uuid.uuid4().hex
+        self.jobs[job_id] = {
+            "id": job_id,
+            "status": "queued",
+            "stage": None,
+            "rows_processed": 0,
+            "rows_per_second": 0.0,
+            "stage_seconds": {},
+            "error": None,
+            "report": None,
+            "queued_at": now(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        future = self.executor.submit(
+            run_ingest_job, job_id, path, self.jobs, chunk_size
+        )
+        future.add_done_callback(lambda future: self.done(job_id, path, future))
+        return job_id
+
+    def done(self, job_id, path, future):
+        """
+        Clean up after a job, and notify the registered callbacks
+        :param job_id: job id
+        :param path: csv file
+        :param future: job future
+        """
+        os.remove(path)
+        if future.cancelled() or future.exception():
+            self.jobs[job_id] = {
+                **self.jobs[job_id],
+                "status": "failed",
+                "error": "cancelled" if future.cancelled() else str(future.exception()),
+                "finished_at": now(),
+            }
+        job = self.get(job_id)
+        logger.info(f"Ingest job {job_id} {job['status']}")
+        for callback in self.callbacks:
+            try:
+                callback(job)
+            except Exception:  # pylint: disable=W0703
+                logger.exception(f"Error in ingest job {job_id} callback")
+
+    def get(self, job_id):
+        """
+        :param job_id: job id
+        :return: job state, None when unknown
+        """
+        return self.jobs.get(job_id)
+
+    def list(self):
+        """
+        :return: every job state, by queue time
+        """
+        return self.jobs.values()
+
+
+job_manager = JobManager(max_workers=int(os.getenv("INGEST_MAX_CONCURRENCY", "1")))
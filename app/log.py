@@ -0,0 +1,12 @@
+"""
+Log Module
+
+Logger shared by the serving and the ingest code, kept apart from app.utils
+so that api workers do not import the ingest stack (pandas, pyproj) to log
+"""
+import logging
+import sys
+
+logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+
+logger = logging.getLogger("papernest_logger")
@@ -2,17 +2,38 @@
 Main Module
 """
 import json
-from typing import Any, List
+import os
+import shutil
+import tempfile
+from functools import partial
+from typing import Any, List, Optional
 
-import requests
 import uvicorn
-from fastapi import APIRouter, Depends, FastAPI, File, Request, UploadFile
+from fastapi import (APIRouter, Depends, FastAPI, File, Query, Request,
+                     UploadFile)
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from starlette.responses import JSONResponse
-
-from app.db import crud, schemas
-from app.db.database import get_db
-from app.utils import logger
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, StreamingResponse
+
+from app.batch import (coverage_batch, geocode_concurrently, geocode_in_bulk,
+                       parse_adresses)
+from app.cache import geocoding_cache, normalize_address
+from app.dataset import dataset_watcher
+from app.db import crud, models, schemas
+from app.db.database import (AsyncSessionLocal, async_engine, engine,
+                             get_async_db, get_db)
+from app.geocoding import geocoding_client
+from app.grid import grid_store
+from app.jobs import job_manager
+from app.log import logger
+from app.metrics import (MetricsMiddleware, instrument_engine,
+                         metrics_response, observe_cache, observe_ingest,
+                         observe_singleflight)
+from app.response_cache import cached_response, response_cache
+from app.singleflight import SingleFlight
+from app.snapshot import coverage_store
+from app.spatial import antenna_store
 
 
 class NewJsonResponse(JSONResponse):
@@ -40,6 +61,74 @@ app = FastAPI(
 
 router = APIRouter()
 
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+observe_cache("response", response_cache)
+if geocoding_cache is not None:
+    observe_cache("geocoding", geocoding_cache)
+# concurrent lookups of the same adress or city share one geocode and one db fetch
+geocoding_flight = SingleFlight()
+coverage_flight = SingleFlight()
+observe_singleflight("geocoding", geocoding_flight)
+observe_singleflight("coverage", coverage_flight)
+
+
+@app.on_event("startup")
+async def startup():
+    """
+    Open the shared geocoder connection pool, read the dataset version,
+    loading the coverage snapshot when served from memory, and poll it
+    """
+    await geocoding_client.start()
+    try:
+        await run_in_threadpool(dataset_watcher.check)
+    except Exception:  # pylint: disable=W0703
+        logger.exception("Dataset version not read, retried on the next poll")
+    dataset_watcher.start()
+    job_manager.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    Close the shared geocoder and db connection pools, and stop ingest workers
+    """
+    dataset_watcher.stop()
+    await geocoding_client.close()
+    await async_engine.dispose()
+    job_manager.shutdown()
+
+
+def reload_dataset(version: int):
+    """
+    Reload the coverage snapshot, the antenna index and the coverage grid,
+    and drop cached responses, once the dataset version changed
+    :param version: dataset version
+    """
+    if coverage_store.enabled:
+        coverage_store.load()
+    if antenna_store.index is not None:
+        antenna_store.load()
+    if grid_store.grid is not None:
+        grid_store.load()
+    response_cache.invalidate(version)
+
+
+def check_after_ingest(job: dict):
+    """
+    Read the dataset version once an ingest job succeeded,
+    without waiting for the next poll
+    :param job: job state
+    """
+    if job["status"] == "done":
+        dataset_watcher.check()
+
+
+dataset_watcher.on_change(reload_dataset)
+job_manager.on_done(check_after_ingest)
+job_manager.on_done(observe_ingest)
+
 
 @app.exception_handler(Exception)
 async def exception_handler(request: Request, exc: Exception):  # pylint: disable=W0613
@@ -52,33 +141,283 @@ async def exception_handler(request: Request, exc: Exception):  # pylint: disabl
     return NewJsonResponse(status_code=400, content={"Error": str(exc)})
 
 
+async def geocode(adress: str):
+    """
+    Forward geocode an adress, through the geocoding cache when enabled.
+    Concurrent calls for the same normalized adress share one search
+    :param adress: Adress
+    :return: properties of the best match
+    """
+    key = normalize_address(adress)
+    if geocoding_cache is not None:
+        properties = await geocoding_cache.get_async(key)
+        if properties is not None:
+            return properties
+
+    async def search():
+        properties = await geocoding_client.search(adress)
+        if geocoding_cache is not None:
+            await geocoding_cache.set_async(key, properties)
+        return properties
+
+    return await geocoding_flight.run(key, search)
+
+
+def city_keys(citycode, city):
+    """
+    Keys a geocoded city is looked up with, see crud.city_key:
+    its INSEE citycode, then its name for the cities stored without citycode
+    :param citycode: citycode of the geocoder result
+    :param city: city of the geocoder result
+    :return: tuple of keys
+    """
+    return tuple(dict.fromkeys(key for key in (citycode, city) if key))
+
+
+async def coverage_from_db(city: str, citycode=None, operator=None, technology=None):
+    """
+    Get network coverage of a city from db, with a session of its own
+    as the fetch is shared by concurrent requests for the same city
+    :param city: city, displayed in errors
+    :param citycode: INSEE citycode
+    :param operator: operator name (optionnal)
+    :param technology: 2G, 3G or 4G (optionnal)
+    :return: Coverage network with Json format
+    """
+    async with AsyncSessionLocal() as database:
+        for key in city_keys(citycode, city):
+            if await crud.get_city_by_key_async(database=database, key=key):
+                break
+        else:
+            raise ValueError(
+                f"This adress does not correspond to a city in db: city: {city}"
+            )
+        results = await crud.get_network_coverage_async(
+            database=database,
+            city=key,
+            operator=operator,
+            technology=technology,
+        )
+    if not results:
+        raise ValueError(f"No data found for city: {city}")
+    return results
+
+
+def coverage_from_snapshot(city: str, citycode=None, operator=None, technology=None):
+    """
+    Get network coverage of a city from the in-memory snapshot
+    :param city: city, displayed in errors
+    :param citycode: INSEE citycode
+    :param operator: operator name (optionnal)
+    :param technology: 2G, 3G or 4G (optionnal)
+    :return: Coverage network with Json format
+    """
+    for key in city_keys(citycode, city):
+        results = coverage_store.get_network_coverage(key)
+        if results is not None:
+            break
+    else:
+        raise ValueError(
+            f"This adress does not correspond to a city in db: city: {city}"
+        )
+    results = crud.filter_coverage(results, operator=operator, technology=technology)
+    if not results:
+        raise ValueError(f"No data found for city: {city}")
+    return results
+
+
+def wants_ndjson(request: Request):
+    """
+    :param request: request
+    :return: True when the client asks for a NDJSON stream
+    """
+    return "application/x-ndjson" in request.headers.get("accept", "")
+
+
+def next_page_link(request: Request, rows, limit):
+    """
+    Link to the next page, after the (name, id) of the last row of this one
+    :param request: request
+    :param rows: City or Operator models of the page
+    :param limit: page size
+    :return: Link header, none on the last page
+    """
+    if limit is None or len(rows) < limit:
+        return {}
+    url = request.url.include_query_params(after=rows[-1].name, after_id=rows[-1].id)
+    return {"Link": f'<{url}>; rel="next"'}
+
+
+async def ndjson_rows(model, schema, after=None, limit=None, after_id=None):
+    """
+    Stream the rows of a table as NDJSON, with a session of its own
+    as the stream outlives the endpoint
+    :param model: City or Operator
+    :param schema: response schema, rows have the same fields as the json response
+    :param after: name of the last row of the previous page
+    :param limit: max number of rows
+    :param after_id: id of the last row of the previous page
+    :return: async iterator of NDJSON lines
+    """
+    async with AsyncSessionLocal() as database:
+        async for rows in crud.stream_rows_async(
+            database,
+            model,
+            list(schema.__fields__),
+            after=after,
+            limit=limit,
+            after_id=after_id,
+        ):
+            yield b"".join(
+                json.dumps(row, ensure_ascii=False).encode("utf-8") + b"\n"
+                for row in rows
+            )
+
+
 @router.get("/network/coverage")
-async def network_coverage(adress: str):
+async def network_coverage(
+    request: Request,
+    adress: str,
+    operator: Optional[str] = None,
+    technology: Optional[str] = Query(None, regex="^[234]G$"),
+):
     """
     Get network coverage by adress
+    :param request: request
     :param adress: Adress
+    :param operator: only this operator (name)
+    :param technology: only this technology: 2G, 3G or 4G
     :return: Coverage network with Json format
     """
-    url_data_gouv = "https://api-adresse.data.gouv.fr/search/"
-    params_data_gouv = {"q": adress, "autocomplete": 0}
+
+    async def fetch():
+        properties = await geocode(adress)
+        city = properties.get("city")
+        citycode = properties.get("citycode")
+        if not city and not citycode:
+            raise ValueError("This adress is not linked to a city")
+        if coverage_store.enabled:
+            await coverage_store.ensure_loaded()
+            return coverage_from_snapshot(city, citycode, operator, technology)
+        return await coverage_flight.run(
+            (citycode, city, operator, technology),
+            partial(coverage_from_db, city, citycode, operator, technology),
+        )
+
     try:
-        res = requests.get(  # pylint: disable=W3101
-            url=url_data_gouv, params=params_data_gouv
+        response = await cached_response(request, fetch, NewJsonResponse)
+    except Exception as exc:
+        logger.exception(f"Error when retrieve network coverage: {exc}")
+        raise exc
+    return response
+
+
+async def get_coverages(cities):
+    """
+    Network coverage of many cities, from the snapshot or with one db query
+    per lookup key
+    :param cities: (citycode, city) of each city
+    :return: coverage by (citycode, city), None when not in db
+    """
+    results = {}
+    if coverage_store.enabled:
+        await coverage_store.ensure_loaded()
+        for citycode, city in cities:
+            for key in city_keys(citycode, city):
+                results[citycode, city] = coverage_store.get_network_coverage(key)
+                if results[citycode, city] is not None:
+                    break
+        return results
+    async with AsyncSessionLocal() as database:
+        found = await crud.get_network_coverage_by_cities_async(
+            database=database, cities={citycode for citycode, _ in cities if citycode}
         )
-        data_gouv_adress = res.json()
-        city = data_gouv_adress.get("features")[0].get("properties").get("city")
-        if not city:
-            raise ValueError("This adress is not linked to a city")
-        db_city = crud.get_city(database=next(get_db()), city=city)
-        if not db_city:
-            raise ValueError(
-                f"This adress does not correspond to a city in db: city: {city}"
+        missing = {city for citycode, city in cities if city and citycode not in found}
+        if missing:
+            found.update(
+                await crud.get_network_coverage_by_cities_async(
+                    database=database, cities=missing
+                )
             )
-        results = crud.get_network_coverage(database=next(get_db()), city=db_city.name)
+    for citycode, city in cities:
+        keys = [key for key in city_keys(citycode, city) if key in found]
+        results[citycode, city] = found[keys[0]] if keys else None
+    return results
+
+
+@router.post("/network/coverage/batch")
+async def network_coverage_batch(request: Request, bulk: bool = False):
+    """
+    Get network coverage of many adresses, given as a json list,
+    a csv body (first column) or a text body (one adress per line)
+    :param request: request
+    :param bulk: geocode with a single api-adresse /search/csv/ call,
+     instead of concurrent searches
+    :return: NDJSON stream, one line per adress, in completion order
+    """
+    adresses = parse_adresses(
+        await request.body(),
+        request.headers.get("content-type", ""),
+        max_adresses=int(os.getenv("BATCH_MAX_ADRESSES", "10000")),
+    )
+    if bulk:
+        geocoded = partial(geocode_in_bulk, search_csv=geocoding_client.search_csv)
+    else:
+        geocoded = partial(geocode_concurrently, geocode=geocode)
+    return StreamingResponse(
+        coverage_batch(
+            adresses,
+            geocoded,
+            get_coverages,
+            interval=float(os.getenv("BATCH_COVERAGE_INTERVAL", "0.2")),
+        ),
+        media_type="application/x-ndjson",
+    )
+
+
+@router.get("/network/coverage/nearby")
+async def network_coverage_nearby(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius: float = Query(1000, gt=0, le=50000),
+):
+    """
+    Get network coverage from the antennas around a gps position
+    :param lat: latitude
+    :param lon: longitude
+    :param radius: radius (meters)
+    :return: Coverage network by operator within the radius,
+     with the distance (meters) to the nearest antenna
+    """
+    try:
+        await antenna_store.ensure_loaded()
+        results = antenna_store.nearby(lon=lon, lat=lat, radius=radius)
         if not results:
-            raise ValueError(f"No data found for city: {city}")
+            raise ValueError("No antenna found")
     except Exception as exc:
-        logger.exception(f"Error when retrieve network coverage: {exc}")
+        logger.exception(f"Error when retrieve nearby network coverage: {exc}")
+        raise exc
+    return results
+
+
+@router.get("/network/coverage/point")
+async def network_coverage_point(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+):
+    """
+    Get network coverage of a gps position from the precomputed coverage grid
+    :param lat: latitude
+    :param lon: longitude
+    :return: Coverage network by operator, in the grid cell holding the position
+    """
+    try:
+        await grid_store.ensure_loaded()
+        results = grid_store.lookup(lon=lon, lat=lat)
+        if not results:
+            raise ValueError("No antenna found")
+    except Exception as exc:
+        logger.exception(f"Error when retrieve point network coverage: {exc}")
         raise exc
     return results
 
@@ -86,23 +425,45 @@ async def network_coverage(adress: str):
 @router.post("/add_data/csv")
 async def add_data_csv(file: UploadFile = File(...)):
     """
-    Add data to db
+    Queue an ingest job adding data to db, only new or changed rows are written
     :param file: file
-    :return: Status if everything is ok, or exc instead
+    :return: Job id, to follow the ingest on /jobs/{job_id}
     """
 
     if not file:
         raise ValueError("Data file is required")
     if not "csv" in file.filename:
         raise ValueError("You must provide a csv file")
-    status = crud.save_to_db(file.file)
-    if status:
-        return "Everything ok"
-    return "Error occured"
+    with tempfile.NamedTemporaryFile(suffix=".csv", delete=False) as upload:
+        await run_in_threadpool(shutil.copyfileobj, file.file, upload)
+    job_id = await run_in_threadpool(job_manager.submit, upload.name)
+    return {"job_id": job_id, "status": "queued"}
+
+
+@router.get("/jobs")
+async def get_jobs():
+    """
+    Retrieve ingest jobs
+    :return: All jobs states
+    """
+    return await run_in_threadpool(job_manager.list)
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Retrieve an ingest job
+    :param job_id: job id
+    :return: Job state: status, stage, rows processed, throughput, errors and report
+    """
+    job = await run_in_threadpool(job_manager.get, job_id)
+    if not job:
+        raise ValueError("Job not found")
+    return job
 
 
 @router.post("/add/city", response_model=schemas.PydanticCity)
-async def add_city(city: schemas.PydanticCityNoId, database: Session = Depends(get_db)):
+def add_city(city: schemas.PydanticCityNoId, database: Session = Depends(get_db)):
     """
     Add city to db
     :param city: city
@@ -113,9 +474,13 @@ async def add_city(city: schemas.PydanticCityNoId, database: Session = Depends(g
     if not city:
         raise ValueError("City is required")
     try:
-        db_city = crud.get_city(database=database, city=city.name)
+        if city.code:
+            db_city = crud.get_city_by_code(database=database, code=city.code)
+        else:
+            db_city = crud.get_city(database=database, city=city.name)
         if not db_city:
             db_city = crud.create_city(database=database, city=city)
+            dataset_watcher.bump(database)
     except Exception as exc:
         logger.exception(f"Exception occured when creating city {exc}")
         raise exc
@@ -123,42 +488,82 @@ async def add_city(city: schemas.PydanticCityNoId, database: Session = Depends(g
 
 
 @router.get("/city", response_model=schemas.PydanticCity)
-async def get_city(city: str, database: Session = Depends(get_db)):
+async def get_city(
+    request: Request, city: str, database: AsyncSession = Depends(get_async_db)
+):
     """
     Retrieve city from db
+    :param request: request
     :param city: city
     :param database: db
     :return: A city
     """
-    try:
-        db_city = crud.get_city(database=database, city=city)
+
+    async def fetch():
+        db_city = await crud.get_city_async(database=database, city=city)
         if not db_city:
             raise ValueError("City not found")
+        return schemas.PydanticCity.from_orm(db_city)
+
+    try:
+        response = await cached_response(request, fetch, NewJsonResponse)
     except Exception as exc:
         logger.exception(f"Exception occured when retrieving city {exc}")
         raise exc
-    return db_city
+    return response
 
 
-@router.get("/cities", response_model=List[schemas.PydanticCity])
-async def get_cities(database: Session = Depends(get_db)):
+@router.get("/cities", response_model=List[schemas.PydanticCityItem])
+async def get_cities(
+    request: Request,
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(None, gt=0),
+    after_id: Optional[int] = None,
+    database: AsyncSession = Depends(get_async_db),
+):
     """
-    Retrieve city from db
+    Retrieve city from db, by name
+    :param request: request
+    :param after: name of the last city of the previous page
+    :param limit: page size
+    :param after_id: id of the last city of the previous page,
+     given with after by the Link header of the previous page
     :param database: db
-    :return: All cities
+    :return: Cities, as a NDJSON stream with Accept: application/x-ndjson
     """
-    try:
-        db_cities = crud.get_cities(database=database)
-        if not db_cities:
+    if wants_ndjson(request):
+        return StreamingResponse(
+            ndjson_rows(
+                models.City,
+                schemas.PydanticCityItem,
+                after=after,
+                limit=limit,
+                after_id=after_id,
+            ),
+            media_type="application/x-ndjson",
+        )
+
+    headers = {}
+
+    async def fetch():
+        db_cities = await crud.get_cities_async(
+            database=database, after=after, limit=limit, after_id=after_id
+        )
+        headers.update(next_page_link(request, db_cities, limit))
+        if not db_cities and after is None:
             raise ValueError("City not found")
+        return [schemas.PydanticCityItem.from_orm(db_city) for db_city in db_cities]
+
+    try:
+        response = await cached_response(request, fetch, NewJsonResponse, headers)
     except Exception as exc:
         logger.exception(f"Exception occured when fetching cities {exc}")
         raise exc
-    return db_cities
+    return response
 
 
 @router.delete("/city", response_model=schemas.PydanticCity)
-async def delete_city(city: str, database: Session = Depends(get_db)):
+def delete_city(city: str, database: Session = Depends(get_db)):
     """
     Delete city from db
     :param city: city
@@ -169,6 +574,7 @@ async def delete_city(city: str, database: Session = Depends(get_db)):
         db_city = crud.delete_city(database=database, city=city)
         if not db_city:
             raise ValueError("City not found")
+        dataset_watcher.bump(database)
     except Exception as exc:
         logger.exception(f"Exception occured when creating city {exc}")
         raise exc
@@ -176,7 +582,7 @@ async def delete_city(city: str, database: Session = Depends(get_db)):
 
 
 @router.post("/add/operator", response_model=schemas.PydanticOperator)
-async def add_operator(
+def add_operator(
     operator: schemas.PydanticOperatorNoId, database: Session = Depends(get_db)
 ):
     """
@@ -192,6 +598,7 @@ async def add_operator(
         db_operator = crud.get_operator(database=database, code=operator.code)
         if not db_operator:
             db_operator = crud.create_operator(database=database, operator=operator)
+            dataset_watcher.bump(database)
     except Exception as exc:
         logger.exception(f"Exception occured when creating operator {exc}")
         raise exc
@@ -199,42 +606,85 @@ async def add_operator(
 
 
 @router.get("/operator", response_model=schemas.PydanticOperator)
-async def get_operator(code: str, database: Session = Depends(get_db)):
+async def get_operator(
+    request: Request, code: str, database: AsyncSession = Depends(get_async_db)
+):
     """
     Retrieve operator from db
+    :param request: request
     :param code: code
     :param database: db
     :return: Operator
     """
-    try:
-        db_operator = crud.get_operator(database=database, code=code)
+
+    async def fetch():
+        db_operator = await crud.get_operator_async(database=database, code=code)
         if not db_operator:
             raise ValueError("Operator not found")
+        return schemas.PydanticOperator.from_orm(db_operator)
+
+    try:
+        response = await cached_response(request, fetch, NewJsonResponse)
     except Exception as exc:
         logger.exception(f"Exception occured when creating operator {exc}")
         raise exc
-    return db_operator
+    return response
 
 
-@router.get("/operators", response_model=List[schemas.PydanticOperator])
-async def get_operators(database: Session = Depends(get_db)):
+@router.get("/operators", response_model=List[schemas.PydanticOperatorItem])
+async def get_operators(
+    request: Request,
+    after: Optional[str] = None,
+    limit: Optional[int] = Query(None, gt=0),
+    after_id: Optional[int] = None,
+    database: AsyncSession = Depends(get_async_db),
+):
     """
-    Retrieve city from db
+    Retrieve operators from db, by name
+    :param request: request
+    :param after: name of the last operator of the previous page
+    :param limit: page size
+    :param after_id: id of the last operator of the previous page,
+     given with after by the Link header of the previous page
     :param database: db
-    :return: All operators
+    :return: Operators, as a NDJSON stream with Accept: application/x-ndjson
     """
-    try:
-        db_operators = crud.get_operators(database=database)
-        if not db_operators:
+    if wants_ndjson(request):
+        return StreamingResponse(
+            ndjson_rows(
+                models.Operator,
+                schemas.PydanticOperatorItem,
+                after=after,
+                limit=limit,
+                after_id=after_id,
+            ),
+            media_type="application/x-ndjson",
+        )
+
+    headers = {}
+
+    async def fetch():
+        db_operators = await crud.get_operators_async(
+            database=database, after=after, limit=limit, after_id=after_id
+        )
+        headers.update(next_page_link(request, db_operators, limit))
+        if not db_operators and after is None:
             raise ValueError("Operators not found")
+        return [
+            schemas.PydanticOperatorItem.from_orm(db_operator)
+            for db_operator in db_operators
+        ]
+
+    try:
+        response = await cached_response(request, fetch, NewJsonResponse, headers)
     except Exception as exc:
         logger.exception(f"Exception occured when fetching operators {exc}")
         raise exc
-    return db_operators
+    return response
 
 
 @router.delete("/operator", response_model=schemas.PydanticCity)
-async def delete_operator(code: str, database: Session = Depends(get_db)):
+def delete_operator(code: str, database: Session = Depends(get_db)):
     """
     Delete operator from db
     :param code: code
@@ -245,12 +695,32 @@ async def delete_operator(code: str, database: Session = Depends(get_db)):
         db_operator = crud.delete_operator(database=database, code=code)
         if not db_operator:
             raise ValueError("Operator not found")
+        dataset_watcher.bump(database)
     except Exception as exc:
         logger.exception(f"Exception occured when creating operator {exc}")
         raise exc
     return db_operator
 
 
+@router.get("/coverage/snapshot")
+async def coverage_snapshot():
+    """
+    Describe the in-memory coverage snapshot
+    :return: serving mode, version and load time of the snapshot
+    """
+    return coverage_store.info()
+
+
+@router.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: request, SQL, geocoder and ingest stage latencies,
+    in-flight requests and cache counters
+    :return: metrics in prometheus text format
+    """
+    return metrics_response()
+
+
 @router.get("/")
 async def root():
     """
@@ -0,0 +1,188 @@
+"""
+Metrics Module
+
+Prometheus instrumentation: request latency and in-flight requests by route,
+SQL statements timed through engine events, geocoder latency and errors,
+ingest stage durations, cache and coalescing counters, exposed on /metrics
+"""
+import time
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge,
+                               Histogram, generate_latest)
+from sqlalchemy import event
+from starlette.responses import Response
+from starlette.routing import Match
+
+# seconds, from a cache hit to a slow geocoder call
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5)
+INGEST_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+
+REQUESTS = Counter("http_requests", "HTTP requests", ["method", "route", "status"])
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency, until the response is fully sent",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests in progress", ["method", "route"]
+)
+SQL_LATENCY = Histogram(
+    "db_statement_duration_seconds",
+    "SQL statement execution time",
+    ["operation"],
+    buckets=SQL_BUCKETS,
+)
+SQL_ERRORS = Counter("db_statement_errors", "Failed SQL statements", ["operation"])
+GEOCODER_LATENCY = Histogram(
+    "geocoder_request_duration_seconds",
+    "api-adresse request latency, per attempt",
+    ["path"],
+    buckets=LATENCY_BUCKETS,
+)
+GEOCODER_ERRORS = Counter(
+    "geocoder_errors", "Failed api-adresse requests, per attempt", ["path", "reason"]
+)
+INGEST_STAGE_LATENCY = Histogram(
+    "ingest_stage_duration_seconds",
+    "Time spent in each save_to_db stage, per ingest job",
+    ["stage"],
+    buckets=INGEST_BUCKETS,
+)
+CACHE_HITS = Gauge("cache_hits", "Cache hits since startup", ["cache"])
+CACHE_MISSES = Gauge("cache_misses", "Cache misses since startup", ["cache"])
+CACHE_SIZE = Gauge("cache_size", "Cached entries", ["cache"])
+SINGLEFLIGHT_EXECUTED = Gauge(
+    "singleflight_executed", "Calls executed since startup", ["call"]
+)
+SINGLEFLIGHT_COALESCED = Gauge(
+    "singleflight_coalesced",
+    "Calls collapsed into an identical in-flight one since startup",
+    ["call"],
+)
+
+
+def route_of(scope):
+    """
+    Route template of a request (ex: /jobs/{job_id}), to keep labels bounded
+    :param scope: ASGI scope
+    :return: route path, "unmatched" when no route matches
+    """
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, status and in-flight requests by route
+    """
+
+    def __init__(self, app):
+        """
+        :param app: ASGI app
+        """
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        route = route_of(scope)
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_LATENCY.labels(method, route).observe(time.perf_counter() - start)
+            REQUESTS.labels(method, route, str(status["code"])).inc()
+            in_progress.dec()
+
+
+def operation_of(statement):
+    """
+    :param statement: SQL statement
+    :return: first keyword of the statement (SELECT, INSERT, ...)
+    """
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+
+
+def instrument_engine(engine):
+    """
+    Time every SQL statement of a (sync) engine
+    :param engine: sqlalchemy Engine, async_engine.sync_engine for an async one
+    """
+    if getattr(engine, "instrumented", False):
+        return
+    engine.instrumented = True
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(  # pylint: disable=W0612,W0613,R0913
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(  # pylint: disable=W0612,W0613,R0913
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        start = conn.info["query_start"].pop()
+        SQL_LATENCY.labels(operation_of(statement)).observe(time.perf_counter() - start)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):  # pylint: disable=W0612
+        starts = (
+            context.connection.info.get("query_start") if context.connection else None
+        )
+        if starts:
+            starts.pop()
+        SQL_ERRORS.labels(operation_of(context.statement or "")).inc()
+
+
+def observe_cache(name, cache):
+    """
+    Export the counters of a cache (TTLCache, ResponseCache), read on scrape
+    :param name: cache label
+    :param cache: cache with hits, misses and a length
+    """
+    CACHE_HITS.labels(name).set_function(lambda: cache.hits)
+    CACHE_MISSES.labels(name).set_function(lambda: cache.misses)
+    CACHE_SIZE.labels(name).set_function(lambda: len(cache))
+
+
+def observe_singleflight(name, group):
+    """
+    Export the counters of a SingleFlight, read on scrape
+    :param name: call label
+    :param group: SingleFlight
+    """
+    SINGLEFLIGHT_EXECUTED.labels(name).set_function(lambda: group.executed)
+    SINGLEFLIGHT_COALESCED.labels(name).set_function(lambda: group.coalesced)
+
+
+def observe_ingest(job):
+    """
+    Record the stage durations of a finished ingest job
+    :param job: job state, with seconds spent by stage
+    """
+    for stage, seconds in (job.get("stage_seconds") or {}).items():
+        INGEST_STAGE_LATENCY.labels(stage).observe(seconds)
+
+
+def metrics_response():
+    """
+    :return: Response with the metrics in prometheus text format
+    """
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
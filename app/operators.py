@@ -0,0 +1,77 @@
+"""
+Operators Module
+
+Registry of network operators, indexed by (MCC, MNC)
+"""
+import json
+from functools import lru_cache
+from pathlib import Path
+
+MCCMNC_FILE = Path(__file__).parent / "resources" / "mccmnc.json"
+
+
+def split_code(code):
+    """
+    Split an operator code (ex: 20801) in MCC and MNC
+    :param code: operator code
+    :return: (MCC, MNC)
+    """
+    code = str(code)
+    return code[:3], code[3:]
+
+
+class OperatorRegistry:
+    """
+    Operator names by (MCC, MNC), loaded once from mccmnc.json
+    """
+
+    def __init__(self, operators):
+        """
+        :param operators: dict of operator names by (MCC, MNC)
+        """
+        self.operators = operators
+
+    def __len__(self):
+        return len(self.operators)
+
+    @classmethod
+    def from_file(cls, path=MCCMNC_FILE):
+        """
+        Load the registry from a mccmnc json file
+        :param path: json file
+        :return: OperatorRegistry
+        """
+        with open(path, "r", encoding="utf-8") as json_file:
+            json_data = json.load(json_file)
+        operators = {}
+        for network in json_data.values():
+            operators.setdefault((network["MCC"], network["MNC"]), network["NETWORK"])
+        return cls(operators)
+
+    def find(self, code):
+        """
+        Find the operator of a code
+        :param code: operator code (MCC followed by MNC)
+        :return: operator name, None when unknown
+        """
+        return self.operators.get(split_code(code))
+
+    def resolve(self, codes):
+        """
+        Vectorized lookup of a whole column of codes,
+        only the unique codes are looked up
+        :param codes: pandas Series of operator codes
+        :return: Series of operator names (NaN when unknown), sorted unknown codes
+        """
+        names = {code: self.find(code) for code in codes.unique().tolist()}
+        unknown = sorted(code for code, name in names.items() if name is None)
+        return codes.map(names), unknown
+
+
+@lru_cache(maxsize=None)
+def get_operator_registry():
+    """
+    Registry shared by the process
+    :return: OperatorRegistry
+    """
+    return OperatorRegistry.from_file()
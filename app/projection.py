@@ -0,0 +1,70 @@
+"""
+Projection Module
+"""
+from functools import lru_cache
+
+import numpy
+from pyproj import Transformer
+
+PROJ_GPS = {"proj": "longlat", "ellps": "WGS84", "datum": "WGS84", "no_defs": True}
+PROJ_LAMBERT93 = {
+    "proj": "lcc",
+    "lat_2": 44,
+    "lat_1": 49,
+    "lat_0": 46.5,
+    "lon_0": 3,
+    "x_0": 700000,
+    "y_0": 6600000,
+    "ellps": "GRS80",
+    "towgs84": "0, 0, 0, 0, 0, 0, 0",
+    "units": "m",
+    "no_defs": True,
+}
+
+
+@lru_cache(maxsize=None)
+def _lambert93_to_gps_transformer():
+    """
+    Build the lambert93 -> wgs84 transformer once per process
+    :return: Transformer
+    """
+    return Transformer.from_crs(PROJ_LAMBERT93, PROJ_GPS, always_xy=True)
+
+
+@lru_cache(maxsize=None)
+def _gps_to_lambert93_transformer():
+    """
+    Build the wgs84 -> lambert93 transformer once per process
+    :return: Transformer
+    """
+    return Transformer.from_crs(PROJ_GPS, PROJ_LAMBERT93, always_xy=True)
+
+
+def lambert93_to_wgs84(lambert_x, lambert_y):
+    """
+    Transform lambert93 coordinates to gps coordinates wsg84.
+    Accepts scalars or whole columns (numpy arrays, pandas series) and
+    converts them in a single batched call
+    :param lambert_x: x coord(s) (lambert93)
+    :param lambert_y: y coord(s) (lambert93)
+    :return: lon, lat
+    """
+    return _lambert93_to_gps_transformer().transform(
+        numpy.asarray(lambert_x, dtype="float64"),
+        numpy.asarray(lambert_y, dtype="float64"),
+    )
+
+
+def wgs84_to_lambert93(lon, lat):
+    """
+    Transform gps coordinates wsg84 to lambert93 coordinates.
+    Accepts scalars or whole columns (numpy arrays, pandas series) and
+    converts them in a single batched call
+    :param lon: longitude(s)
+    :param lat: latitude(s)
+    :return: lambert_x, lambert_y
+    """
+    return _gps_to_lambert93_transformer().transform(
+        numpy.asarray(lon, dtype="float64"),
+        numpy.asarray(lat, dtype="float64"),
+    )
@@ -0,0 +1,117 @@
+"""
+Response Cache Module
+
+Already encoded responses of the read endpoints, tagged with a strong ETag
+derived from the dataset version. The dataset version is shared by every
+worker and bumped by every write (ingest, add/delete endpoints): a worker
+drops its cached responses as soon as it sees a new one
+(app.dataset.DatasetWatcher), and entries expire after RESPONSE_CACHE_TTL
+seconds in any case
+"""
+import hashlib
+import os
+
+from dotenv import load_dotenv
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import Response
+
+from app.cache import MemoryBackend, TTLCache
+
+load_dotenv()
+
+
+def etag_matches(etag, if_none_match):
+    """
+    Weak comparison of an If-None-Match header with an ETag
+    :param etag: ETag
+    :param if_none_match: If-None-Match header value
+    :return: True when the client copy is up to date
+    """
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in [tag.removeprefix("W/") for tag in tags]
+
+
+class ResponseCache(TTLCache):
+    """
+    Encoded response bodies and their ETag, by request key and dataset version
+    """
+
+    def __init__(self, max_size, ttl):
+        """
+        :param max_size: max number of responses, 0 disables the cache
+        :param ttl: time to live (seconds) of a response
+        """
+        super().__init__(MemoryBackend(max_size), ttl)
+        self.enabled = max_size > 0
+        self.version = 0
+
+    def get(self, key):
+        """
+        :param key: request key
+        :return: (etag, body, headers) of the current dataset version,
+         None when missing
+        """
+        return super().get((self.version, key))
+
+    def set(self, key, body, version, headers=None):  # pylint: disable=W0221
+        """
+        :param key: request key
+        :param body: encoded body
+        :param version: dataset version the body was computed from
+        :param headers: headers of the content, cached with it
+        :return: (etag, body, headers)
+        """
+        etag = f'"{version}-{hashlib.sha1(body).hexdigest()[:16]}"'
+        entry = (etag, body, headers or {})
+        if version == self.version:
+            super().set((version, key), entry)
+        return entry
+
+    def invalidate(self, version):
+        """
+        Switch to a new dataset version, dropping every cached response
+        :param version: dataset version
+        """
+        self.version = version
+        self.clear()
+
+    def stats(self):
+        """
+        :return: dataset version, hits, misses and size
+        """
+        return {"version": self.version, **super().stats()}
+
+
+async def cached_response(request, produce, response_class, headers=None):
+    """
+    Serve a read endpoint from the cache, answering 304 when the client copy
+    (If-None-Match) is up to date
+    :param request: request
+    :param produce: async function computing the content on a cache miss
+    :param response_class: response class encoding the content
+    :param headers: dict filled by produce with headers of the content
+     (link to the next page), cached with it
+    :return: Response
+    """
+    headers = {} if headers is None else headers
+    if not response_cache.enabled:
+        return response_class(jsonable_encoder(await produce()), headers=headers)
+    key = f"{request.url.path}?{sorted(request.query_params.multi_items())}"
+    version = response_cache.version
+    entry = response_cache.get(key)
+    if entry is None:
+        body = response_class(jsonable_encoder(await produce())).body
+        entry = response_cache.set(key, body, version, headers)
+    etag, body, content_headers = entry
+    headers = {**content_headers, "ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(etag, request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=response_class.media_type, headers=headers)
+
+
+response_cache = ResponseCache(
+    int(os.getenv("RESPONSE_CACHE_MAX_SIZE", "1000")),
+    int(os.getenv("RESPONSE_CACHE_TTL", "300")),
+)
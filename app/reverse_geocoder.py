@@ -0,0 +1,112 @@
+"""
+Reverse Geocoder Module
+
+Offline point -> city lookups, based on commune centroids loaded into a KD-tree
+"""
+import os
+from functools import lru_cache
+
+import numpy
+import pandas
+from dotenv import load_dotenv
+from scipy.spatial import cKDTree
+
+from app.projection import wgs84_to_lambert93
+
+load_dotenv()
+
+# A point further than this from every commune centroid is left without city
+DEFAULT_MAX_DISTANCE = 15000
+
+
+class LocalReverseGeocoder:
+    """
+    Resolve lambert93 coordinates to the closest commune.
+    Centroids are projected to lambert93 once, so distances are in meters
+    and antenna coords can be queried without any projection
+    """
+
+    def __init__(self, communes, max_distance=DEFAULT_MAX_DISTANCE):
+        """
+        :param communes: dataframe with citycode, city, lat and lon cols,
+         communes without citycode are left out
+        :param max_distance: max distance (meters) between a point and a centroid
+        """
+        communes = communes.dropna(subset=["citycode", "city", "lat", "lon"])
+        self.citycodes = communes["citycode"].astype(str).to_numpy()
+        self.cities = communes["city"].to_numpy()
+        self.max_distance = max_distance
+        lambert_x, lambert_y = wgs84_to_lambert93(  # pylint: disable=E0633
+            communes["lon"], communes["lat"]
+        )
+        self.tree = cKDTree(numpy.column_stack((lambert_x, lambert_y)))
+
+    def __len__(self):
+        return len(self.cities)
+
+    @classmethod
+    def from_file(cls, path, max_distance=DEFAULT_MAX_DISTANCE):
+        """
+        Load commune centroids from a ';' separated csv file
+        with citycode, city, lat and lon cols
+        :param path: csv file
+        :param max_distance: max distance (meters) between a point and a centroid
+        :return: LocalReverseGeocoder
+        """
+        communes = pandas.read_csv(
+            path, header=0, delimiter=";", dtype={"citycode": str}
+        )
+        missing = {"citycode", "city", "lat", "lon"} - set(communes.columns)
+        if missing:
+            raise ValueError(f"Missing columns in communes file {path}: {missing}")
+        return cls(communes, max_distance=max_distance)
+
+    def lookup(self, lambert_x, lambert_y):
+        """
+        Vectorized lookup of the closest commune for whole columns of coords
+        :param lambert_x: x coords (lambert93)
+        :param lambert_y: y coords (lambert93)
+        :return: citycodes, cities (None when no commune is close enough)
+        """
+        points = numpy.column_stack(
+            (
+                numpy.asarray(lambert_x, dtype="float64"),
+                numpy.asarray(lambert_y, dtype="float64"),
+            )
+        )
+        _, indexes = self.tree.query(points, distance_upper_bound=self.max_distance)
+        found = indexes < len(self.cities)
+        citycodes = numpy.full(len(points), None, dtype=object)
+        cities = numpy.full(len(points), None, dtype=object)
+        citycodes[found] = self.citycodes[indexes[found]]
+        cities[found] = self.cities[indexes[found]]
+        return citycodes, cities
+
+    def add_cities(self, dataframe):
+        """
+        Same interface as app.utils.get_cities:
+        add citycode and city cols to the dataframe
+        :param dataframe: dataframe with x and y cols (lambert93)
+        :return: dataframe with citycode and city inside
+        """
+        dataframe["citycode"], dataframe["city"] = self.lookup(
+            dataframe["x"], dataframe["y"]
+        )
+        return dataframe
+
+
+@lru_cache(maxsize=None)
+def get_reverse_geocoder():
+    """
+    Local reverse geocoder configured with the COMMUNES_FILE env var
+    :return: LocalReverseGeocoder, or None to use the remote api-adresse service
+    """
+    communes_file = os.getenv("COMMUNES_FILE")
+    if not communes_file:
+        return None
+    return LocalReverseGeocoder.from_file(
+        communes_file,
+        max_distance=float(
+            os.getenv("REVERSE_GEOCODER_MAX_DISTANCE", str(DEFAULT_MAX_DISTANCE))
+        ),
+    )
@@ -0,0 +1,63 @@
+"""
+Single Flight Module
+
+Coalescing of concurrent identical async calls: while a call is in flight,
+callers with the same key await its result instead of running their own
+"""
+import asyncio
+from functools import partial
+
+
+class SingleFlight:
+    """
+    In-flight calls by key, with the number of executed and coalesced calls
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self.calls)
+
+    async def run(self, key, function):
+        """
+        Run function, or join the in-flight call of the same key.
+        The call runs in a task of its own: a cancelled caller does not cancel
+        it for the other ones
+        :param key: hashable key of the call
+        :param function: coroutine function, called without arguments
+        :return: result of the call, its exception is raised to every caller
+        """
+        task = self.calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(function())
+            self.calls[key] = task
+            task.add_done_callback(partial(self.done, key))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def done(self, key, task):
+        """
+        Forget a finished call, the next one with its key runs again
+        :param key: key of the call
+        :param task: finished task
+        """
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        if not task.cancelled():
+            # raised to the callers, not an unhandled task exception
+            task.exception()
+
+    def stats(self):
+        """
+        :return: executed, coalesced and in-flight calls
+        """
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": len(self.calls),
+        }
@@ -0,0 +1,260 @@
+"""
+Snapshot Module
+
+In-process copy of the aggregated coverage, to serve /network/coverage
+without any database round trip, built from the db or mapped from the
+snapshot file written at ingest
+"""
+import abc
+import hashlib
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from functools import partial
+
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+
+from app.db import crud
+from app.db.database import SessionLocal
+from app.log import logger
+from app.singleflight import SingleFlight
+from app.snapshot_file import (NETWORKS, MappedCoverageSnapshot,
+                               write_snapshot_file)
+
+load_dotenv()
+
+# seconds between two checks of the snapshot file for a newer copy
+SNAPSHOT_FILE_CHECK_INTERVAL = 1.0
+
+
+class CoverageSnapshot:
+    """
+    Immutable city -> ((operator, networks bitmask), ...) mapping.
+    Bit i of the bitmask is set when NETWORKS[i] is available
+    """
+
+    __slots__ = ("coverage", "version", "loaded_at")
+
+    def __init__(self, rows):
+        """
+        :param rows: iterable of (city, operator, 2G, 3G, 4G),
+         operator is None for a city without coverage
+        """
+        coverage = {}
+        digest = hashlib.sha1()
+        for city, operator, *networks in sorted(
+            rows, key=lambda row: (row[0], row[1] or "")
+        ):
+            city_coverage = coverage.setdefault(city, [])
+            if operator is None:
+                continue
+            mask = sum(1 << i for i, network in enumerate(networks) if network)
+            city_coverage.append((sys.intern(operator), mask))
+            digest.update(f"{city}|{operator}|{mask}\n".encode("utf-8"))
+        self.coverage = {city: tuple(values) for city, values in coverage.items()}
+        self.version = digest.hexdigest()[:16]
+        self.loaded_at = datetime.now(timezone.utc)
+
+    def __len__(self):
+        return len(self.coverage)
+
+    def get_network_coverage(self, city):
+        """
+        Same structure as crud.get_network_coverage
+        :param city: city
+        :return: json structure, None when the city is unknown
+        """
+        city_coverage = self.coverage.get(city)
+        if city_coverage is None:
+            return None
+        return {
+            operator: {
+                network: bool(mask & (1 << i)) for i, network in enumerate(NETWORKS)
+            }
+            for operator, mask in city_coverage
+        }
+
+
+class MappedFileStore(abc.ABC):
+    """
+    Watches the file a store maps, to reload it once another process replaced it
+    """
+
+    def __init__(self, file=None):
+        """
+        :param file: mapped file
+        """
+        self.file = file
+        self.checked_at = 0.0
+        self.file_mtime = None
+        self.flight = SingleFlight()
+
+    @abc.abstractmethod
+    def current(self):
+        """
+        :return: loaded value, None before the first load
+        """
+
+    @abc.abstractmethod
+    def load(self, database=None):
+        """
+        Build a new value and swap it with the current one
+        :param database: db, a new session is used when not given
+        :return: new value
+        """
+
+    def loaded(self):
+        """
+        Current value for read-only lookups, loads only happen
+        in ensure_loaded and on dataset changes
+        :return: loaded value
+        """
+        value = self.current()
+        if value is None:
+            raise RuntimeError(f"{type(self).__name__} is not loaded yet")
+        return value
+
+    async def ensure_loaded(self):
+        """
+        Load in a threadpool when nothing is loaded yet or the file was
+        replaced, so that the event loop never waits on the db nor the disk.
+        Concurrent callers share one load
+        :return: loaded value
+        """
+        if self.current() is None or self.file_changed():
+            await self.flight.run("load", partial(run_in_threadpool, self.load))
+        return self.current()
+
+    def file_changed(self):
+        """
+        Whether another process (ingest, other worker) wrote a newer
+        file, checked at most every SNAPSHOT_FILE_CHECK_INTERVAL seconds
+        :return: bool
+        """
+        if (
+            not self.file
+            or time.monotonic() - self.checked_at < SNAPSHOT_FILE_CHECK_INTERVAL
+        ):
+            return False
+        self.checked_at = time.monotonic()
+        return self.stat_file() != self.file_mtime
+
+    def stat_file(self):
+        """
+        :return: modification time (ns) of the file, None when absent
+        """
+        if not self.file:
+            return None
+        try:
+            return os.stat(self.file).st_mtime_ns
+        except OSError:
+            return None
+
+
+class CoverageStore(MappedFileStore):
+    """
+    Holds the current snapshot, swapped atomically on reload
+    """
+
+    def __init__(self, enabled, file=None):
+        """
+        :param enabled: serve coverage from memory instead of the db
+        :param file: snapshot file, mapped instead of querying the db when present
+        """
+        super().__init__(file)
+        self.enabled = enabled
+        self.snapshot = None
+
+    def current(self):
+        """
+        :return: current snapshot, None before the first load
+        """
+        return self.snapshot
+
+    def load_file(self):
+        """
+        Map the snapshot file
+        :return: MappedCoverageSnapshot, None when the file is absent or invalid
+        """
+        if self.stat_file() is None:
+            return None
+        try:
+            return MappedCoverageSnapshot(self.file)
+        except (OSError, ValueError) as exc:
+            logger.warning(f"Coverage snapshot file ignored: {exc}")
+            return None
+
+    def load(self, database=None):
+        """
+        Build a new snapshot, from the snapshot file when present or else from db,
+        and swap it with the current one
+        :param database: db, a new session is used when not given
+        :return: new snapshot
+        """
+        self.checked_at = time.monotonic()
+        self.file_mtime = self.stat_file()
+        snapshot = self.load_file() if database is None else None
+        if snapshot is not None:
+            self.snapshot = snapshot
+            logger.info(
+                f"Coverage snapshot {snapshot.version} mapped from {self.file}: "
+                f"{len(snapshot)} cities"
+            )
+            return snapshot
+        if database is None:
+            with SessionLocal() as session:
+                return self.load(session)
+        snapshot = CoverageSnapshot(crud.get_all_network_coverage(database))
+        self.snapshot = snapshot
+        logger.info(
+            f"Coverage snapshot {snapshot.version} loaded: {len(snapshot)} cities"
+        )
+        return snapshot
+
+    def get_network_coverage(self, city):
+        """
+        Lookup a city in the current snapshot, see ensure_loaded
+        :param city: city
+        :return: json structure, None when the city is unknown
+        """
+        return self.loaded().get_network_coverage(city)
+
+    def info(self):
+        """
+        :return: serving mode, version and load time of the current snapshot
+        """
+        snapshot = self.snapshot
+        return {
+            "mode": "memory" if self.enabled else "database",
+            "source": getattr(snapshot, "path", "database") if snapshot else None,
+            "version": snapshot.version if snapshot else None,
+            "loaded_at": snapshot.loaded_at.isoformat() if snapshot else None,
+            "cities": len(snapshot) if snapshot else 0,
+        }
+
+
+def export_snapshot_file(path, database=None):
+    """
+    Write the coverage and antennas of the db to a snapshot file
+    :param path: snapshot file
+    :param database: db, a new session is used when not given
+    :return: dataset version
+    """
+    if database is None:
+        with SessionLocal() as session:
+            return export_snapshot_file(path, session)
+    version = write_snapshot_file(
+        path,
+        crud.get_all_network_coverage(database),
+        crud.get_antennas(database),
+    )
+    logger.info(f"Coverage snapshot {version} written to {path}")
+    return version
+
+
+coverage_store = CoverageStore(
+    enabled=os.getenv("COVERAGE_SERVING_MODE", "database") == "memory",
+    file=os.getenv("COVERAGE_SNAPSHOT_FILE"),
+)
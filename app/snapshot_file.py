@@ -0,0 +1,285 @@
+"""
+Snapshot File Module
+
+Compact binary copy of the coverage, written at ingest and memory-mapped
+read-only by the api workers: every worker of a host shares the same
+page-cached copy, and starts without querying the db.
+
+File format (little-endian):
+    magic b"NCOVSNAP", format version (uint32), json header length (uint32),
+    json header: dataset version, creation time, and the offset, dtype and
+    shape of each array,
+    arrays, 64 bytes aligned:
+        city_offsets, city_names: city names (utf-8), sorted by bytes
+        operator_offsets, operator_names: operator names (utf-8)
+        coverage_offsets: coverage rows of each city (CSR)
+        coverage_operators, coverage_masks: operator index and networks
+         bitmask (bit i set when NETWORKS[i] is available) of each row
+        antenna_operators, antenna_xy, antenna_masks: optional antennas,
+         lambert93 coords
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from bisect import bisect_left
+from datetime import datetime, timezone
+
+import numpy
+
+MAGIC = b"NCOVSNAP"
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct("<8sII")
+ALIGNMENT = 64
+NETWORKS = ("2G", "3G", "4G")
+
+
+def string_table(strings):
+    """
+    :param strings: list of str
+    :return: offsets (uint32), utf-8 bytes (uint8)
+    """
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = numpy.zeros(len(encoded) + 1, dtype="<u4")
+    offsets[1:] = numpy.cumsum([len(value) for value in encoded])
+    return offsets, numpy.frombuffer(b"".join(encoded), dtype="u1")
+
+
+def write_array_file(path, magic, metadata, arrays):
+    """
+    Write named numpy arrays after a preamble and a json header,
+    atomically replacing the previous file
+    :param path: file
+    :param magic: 8 bytes identifying the kind of file
+    :param metadata: json serializable dict, stored in the header
+    :param arrays: dict of numpy arrays, each one 64 bytes aligned
+    """
+    # offsets depend on the header length, which depends on the offsets
+    layout = {}
+    data_start = 0
+    while True:
+        offset = data_start
+        for name, array in arrays.items():
+            layout[name] = [offset, array.dtype.str, list(array.shape)]
+            offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        header = json.dumps({**metadata, "arrays": layout}).encode("utf-8")
+        needed = -(-(PREAMBLE.size + len(header)) // ALIGNMENT) * ALIGNMENT
+        if needed == data_start:
+            break
+        data_start = needed
+
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as file:
+        file.write(PREAMBLE.pack(magic, FORMAT_VERSION, len(header)))
+        file.write(header)
+        for name, array in arrays.items():
+            file.seek(layout[name][0])
+            file.write(numpy.ascontiguousarray(array).tobytes())
+        file.truncate(max(file.tell(), data_start))
+    os.replace(file.name, path)
+
+
+def map_array_file(path, magic):
+    """
+    Map a file written by write_array_file, read-only
+    :param path: file
+    :param magic: expected 8 bytes identifying the kind of file
+    :return: json header, dict of read-only numpy arrays
+    """
+    with open(path, "rb") as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    found, format_version, header_length = PREAMBLE.unpack_from(buffer)
+    if found != magic:
+        raise ValueError(f"{path} is not a {magic.decode()} file")
+    if format_version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported file format {format_version} in {path}")
+    header = json.loads(buffer[PREAMBLE.size : PREAMBLE.size + header_length])
+    arrays = {
+        name: numpy.frombuffer(
+            buffer,
+            dtype=dtype,
+            count=int(numpy.prod(shape)),
+            offset=offset,
+        ).reshape(shape)
+        for name, (offset, dtype, shape) in header["arrays"].items()
+    }
+    return header, arrays
+
+
+def networks_mask(networks):
+    """
+    :param networks: 2G, 3G and 4G availability
+    :return: bitmask, bit i set when NETWORKS[i] is available
+    """
+    return sum(1 << i for i, network in enumerate(networks) if network)
+
+
+def coverage_version(coverage):
+    """
+    :param coverage: networks bitmask by operator, by city
+    :return: dataset version, same as CoverageSnapshot.version
+    """
+    digest = hashlib.sha1()
+    for city in sorted(coverage):
+        for operator in sorted(coverage[city]):
+            digest.update(f"{city}|{operator}|{coverage[city][operator]}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def pack_coverage(coverage, operator_index):
+    """
+    :param coverage: networks bitmask by operator, by city
+    :param operator_index: index of each operator in the operator string table
+    :return: city string table and coverage arrays (CSR), cities sorted by bytes
+    """
+    cities = sorted(coverage, key=lambda city: city.encode("utf-8"))
+    rows = [
+        (operator_index[operator], mask)
+        for city in cities
+        for operator, mask in sorted(coverage[city].items())
+    ]
+    arrays = {}
+    arrays["city_offsets"], arrays["city_names"] = string_table(cities)
+    arrays["coverage_offsets"] = numpy.zeros(len(cities) + 1, dtype="<u4")
+    arrays["coverage_offsets"][1:] = numpy.cumsum(
+        [len(coverage[city]) for city in cities]
+    )
+    arrays["coverage_operators"] = numpy.array([row[0] for row in rows], dtype="<u2")
+    arrays["coverage_masks"] = numpy.array([row[1] for row in rows], dtype="u1")
+    return arrays
+
+
+def pack_antennas(antennas, operator_index):
+    """
+    :param antennas: list of (operator, x, y, networks bitmask)
+    :param operator_index: index of each operator in the operator string table
+    :return: antenna arrays, none without antenna
+    """
+    if not antennas:
+        return {}
+    return {
+        "antenna_operators": numpy.array(
+            [operator_index[antenna[0]] for antenna in antennas], dtype="<u2"
+        ),
+        "antenna_xy": numpy.array([antenna[1:3] for antenna in antennas], dtype="<f8"),
+        "antenna_masks": numpy.array([antenna[3] for antenna in antennas], dtype="u1"),
+    }
+
+
+def write_snapshot_file(path, coverage_rows, antenna_rows=()):
+    """
+    Write a snapshot file, atomically replacing the previous one:
+    workers still mapping it keep reading the old copy until they reload
+    :param path: snapshot file
+    :param coverage_rows: iterable of (city, operator, 2G, 3G, 4G),
+     operator is None for a city without coverage
+    :param antenna_rows: iterable of (operator, x, y, 2G, 3G, 4G)
+    :return: dataset version, same as CoverageSnapshot.version
+    """
+    coverage = {}
+    for city, operator, *networks in coverage_rows:
+        city_coverage = coverage.setdefault(city, {})
+        if operator is not None:
+            city_coverage[operator] = networks_mask(networks)
+    antennas = [
+        (operator, x, y, networks_mask(networks))
+        for operator, x, y, *networks in antenna_rows
+    ]
+    operators = sorted(
+        {operator for values in coverage.values() for operator in values}
+        | {antenna[0] for antenna in antennas}
+    )
+    operator_index = {operator: index for index, operator in enumerate(operators)}
+
+    arrays = {}
+    arrays["operator_offsets"], arrays["operator_names"] = string_table(operators)
+    arrays.update(pack_coverage(coverage, operator_index))
+    arrays.update(pack_antennas(antennas, operator_index))
+    version = coverage_version(coverage)
+    write_array_file(
+        path,
+        MAGIC,
+        {"version": version, "created_at": datetime.now(timezone.utc).isoformat()},
+        arrays,
+    )
+    return version
+
+
+class MappedCoverageSnapshot:
+    """
+    Read-only view of a snapshot file, with the CoverageSnapshot interface
+    """
+
+    def __init__(self, path):
+        """
+        :param path: snapshot file
+        """
+        header, self.arrays = map_array_file(path, MAGIC)
+        self.path = path
+        self.version = header["version"]
+        self.loaded_at = datetime.now(timezone.utc)
+        offsets = self.arrays["operator_offsets"]
+        names = self.arrays["operator_names"].tobytes()
+        self.operators = [
+            names[offsets[i] : offsets[i + 1]].decode("utf-8")
+            for i in range(len(offsets) - 1)
+        ]
+
+    def __len__(self):
+        return len(self.arrays["city_offsets"]) - 1
+
+    def city_name(self, index):
+        """
+        :param index: city index
+        :return: city name, as utf-8 bytes
+        """
+        offsets = self.arrays["city_offsets"]
+        return self.arrays["city_names"][offsets[index] : offsets[index + 1]].tobytes()
+
+    def find_city(self, city):
+        """
+        Binary search of a city in the sorted city names
+        :param city: city
+        :return: city index, None when unknown
+        """
+        target = city.encode("utf-8")
+        index = bisect_left(range(len(self)), target, key=self.city_name)
+        if index < len(self) and self.city_name(index) == target:
+            return index
+        return None
+
+    def get_network_coverage(self, city):
+        """
+        Same structure as crud.get_network_coverage
+        :param city: city
+        :return: json structure, None when the city is unknown
+        """
+        index = self.find_city(city)
+        if index is None:
+            return None
+        start, end = self.arrays["coverage_offsets"][index : index + 2]
+        return {
+            self.operators[operator]: {
+                network: bool(mask & (1 << i)) for i, network in enumerate(NETWORKS)
+            }
+            for operator, mask in zip(
+                self.arrays["coverage_operators"][start:end].tolist(),
+                self.arrays["coverage_masks"][start:end].tolist(),
+            )
+        }
+
+    def antennas(self):
+        """
+        :return: (operator of each antenna, lambert93 coords, networks bitmasks),
+         None when the file has no antennas
+        """
+        if "antenna_xy" not in self.arrays:
+            return None
+        operators = numpy.array(self.operators, dtype=object)
+        return (
+            operators[self.arrays["antenna_operators"]],
+            self.arrays["antenna_xy"],
+            self.arrays["antenna_masks"],
+        )
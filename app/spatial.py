@@ -0,0 +1,156 @@
+"""
+Spatial Module
+
+In-memory KD-tree index of antenna sites, to answer radius queries
+around a gps position. scipy and pyproj are imported on first use,
+api workers not serving radius queries never load them
+"""
+import time
+from datetime import datetime, timezone
+
+import numpy
+
+from app.db import crud
+from app.db.database import SessionLocal
+from app.log import logger
+from app.snapshot import NETWORKS, MappedFileStore, coverage_store
+
+
+class AntennaIndex:
+    """
+    One KD-tree of lambert93 coords per operator,
+    with the networks bitmask of each antenna
+    """
+
+    def __init__(self, rows):
+        """
+        :param rows: iterable of (operator, x, y, 2G, 3G, 4G)
+        """
+        from scipy.spatial import cKDTree  # pylint: disable=C0415
+
+        by_operator = {}
+        for operator, lambert_x, lambert_y, *networks in rows:
+            mask = sum(1 << i for i, network in enumerate(networks) if network)
+            by_operator.setdefault(operator, []).append((lambert_x, lambert_y, mask))
+        self.trees = {}
+        self.masks = {}
+        for operator, antennas in by_operator.items():
+            antennas = numpy.array(antennas, dtype="float64")
+            self.trees[operator] = cKDTree(antennas[:, :2])
+            self.masks[operator] = antennas[:, 2].astype("uint8")
+        self.indexed()
+
+    @classmethod
+    def from_arrays(cls, operators, coords, masks):
+        """
+        Build the index from the antenna arrays of a snapshot file
+        :param operators: operator of each antenna
+        :param coords: lambert93 coords, (n, 2) array
+        :param masks: networks bitmask of each antenna
+        :return: AntennaIndex
+        """
+        from scipy.spatial import cKDTree  # pylint: disable=C0415
+
+        index = cls.__new__(cls)
+        index.trees = {}
+        index.masks = {}
+        for operator in numpy.unique(operators):
+            selected = operators == operator
+            index.trees[operator] = cKDTree(coords[selected])
+            index.masks[operator] = numpy.asarray(masks[selected], dtype="uint8")
+        index.indexed()
+        return index
+
+    def indexed(self):
+        """
+        Record the size and load time of the index
+        """
+        self.size = sum(len(masks) for masks in self.masks.values())
+        self.loaded_at = datetime.now(timezone.utc)
+
+    def __len__(self):
+        return self.size
+
+    def nearby(self, lon, lat, radius):
+        """
+        Networks available within a radius, by operator
+        :param lon: longitude
+        :param lat: latitude
+        :param radius: radius (meters)
+        :return: json structure, with the distance (meters) to the nearest antenna
+        """
+        from app.projection import wgs84_to_lambert93  # pylint: disable=C0415
+
+        point = numpy.array(wgs84_to_lambert93(lon, lat), dtype="float64")
+        results = {}
+        for operator, tree in self.trees.items():
+            distance, _ = tree.query(point)
+            # 0 without antenna in the radius, the identity of bitwise_or
+            mask = numpy.bitwise_or.reduce(
+                self.masks[operator][tree.query_ball_point(point, radius)]
+            )
+            results[operator] = {
+                **{
+                    network: bool(mask & (1 << i)) for i, network in enumerate(NETWORKS)
+                },
+                "distance": round(float(distance), 1),
+            }
+        return results
+
+
+class AntennaStore(MappedFileStore):
+    """
+    Holds the current antenna index, swapped atomically on reload
+    """
+
+    def __init__(self, file=None):
+        """
+        :param file: snapshot file, the index is built again once it is replaced
+        """
+        super().__init__(file)
+        self.index = None
+
+    def current(self):
+        """
+        :return: current index, None before the first load
+        """
+        return self.index
+
+    def load(self, database=None):
+        """
+        Build a new index, from the antennas of the snapshot file when present
+        or else from db, and swap it with the current one
+        :param database: db, a new session is used when not given
+        :return: new index
+        """
+        self.checked_at = time.monotonic()
+        self.file_mtime = self.stat_file()
+        snapshot = coverage_store.load_file() if database is None else None
+        antennas = snapshot.antennas() if snapshot is not None else None
+        if antennas is not None:
+            index = AntennaIndex.from_arrays(*antennas)
+            self.index = index
+            logger.info(
+                f"Antenna index built from {snapshot.path}: {len(index)} antennas"
+            )
+            return index
+        if database is None:
+            with SessionLocal() as session:
+                return self.load(session)
+        index = AntennaIndex(crud.get_antennas(database))
+        self.index = index
+        logger.info(f"Antenna index loaded: {len(index)} antennas")
+        return index
+
+    def nearby(self, lon, lat, radius):
+        """
+        Radius query on the current index, see ensure_loaded
+        :param lon: longitude
+        :param lat: latitude
+        :param radius: radius (meters)
+        :return: json structure
+        """
+        return self.loaded().nearby(lon, lat, radius)
+
+
+antenna_store = AntennaStore(file=coverage_store.file)
@@ -0,0 +1,55 @@
+"""Shared test fixtures"""
+import os
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import utils
+from app.db import crud
+from app.db.database import Base
+from app.reverse_geocoder import LocalReverseGeocoder
+
+
+@pytest.fixture(name="engine")
+def engine_fixture(monkeypatch):
+    """
+    Provide an in-memory sqlite engine used by crud,
+    with cities resolved by the local reverse geocoder
+    """
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    ).execution_options(schema_translate_map={os.getenv("SCHEMA"): None})
+    Base.metadata.create_all(engine)
+    geocoder = LocalReverseGeocoder.from_file("app/resources/communes_sample.csv")
+    monkeypatch.setattr(crud, "engine", engine)
+    monkeypatch.setattr(utils, "get_reverse_geocoder", lambda: geocoder)
+    return engine
+
+
+@pytest.fixture(name="database")
+def database_fixture(engine):
+    """Provide a session on the sqlite engine"""
+    database = sessionmaker(bind=engine)()
+    yield database
+    database.close()
+
+
+@pytest.fixture(name="file_url")
+def file_url_fixture(engine, monkeypatch, tmp_path):  # pylint: disable=W0613
+    """
+    Provide a sqlite file db, shared by the sync and async engines,
+    with data_short.csv ingested
+    """
+    url = f"sqlite:///{tmp_path / 'coverage.sqlite'}"
+    engine = create_engine(url).execution_options(
+        schema_translate_map={os.getenv("SCHEMA"): None}
+    )
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(crud, "engine", engine)
+    with open("app/resources/data_short.csv", "rb") as file:
+        assert crud.save_to_db(file)
+    return url
@@ -7,8 +7,12 @@ from app.main import app
 
 @pytest.fixture(name="client")
 def client_fixture():
-    """Provide a testclient instance for tests"""
-    return TestClient(app)
+    """
+    Provide a testclient instance for tests,
+    requests share one event loop as async db connections are bound to it
+    """
+    with TestClient(app) as client:
+        yield client
 
 
 def test_health(client):
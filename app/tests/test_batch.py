@@ -0,0 +1,152 @@
+"""Test batch module"""
+import asyncio
+import json
+from functools import partial
+
+import pytest
+
+from app.batch import (coverage_batch, geocode_concurrently, geocode_in_bulk,
+                       parse_adresses)
+
+CITIES = {"1 rue de paris": "Paris", "2 rue de lyon": "Lyon", "nowhere": None}
+COVERAGE = {"Orange": {"2G": True, "3G": True, "4G": True}}
+
+
+async def geocode(adress):
+    """Fake geocoder"""
+    await asyncio.sleep(0)
+    if adress == "boom":
+        raise ValueError("No result found for adress: boom")
+    return {"city": CITIES[adress.lower()]}
+
+
+async def search_csv(adresses):
+    """Fake bulk geocoder"""
+    return [{"city": CITIES[adress.lower()]} for adress in adresses]
+
+
+async def get_coverages(cities):
+    """Fake coverage query, only Paris is in db"""
+    return {(citycode, city): COVERAGE for citycode, city in cities if city == "Paris"}
+
+
+def run(adresses, geocoded, **options):
+    """
+    Run a batch, and record the cities queried for coverage
+    :param options: coverage_batch options
+    :return: results by adress, list of queried cities
+    """
+    queries = []
+
+    async def recorded_coverages(cities):
+        queries.append(sorted(city for _, city in cities))
+        return await get_coverages(cities)
+
+    async def collect():
+        return [
+            json.loads(line)
+            async for line in coverage_batch(
+                adresses, geocoded, recorded_coverages, **options
+            )
+        ]
+
+    results = asyncio.run(collect())
+    return {result["adress"]: result for result in results}, queries
+
+
+def test_concurrent_batch():
+    """
+    Every adress gets a line, duplicated adresses are geocoded once
+    :return: Assertions ok
+    """
+    adresses = ["1 rue de Paris", "1 RUE DE PARIS", "2 rue de Lyon", "nowhere", "boom"]
+
+    results, queries = run(adresses, partial(geocode_concurrently, geocode=geocode))
+
+    assert len(results) == 5
+    assert results["1 rue de Paris"]["coverage"] == COVERAGE
+    assert results["1 RUE DE PARIS"]["coverage"] == COVERAGE
+    assert "does not correspond" in results["2 rue de Lyon"]["error"]
+    assert results["nowhere"]["error"] == "This adress is not linked to a city"
+    assert results["boom"]["error"] == "No result found for adress: boom"
+    assert queries == [["Lyon", "Paris"]]
+
+
+def test_batch_intervals():
+    """
+    Without interval, coverages are fetched as soon as adresses are geocoded,
+    each city still once
+    :return: Assertions ok
+    """
+    adresses = ["1 rue de Paris", "2 rue de Lyon", "1 RUE DE PARIS", "nowhere"]
+
+    results, queries = run(
+        adresses, partial(geocode_concurrently, geocode=geocode), interval=0
+    )
+
+    assert results["1 RUE DE PARIS"]["coverage"] == COVERAGE
+    assert sorted(sum(queries, [])) == ["Lyon", "Paris"]
+
+
+def test_batch_interval_deadline():
+    """
+    Geocoded adresses are streamed once the interval passed,
+    without waiting for a slower geocode to complete
+    :return: Assertions ok
+    """
+
+    async def collect():
+        released = asyncio.Event()
+
+        async def slow_geocode(adress):
+            if adress == "2 rue de Lyon":
+                await released.wait()
+            return await geocode(adress)
+
+        lines = []
+        async for line in coverage_batch(
+            ["1 rue de Paris", "2 rue de Lyon"],
+            partial(geocode_concurrently, geocode=slow_geocode),
+            get_coverages,
+            interval=0.01,
+        ):
+            lines.append(json.loads(line)["adress"])
+            # the Lyon geocode only completes once Paris has been streamed
+            released.set()
+        return lines
+
+    lines = asyncio.run(asyncio.wait_for(collect(), timeout=5))
+
+    assert lines == ["1 rue de Paris", "2 rue de Lyon"]
+
+
+def test_bulk_batch():
+    """
+    Coverage of all cities is fetched with a single query in bulk mode
+    :return: Assertions ok
+    """
+    results, queries = run(
+        ["1 rue de Paris", "2 rue de Lyon"],
+        partial(geocode_in_bulk, search_csv=search_csv),
+    )
+
+    assert results["1 rue de Paris"]["city"] == "Paris"
+    assert queries == [["Lyon", "Paris"]]
+
+
+def test_parse_adresses():
+    """
+    Adresses are read from json or csv
+    :return: Assertions ok
+    """
+    assert parse_adresses(b'["a", "b"]', "application/json", 10) == ["a", "b"]
+    assert parse_adresses(
+        'adress\n"1 rue de Paris, 75001"\nÉvry\n'.encode("utf-8"), "text/csv", 10
+    ) == ["1 rue de Paris, 75001", "Évry"]
+    assert parse_adresses(b"1 rue de Paris, 75001\n\n", "text/plain", 10) == [
+        "1 rue de Paris, 75001"
+    ]
+    with pytest.raises(ValueError):
+        parse_adresses(b'["a", "b"]', "application/json", 1)
+    with pytest.raises(ValueError):
+        parse_adresses(b'{"a": "b"}', "application/json", 10)
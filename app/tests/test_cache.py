@@ -0,0 +1,126 @@
+"""Test cache module"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.cache import MemoryBackend, SqliteBackend, TTLCache, normalize_address
+
+
+def test_normalize_address():
+    """
+    Case, accents, punctuation and spaces do not change the key
+    :return: Assertions ok
+    """
+    assert normalize_address("  Rue Marcel Magard,  63170 ") == normalize_address(
+        "rue marcel magard 63170"
+    )
+    assert normalize_address("Rue de l'Église, Créteil") == "rue de l eglise creteil"
+
+
+@pytest.fixture(name="backend", params=["memory", "sqlite"])
+def backend_fixture(request, tmp_path):
+    """Provide each cache backend, bounded to 2 entries"""
+    if request.param == "sqlite":
+        return SqliteBackend(tmp_path / "cache.sqlite", max_size=2, touch_interval=0)
+    return MemoryBackend(max_size=2)
+
+
+def test_hits_and_misses(backend):
+    """
+    Counters follow cache hits and misses
+    :param backend: cache backend
+    :return: Assertions ok
+    """
+    cache = TTLCache(backend, ttl=60)
+
+    assert cache.get("a") is None
+    cache.set("a", {"city": "Paris"})
+
+    assert cache.get("a") == {"city": "Paris"}
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_async_access(backend):
+    """
+    Async callers read and write a blocking backend off the event loop thread
+    :param backend: cache backend
+    :return: Assertions ok
+    """
+    cache = TTLCache(backend, ttl=60)
+    threads = []
+    backend_set = backend.set
+
+    def recorded_set(*args):
+        threads.append(threading.get_ident())
+        backend_set(*args)
+
+    backend.set = recorded_set
+
+    async def access():
+        await cache.set_async("a", {"city": "Paris"})
+        return await cache.get_async("a")
+
+    assert asyncio.run(access()) == {"city": "Paris"}
+    assert (threads[0] != threading.get_ident()) is backend.blocking
+
+
+def test_lru_eviction(backend):
+    """
+    The least recently used entry is evicted first
+    :param backend: cache backend
+    :return: Assertions ok
+    """
+    cache = TTLCache(backend, ttl=60)
+    cache.set("a", 1)
+    time.sleep(0.01)
+    cache.set("b", 2)
+    time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_ttl_expiry(backend):
+    """
+    Expired entries are not returned
+    :param backend: cache backend
+    :return: Assertions ok
+    """
+    cache = TTLCache(backend, ttl=-1)
+    cache.set("a", 1)
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_sqlite_persistence(tmp_path):
+    """
+    The sqlite backend survives a restart
+    :return: Assertions ok
+    """
+    TTLCache(SqliteBackend(tmp_path / "cache.sqlite", 10), ttl=60).set("a", [1, 2])
+
+    cache = TTLCache(SqliteBackend(tmp_path / "cache.sqlite", 10), ttl=60)
+
+    assert cache.get("a") == [1, 2]
+
+
+def test_sqlite_hits_without_write(tmp_path):
+    """
+    Hits within the touch interval do not write the access time
+    :param tmp_path: temporary directory
+    :return: Assertions ok
+    """
+    backend = SqliteBackend(tmp_path / "cache.sqlite", 10, touch_interval=60)
+    cache = TTLCache(backend, ttl=60)
+    cache.set("a", 1)
+    changes = backend.connection.total_changes
+
+    assert [cache.get("a") for _ in range(3)] == [1, 1, 1]
+    assert backend.connection.total_changes == changes
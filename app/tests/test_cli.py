@@ -0,0 +1,76 @@
+"""Test cli module"""
+import os
+import shutil
+
+import pytest
+import sqlalchemy
+
+from app import cli
+from app.db import crud, models
+
+
+def test_ingest_resumes_after_crash(engine, tmp_path, monkeypatch):
+    """
+    An ingest interrupted while loading resumes after its last committed chunk
+    :param engine: sqlite engine
+    :param tmp_path: temporary directory
+    :return: Assertions ok
+    """
+    path = tmp_path / "data.csv"
+    shutil.copy("app/resources/data_short.csv", path)
+    checkpoint = f"{path}.checkpoint.json"
+    save_chunk_to_db = crud.save_chunk_to_db
+    loaded = []
+
+    def crash_on_second_chunk(network_cov_df, report, stage):
+        if len(loaded) == 1:
+            raise RuntimeError("Connection lost")
+        loaded.append(len(network_cov_df))
+        return save_chunk_to_db(network_cov_df, report, stage)
+
+    monkeypatch.setattr(crud, "save_chunk_to_db", crash_on_second_chunk)
+    with pytest.raises(RuntimeError):
+        cli.ingest(str(path), chunk_size=3)
+    assert os.path.exists(checkpoint)
+
+    resumed = []
+
+    def count_chunks(network_cov_df, report, stage):
+        resumed.append(len(network_cov_df))
+        return save_chunk_to_db(network_cov_df, report, stage)
+
+    monkeypatch.setattr(crud, "save_chunk_to_db", count_chunks)
+    report = cli.ingest(str(path), chunk_size=3)
+
+    assert len(resumed) == 2
+    assert not os.path.exists(checkpoint)
+    assert report["city"]["inserted"] == 5
+    assert report["antenna"]["inserted"] == 7
+    with engine.connect() as connection:
+        summary = connection.execute(
+            sqlalchemy.select(
+                sqlalchemy.func.count(
+                    sqlalchemy.distinct(models.CityOperatorCoverage.city_id)
+                )
+            )
+        ).scalar()
+    assert summary == 5
+
+
+def test_checkpoint_identity(tmp_path):
+    """
+    A checkpoint is ignored for another chunk size or a modified file
+    :param tmp_path: temporary directory
+    :return: Assertions ok
+    """
+    path = tmp_path / "data.csv"
+    shutil.copy("app/resources/data_short.csv", path)
+    checkpoint = tmp_path / "checkpoint.json"
+    identity = cli.file_identity(path, 3)
+    cli.save_checkpoint(checkpoint, identity, {"chunks": 1})
+
+    assert cli.load_checkpoint(checkpoint, identity) == {"chunks": 1}
+    assert cli.load_checkpoint(checkpoint, cli.file_identity(path, 4)) is None
+    with open(path, "a", encoding="utf-8") as file:
+        file.write("20801;102980;6847973;1;1;0\n")
+    assert cli.load_checkpoint(checkpoint, cli.file_identity(path, 3)) is None
@@ -0,0 +1,368 @@
+"""Test crud module, against an in-memory sqlite db"""
+import asyncio
+import io
+import os
+
+import sqlalchemy
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db import crud, models, schemas
+from app.db.database import async_url, engine_options
+
+SCHEMA_MAP = {os.getenv("SCHEMA"): None}
+
+
+def test_save_to_db(database):
+    """
+    Ingest data_short.csv and read the aggregated coverage
+    :param database: db session
+    :return: Assertions ok
+    """
+    with open("app/resources/data_short.csv", "rb") as file:
+        assert crud.save_to_db(file)
+
+    assert [city.name for city in crud.get_cities(database)] == [
+        "Ouessant",
+        "Île-Molène",
+        "Île-de-Sein",
+        "Le Conquet",
+        "Plogoff",
+    ]
+    assert crud.get_network_coverage(database, city="29155") == {
+        "Orange": {"2G": True, "3G": True, "4G": False},
+        "S.F.R.": {"2G": True, "3G": True, "4G": False},
+        "Bouygues Telecom": {"2G": True, "3G": True, "4G": True},
+    }
+    assert crud.get_network_coverage(database, city="Paris") == {}
+
+
+def test_coverage_is_ored_per_operator(database):
+    """
+    Coverage of several antennas of an operator in a city are merged
+    :param database: db session
+    :return: Assertions ok
+    """
+    data = b"Operateur;x;y;2G;3G;4G\n20801;102980;6847973;1;0;0\n20801;103113;6848661;0;0;1\n"
+
+    assert crud.save_to_db(io.BytesIO(data))
+
+    assert crud.get_network_coverage(database, city="29155") == {
+        "Orange": {"2G": True, "3G": False, "4G": True},
+    }
+
+
+def test_save_to_db_by_chunks(database):
+    """
+    Rows duplicated across chunks are saved once
+    :param database: db session
+    :return: Assertions ok
+    """
+    data = (
+        b"Operateur;x;y;2G;3G;4G\n"
+        b"20801;102980;6847973;1;1;0\n"
+        b"20820;124695;6799102;1;0;0\n"
+        b"20801;102980;6847973;1;1;0\n"
+        b"20801;103113;6848661;1;1;0\n"
+    )
+
+    assert crud.save_to_db(io.BytesIO(data), chunk_size=2)
+
+    assert [city.name for city in crud.get_cities(database)] == ["Ouessant", "Plogoff"]
+    assert len(database.query(models.NetworkCoverage).all()) == 2
+    assert crud.get_network_coverage(database, city="29168") == {
+        "Bouygues Telecom": {"2G": True, "3G": False, "4G": False},
+    }
+
+
+def test_save_to_db_twice(database):
+    """
+    Loading the same file twice only writes it once
+    :param database: db session
+    :return: Assertions ok
+    """
+    with open("app/resources/data_short.csv", "rb") as file:
+        first = crud.save_to_db(file)
+    with open("app/resources/data_short.csv", "rb") as file:
+        second = crud.save_to_db(file, chunk_size=3)
+
+    assert first["city"] == {"inserted": 5, "updated": 0, "skipped": 0}
+    assert first["network_coverage"] == {"inserted": 7, "updated": 0, "skipped": 0}
+    assert second["city"]["inserted"] == second["operator"]["inserted"] == 0
+    assert second["network_coverage"] == {"inserted": 0, "updated": 0, "skipped": 7}
+    assert len(database.query(models.NetworkCoverage).all()) == 7
+
+
+def test_save_to_db_overlap(database):
+    """
+    Only the delta of an overlapping file is written
+    :param database: db session
+    :return: Assertions ok
+    """
+    header = b"Operateur;x;y;2G;3G;4G\n"
+    crud.save_to_db(io.BytesIO(header + b"20801;102980;6847973;1;1;0\n"))
+
+    report = crud.save_to_db(
+        io.BytesIO(header + b"20801;102980;6847973;1;1;0\n20801;102980;6847973;1;1;1\n")
+    )
+
+    assert report["city"] == {"inserted": 0, "updated": 0, "skipped": 1}
+    assert report["network_coverage"] == {"inserted": 1, "updated": 0, "skipped": 1}
+    assert crud.get_network_coverage(database, city="29155") == {
+        "Orange": {"2G": True, "3G": True, "4G": True},
+    }
+
+
+def test_city_keys(database):
+    """
+    Cities are stored with their citycode and looked up by it,
+    a city added by name only is given its citycode instead of being duplicated
+    :param database: db session
+    :return: Assertions ok
+    """
+    crud.create_city(database, city=schemas.PydanticCityNoId(name="Ouessant"))
+    crud.create_city(database, city=schemas.PydanticCityNoId(name="Lyon"))
+
+    crud.save_to_db(io.BytesIO(b"Operateur;x;y;2G;3G;4G\n20801;102980;6847973;1;1;0\n"))
+
+    assert crud.get_city_by_code(database, code="29155").name == "Ouessant"
+    assert len(crud.get_cities(database)) == 2
+    coverage = {"Orange": {"2G": True, "3G": True, "4G": False}}
+    assert crud.get_network_coverage_by_cities(
+        database, cities=["29155", "Ouessant", "Lyon"]
+    ) == {"29155": coverage}
+    assert {row[0] for row in crud.get_all_network_coverage(database)} == {
+        "29155",
+        "Lyon",
+    }
+
+
+def test_keyset_page_homonyms(database):
+    """
+    Pages hold at most limit rows, homonym cities split across pages
+    are neither skipped nor repeated
+    :param database: db session
+    :return: Assertions ok
+    """
+    for code, name in [
+        ("93066", "Saint-Denis"),
+        ("75056", "Paris"),
+        ("97411", "Saint-Denis"),
+        ("63014", "Aubière"),
+    ]:
+        crud.create_city(database, city=schemas.PydanticCityNoId(name=name, code=code))
+
+    def page(after=None, after_id=None):
+        statement = crud.keyset_page(
+            sqlalchemy.select(models.City), models.City, after, 3, after_id=after_id
+        )
+        return list(database.scalars(statement))
+
+    first = page()
+    assert [(city.name, city.code) for city in first] == [
+        ("Aubière", "63014"),
+        ("Paris", "75056"),
+        ("Saint-Denis", "93066"),
+    ]
+    assert [city.code for city in page(first[-1].name, first[-1].id)] == ["97411"]
+    assert page(after="Paris") == page(after="Paris", after_id=first[1].id)
+    assert not page(after="Saint-Denis")
+
+
+def test_save_to_db_updates_operator_code(database):
+    """
+    An operator known under another code is updated
+    :param database: db session
+    :return: Assertions ok
+    """
+    crud.create_operator(
+        database, operator=schemas.PydanticOperatorNoId(code=1, name="Orange")
+    )
+
+    report = crud.save_to_db(
+        io.BytesIO(b"Operateur;x;y;2G;3G;4G\n20801;102980;6847973;1;1;0\n")
+    )
+
+    assert report["operator"] == {"inserted": 0, "updated": 1, "skipped": 0}
+    database.expire_all()
+    assert crud.get_operator(database, code=20801).name == "Orange"
+
+
+def test_save_to_db_updates_antenna_networks(database):
+    """
+    A site ingested again with other networks is updated, not duplicated
+    :param database: db session
+    :return: Assertions ok
+    """
+    crud.save_to_db(io.BytesIO(b"Operateur;x;y;2G;3G;4G\n20801;102980;6847973;1;1;0\n"))
+
+    report = crud.save_to_db(
+        io.BytesIO(b"Operateur;x;y;2G;3G;4G\n20801;102980;6847973;0;1;1\n")
+    )
+
+    assert report["antenna"] == {"inserted": 0, "updated": 1, "skipped": 0}
+    assert [tuple(row) for row in crud.get_antennas(database)] == [
+        ("Orange", 102980.0, 6847973.0, False, True, True)
+    ]
+
+
+def test_network_coverage_filters(database):
+    """
+    Coverage of a city restricted to an operator and / or a technology
+    :param database: db session
+    :return: Assertions ok
+    """
+    with open("app/resources/data_short.csv", "rb") as file:
+        assert crud.save_to_db(file)
+
+    assert crud.get_network_coverage(database, city="29155", operator="Orange") == {
+        "Orange": {"2G": True, "3G": True, "4G": False}
+    }
+    assert crud.get_network_coverage(database, city="29155", technology="4G") == {
+        "Orange": {"4G": False},
+        "S.F.R.": {"4G": False},
+        "Bouygues Telecom": {"4G": True},
+    }
+    assert crud.get_network_coverage(
+        database, city="29155", operator="Bouygues Telecom", technology="3G"
+    ) == {"Bouygues Telecom": {"3G": True}}
+    assert crud.get_network_coverage(database, city="29155", operator="Free") == {}
+    assert [
+        coverage.operator_id
+        for coverage in crud.get_coverage_network(
+            database, operator="Orange", city="Ouessant"
+        )
+    ] == [crud.get_operator(database, code="20801").id]
+
+
+def run_async(url, read):
+    """
+    Run an async read on an AsyncSession of the db
+    :param url: db url
+    :param read: async function, AsyncSession -> result
+    :return: result
+    """
+
+    async def run():
+        async_engine = create_async_engine(async_url(url)).execution_options(
+            schema_translate_map=SCHEMA_MAP
+        )
+        async with AsyncSession(async_engine) as database:
+            result = await read(database)
+        await async_engine.dispose()
+        return result
+
+    return asyncio.run(run())
+
+
+def test_async_reads(file_url):
+    """
+    Async reads with aiosqlite see the data ingested with the sync engine
+    :param file_url: sqlite file db
+    :return: Assertions ok
+    """
+
+    async def read(database):
+        return (
+            await crud.get_city_async(database, city="Plogoff"),
+            await crud.get_city_async(database, city="Paris"),
+            await crud.get_cities_async(database),
+            await crud.get_operator_async(database, code="20801"),
+            await crud.get_operators_async(database),
+            await crud.get_network_coverage_async(database, city="29155"),
+            await crud.get_network_coverage_by_cities_async(
+                database, cities=["29155", "29168", "75056"]
+            ),
+        )
+
+    city, unknown, cities, operator, operators, coverage, by_cities = run_async(
+        file_url, read
+    )
+
+    assert city.name == "Plogoff"
+    assert unknown is None
+    assert len(cities) == 5
+    assert operator.name == "Orange"
+    assert len(operators) == 3
+    assert coverage == crud.get_network_coverage(
+        sessionmaker(bind=crud.engine)(), city="29155"
+    )
+    assert set(by_cities) == {"29155", "29168"}
+    assert by_cities["29155"] == coverage
+
+
+def test_keyset_pagination(file_url):
+    """
+    Pages of cities by name, and the same rows streamed by partitions,
+    with the fields of the json response
+    :param file_url: sqlite file db
+    :return: Assertions ok
+    """
+    city_fields = list(schemas.PydanticCityItem.__fields__)
+
+    async def read(database):
+        first = await crud.get_cities_async(database, limit=2)
+        second = await crud.get_cities_async(database, after=first[-1].name, limit=2)
+        last = await crud.get_cities_async(database, after=second[-1].name, limit=2)
+        streamed = [
+            rows
+            async for rows in crud.stream_rows_async(
+                database, models.City, city_fields, after="Le Conquet", size=1
+            )
+        ]
+        operators = [
+            rows
+            async for rows in crud.stream_rows_async(
+                database,
+                models.Operator,
+                list(schemas.PydanticOperatorItem.__fields__),
+                limit=2,
+            )
+        ]
+        return first + second + last, streamed, operators
+
+    cities, streamed, operators = run_async(file_url, read)
+
+    assert [city.name for city in cities] == [
+        "Le Conquet",
+        "Ouessant",
+        "Plogoff",
+        "Île-Molène",
+        "Île-de-Sein",
+    ]
+    assert streamed == [
+        [schemas.PydanticCityItem.from_orm(city).dict()] for city in cities[1:]
+    ]
+    assert [row["name"] for row in streamed[0]] == ["Ouessant"]
+    assert set(streamed[0][0]) == {"id", "name"}
+    assert [{"code": row["code"], "name": row["name"]} for row in operators[0]] == [
+        {"code": 20820, "name": "Bouygues Telecom"},
+        {"code": 20801, "name": "Orange"},
+    ]
+    assert set(operators[0][0]) == {"id", "code", "name"}
+
+
+def test_engine_options(monkeypatch):
+    """
+    Pool options come from env, async urls use the asyncio drivers
+    :return: Assertions ok
+    """
+    monkeypatch.setenv("DB_POOL_SIZE", "20")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+
+    assert engine_options("postgresql://user@db/papernest") == {
+        "pool_pre_ping": False,
+        "pool_recycle": 1800,
+        "pool_size": 20,
+        "max_overflow": 10,
+    }
+    assert "pool_size" not in engine_options("sqlite://")
+    assert async_url("postgresql://user@db/papernest") == (
+        "postgresql+asyncpg://user@db/papernest"
+    )
+    assert async_url("postgresql+psycopg2://db/papernest") == (
+        "postgresql+asyncpg://db/papernest"
+    )
+    assert (
+        async_url("sqlite:///coverage.sqlite") == "sqlite+aiosqlite:///coverage.sqlite"
+    )
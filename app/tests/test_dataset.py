@@ -0,0 +1,33 @@
+"""Test dataset module"""
+from app.dataset import DatasetWatcher
+from app.db import crud
+from app.jobs import IngestProgress, ingest_file
+
+
+def test_watcher(engine, database):
+    """
+    Listeners are called once per new dataset version, started by ingests
+    once their derived files are written, whichever process wrote
+    :param engine: sqlite engine
+    :param database: db session
+    :return: Assertions ok
+    """
+    watcher = DatasetWatcher(interval=5)
+    versions = []
+    watcher.on_change(versions.append)
+
+    assert watcher.check(database) == 0
+    assert watcher.check(database) == 0
+
+    with open("app/resources/data_short.csv", "rb") as file:
+        crud.save_to_db(file)
+    assert watcher.check(database) == 0
+    with open("app/resources/data_short.csv", "rb") as file:
+        ingest_file(file, IngestProgress())
+    assert watcher.check(database) == 1
+
+    with engine.begin() as connection:
+        crud.bump_dataset_version(connection)
+    assert watcher.check(database) == 2
+    assert watcher.bump(database) == 3
+    assert versions == [0, 1, 2, 3]
@@ -0,0 +1,154 @@
+"""Test geocoding module"""
+import asyncio
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from app.geocoding import GeocoderSettings, GeocodingClient
+
+
+def stub_app(failures=0):
+    """
+    Stub api-adresse ASGI app
+    :param failures: number of 503 answered before a successful one
+    :return: Starlette app, with a calls counter in app.state
+    """
+
+    async def search(request):
+        request.app.state.calls += 1
+        if request.app.state.calls <= failures:
+            return JSONResponse({}, status_code=503)
+        if request.query_params["q"] == "nowhere":
+            return JSONResponse({"features": []})
+        return JSONResponse(
+            {
+                "features": [
+                    {
+                        "properties": {
+                            "city": "Clermont-Ferrand",
+                            "citycode": "63113",
+                        }
+                    }
+                ]
+            }
+        )
+
+    async def search_csv(request):
+        form = await request.form()
+        adresses = (await form["data"].read()).decode("utf-8").splitlines()[1:]
+        lines = ["adress,result_city,result_citycode"] + [
+            f"{adress},Clermont-Ferrand,63113" if adress != "nowhere" else "nowhere,,"
+            for adress in adresses
+        ]
+        return PlainTextResponse("\n".join(lines))
+
+    app = Starlette(
+        routes=[
+            Route("/search/", search),
+            Route("/search/csv/", search_csv, methods=["POST"]),
+        ]
+    )
+    app.state.calls = 0
+    return app
+
+
+def stub_client(app, retries=2):
+    """
+    Geocoding client targeting a stub app
+    :param app: ASGI app
+    :param retries: number of retries
+    :return: GeocodingClient
+    """
+    return GeocodingClient(
+        base_url="http://stub",
+        settings=GeocoderSettings(retries=retries, backoff=0),
+        transport=httpx.ASGITransport(app=app),
+    )
+
+
+@pytest.fixture(name="search")
+def search_fixture():
+    """Provide a search with a started client, closing it afterwards"""
+
+    async def run(client, adress):
+        await client.start()
+        try:
+            return await client.search(adress)
+        finally:
+            await client.close()
+
+    return run
+
+
+def test_search(search):
+    """
+    Best match properties are returned
+    :param search: search function
+    :return: Assertions ok
+    """
+    client = stub_client(stub_app())
+
+    properties = asyncio.run(search(client, "rue marcel magard, 63170"))
+
+    assert properties["city"] == "Clermont-Ferrand"
+
+
+def test_search_no_result(search):
+    """
+    An adress without match raises a ValueError
+    :param search: search function
+    :return: Assertions ok
+    """
+    client = stub_client(stub_app())
+
+    with pytest.raises(ValueError):
+        asyncio.run(search(client, "nowhere"))
+
+
+def test_search_retries(search):
+    """
+    5xx answers are retried
+    :param search: search function
+    :return: Assertions ok
+    """
+    app = stub_app(failures=2)
+    client = stub_client(app, retries=2)
+
+    properties = asyncio.run(search(client, "rue marcel magard, 63170"))
+
+    assert properties["citycode"] == "63113"
+    assert app.state.calls == 3
+
+
+def test_search_retries_exhausted(search):
+    """
+    The last error is raised once retries are exhausted
+    :param search: search function
+    :return: Assertions ok
+    """
+    client = stub_client(stub_app(failures=5), retries=1)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(search(client, "rue marcel magard, 63170"))
+
+
+def test_search_csv():
+    """
+    Bulk search keeps the adresses order
+    :return: Assertions ok
+    """
+    client = stub_client(stub_app())
+
+    async def search_csv():
+        await client.start()
+        try:
+            return await client.search_csv(["rue marcel magard", "nowhere"])
+        finally:
+            await client.close()
+
+    results = asyncio.run(search_csv())
+
+    assert results == [{"city": "Clermont-Ferrand", "citycode": "63113"}, None]
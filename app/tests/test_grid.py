@@ -0,0 +1,161 @@
+"""Test grid module"""
+import asyncio
+import io
+
+import pytest
+import sqlalchemy
+
+from app.db import crud, models
+from app.grid import CoverageGrid, GridStore, update_grid_file
+from app.jobs import IngestProgress, ingest_file
+from app.projection import lambert93_to_wgs84
+
+# Lambert93 coords of the first antenna of data_short.csv, on Ouessant
+OUESSANT_X, OUESSANT_Y = 102980, 6847973
+
+
+def position(lambert_x, lambert_y):
+    """
+    :return: lon, lat of lambert93 coords
+    """
+    lon, lat = lambert93_to_wgs84(lambert_x, lambert_y)  # pylint: disable=E0633
+    return float(lon), float(lat)
+
+
+@pytest.fixture(name="grid")
+def grid_fixture():
+    """Provide a grid of 3 antennas, covering 1km around each one"""
+    grid = CoverageGrid(cell=0.01, distance=1000)
+    grid.add(
+        [
+            (1, "Orange", OUESSANT_X, OUESSANT_Y, True, True, False),
+            (2, "Orange", OUESSANT_X + 5000, OUESSANT_Y, False, False, True),
+            (3, "S.F.R.", OUESSANT_X, OUESSANT_Y + 500, False, True, False),
+        ]
+    )
+    return grid
+
+
+def test_lookup(grid):
+    """
+    Cells within distance of an antenna hold its networks
+    :param grid: CoverageGrid
+    :return: Assertions ok
+    """
+    assert grid.antenna_id == 3
+    assert grid.lookup(*position(OUESSANT_X, OUESSANT_Y)) == {
+        "Orange": {"2G": True, "3G": True, "4G": False},
+        "S.F.R.": {"2G": False, "3G": True, "4G": False},
+    }
+    assert grid.lookup(*position(OUESSANT_X + 5000, OUESSANT_Y))["Orange"] == {
+        "2G": False,
+        "3G": False,
+        "4G": True,
+    }
+    far = grid.lookup(*position(OUESSANT_X + 2500, OUESSANT_Y - 3000))
+    assert not any(any(networks.values()) for networks in far.values())
+    with pytest.raises(ValueError):
+        grid.lookup(lon=2.35, lat=60.0)
+
+
+def test_save_and_map(grid, tmp_path):
+    """
+    A mapped grid file answers like the grid, and is copied before being updated
+    :param grid: CoverageGrid
+    :param tmp_path: temporary directory
+    :return: Assertions ok
+    """
+    path = tmp_path / "coverage.grid"
+    grid.save(path)
+
+    mapped = CoverageGrid.load(path)
+    lon, lat = position(OUESSANT_X, OUESSANT_Y)
+
+    assert mapped.settings() == grid.settings()
+    assert mapped.antenna_id == 3
+    assert mapped.lookup(lon, lat) == grid.lookup(lon, lat)
+    assert not mapped.masks.flags.writeable
+
+    mapped.add([(4, "Free", OUESSANT_X, OUESSANT_Y, True, False, False)])
+
+    assert mapped.lookup(lon, lat)["Free"]["2G"]
+    assert "Free" not in CoverageGrid.load(path).operators
+
+
+def test_update_grid_file(engine, database, tmp_path):
+    """
+    Only the antennas inserted since the last update are added to the grid file
+    :param engine: sqlite engine
+    :param database: db session
+    :param tmp_path: temporary directory
+    :return: Assertions ok
+    """
+    path = tmp_path / "coverage.grid"
+    with open("app/resources/data_short.csv", "rb") as file:
+        crud.save_to_db(file)
+    grid = update_grid_file(path, database)
+    lon, lat = position(OUESSANT_X + 20000, OUESSANT_Y)
+
+    assert grid.antenna_id == 7
+    assert grid.lookup(*position(OUESSANT_X, OUESSANT_Y))["Orange"]["2G"]
+    assert not grid.lookup(lon, lat)["Orange"]["2G"]
+
+    with engine.begin() as connection:
+        operator_id = connection.execute(
+            sqlalchemy.select(models.Operator.id).where(
+                models.Operator.name == "Orange"
+            )
+        ).scalar()
+        connection.execute(
+            sqlalchemy.insert(models.Antenna).values(
+                {
+                    "operator_id": operator_id,
+                    "x": OUESSANT_X + 20000,
+                    "y": OUESSANT_Y,
+                    "2G": True,
+                    "3G": False,
+                    "4G": False,
+                }
+            )
+        )
+    grid = update_grid_file(path, database)
+
+    assert grid.antenna_id == 8
+    assert grid.lookup(lon, lat)["Orange"]["2G"]
+    assert grid.lookup(*position(OUESSANT_X, OUESSANT_Y))["Orange"]["2G"]
+
+    store = GridStore(file=str(path))
+    assert asyncio.run(store.ensure_loaded()) is store.grid
+    assert store.lookup(lon, lat) == grid.lookup(lon, lat)
+    assert store.grid.path == str(path)
+
+
+def test_ingest_rebuilds_grid(engine, tmp_path, monkeypatch):  # pylint: disable=W0613
+    """
+    Networks no longer available on an updated antenna leave the grid file
+    :param engine: sqlite engine
+    :param tmp_path: temporary directory
+    :param monkeypatch: pytest monkeypatch
+    :return: Assertions ok
+    """
+    path = tmp_path / "coverage.grid"
+    monkeypatch.setenv("COVERAGE_GRID_FILE", str(path))
+    lon, lat = position(OUESSANT_X, OUESSANT_Y)
+
+    ingest_file(
+        io.BytesIO(b"Operateur;x;y;2G;3G;4G\n20801;102980;6847973;1;1;0\n"),
+        IngestProgress(),
+    )
+    assert CoverageGrid.load(path).lookup(lon, lat)["Orange"]["2G"]
+
+    report = ingest_file(
+        io.BytesIO(b"Operateur;x;y;2G;3G;4G\n20801;102980;6847973;0;1;1\n"),
+        IngestProgress(),
+    )
+
+    assert report["antenna"]["updated"] == 1
+    assert CoverageGrid.load(path).lookup(lon, lat)["Orange"] == {
+        "2G": False,
+        "3G": True,
+        "4G": True,
+    }
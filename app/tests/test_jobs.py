@@ -0,0 +1,68 @@
+"""Test jobs module"""
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.jobs import JobManager
+
+
+@pytest.fixture(name="manager")
+def manager_fixture(engine):  # pylint: disable=W0613
+    """Provide a job manager running jobs in threads, on the sqlite engine"""
+    manager = JobManager(max_workers=1, executor_class=ThreadPoolExecutor)
+    manager.finished = []
+    manager.on_done(manager.finished.append)
+    yield manager
+    manager.shutdown()
+
+
+def wait(manager, job_id, timeout=30):
+    """Wait for a job to be finished and cleaned up"""
+    deadline = time.monotonic() + timeout
+    while job_id not in [job["id"] for job in manager.finished]:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    return manager.get(job_id)
+
+
+def test_ingest_job(manager, tmp_path):
+    """
+    A job runs save_to_db and reports its progress
+    :param manager: JobManager
+    :return: Assertions ok
+    """
+    path = tmp_path / "data.csv"
+    shutil.copy("app/resources/data_short.csv", path)
+    job_id = manager.submit(str(path), chunk_size=3)
+    job = wait(manager, job_id)
+
+    assert job["status"] == "done"
+    assert job["stage"] == "done"
+    assert job["rows_processed"] == 7
+    assert job["report"]["city"]["inserted"] == 5
+    assert {"reading", "projection", "geocoding", "loading antenna", "summary"} <= set(
+        job["stage_seconds"]
+    )
+    assert manager.list() == [job]
+    # another api worker reads the same state
+    assert JobManager().get(job_id) == job
+    assert not path.exists()
+    assert manager.finished == [job]
+
+
+def test_failed_job(manager, tmp_path):
+    """
+    Errors are reported in the job state
+    :param manager: JobManager
+    :return: Assertions ok
+    """
+    path = tmp_path / "data.csv"
+    path.write_text("not;a;coverage;file\n1;2;3;4\n", encoding="utf-8")
+
+    job = wait(manager, manager.submit(str(path)))
+
+    assert job["status"] == "failed"
+    assert job["error"]
+    assert manager.get("unknown") is None
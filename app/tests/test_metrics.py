@@ -0,0 +1,89 @@
+"""Test metrics module"""
+from fastapi import FastAPI
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+from starlette.testclient import TestClient
+
+from app.metrics import (MetricsMiddleware, instrument_engine,
+                         metrics_response, observe_ingest, operation_of)
+
+
+def sample(name, **labels):
+    """
+    :return: current value of a metric sample, 0 when never recorded
+    """
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_middleware():
+    """
+    Requests are counted and timed by route template
+    :return: Assertions ok
+    """
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics_test/{item}")
+    async def item(item: int):
+        return {"item": item}
+
+    labels = {"method": "GET", "route": "/metrics_test/{item}"}
+    count = sample("http_request_duration_seconds_count", **labels)
+    not_found = sample(
+        "http_requests_total", method="GET", route="unmatched", status="404"
+    )
+
+    client = TestClient(app)
+    client.get("/metrics_test/1")
+    client.get("/metrics_test/2")
+    client.get("/metrics_test/nan")
+    client.get("/metrics_test_unknown")
+
+    assert sample("http_request_duration_seconds_count", **labels) == count + 3
+    assert sample("http_requests_total", status="422", **labels) >= 1
+    assert sample("http_requests_in_progress", **labels) == 0
+    assert (
+        sample("http_requests_total", method="GET", route="unmatched", status="404")
+        == not_found + 1
+    )
+
+
+def test_instrument_engine():
+    """
+    SQL statements are timed by operation
+    :return: Assertions ok
+    """
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    instrument_engine(engine)
+    count = sample("db_statement_duration_seconds_count", operation="SELECT")
+    errors = sample("db_statement_errors_total", operation="SELECT")
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        try:
+            connection.execute(text("SELECT * FROM missing"))
+        except Exception:  # pylint: disable=W0703
+            pass
+
+    assert (
+        sample("db_statement_duration_seconds_count", operation="SELECT") == count + 1
+    )
+    assert sample("db_statement_errors_total", operation="SELECT") == errors + 1
+    assert operation_of("\n  insert into city values (1)") == "INSERT"
+
+
+def test_observe_ingest():
+    """
+    Stage durations of a job end up in the ingest histogram, and in /metrics
+    :return: Assertions ok
+    """
+    count = sample("ingest_stage_duration_seconds_count", stage="projection")
+
+    observe_ingest({"stage_seconds": {"projection": 0.2, "reading": 1.5}})
+    observe_ingest({"stage_seconds": {}})
+
+    assert (
+        sample("ingest_stage_duration_seconds_count", stage="projection") == count + 1
+    )
+    assert b"ingest_stage_duration_seconds_bucket" in metrics_response().body
@@ -0,0 +1,64 @@
+"""Test operators module"""
+import io
+
+import pandas
+import pytest
+
+from app.db import crud
+from app.operators import get_operator_registry
+from app.utils import find_operator
+
+
+def test_find():
+    """
+    Codes are matched on MCC and MNC
+    :return: Assertions ok
+    """
+    registry = get_operator_registry()
+
+    assert registry.find(20801) == "Orange"
+    assert registry.find("20820") == "Bouygues Telecom"
+    assert registry.find(20899) is None
+
+
+def test_resolve():
+    """
+    A whole column is resolved, unknown codes are reported together
+    :return: Assertions ok
+    """
+    names, unknown = get_operator_registry().resolve(
+        pandas.Series([20801, 20899, 20810, 20801, 1])
+    )
+
+    assert names.fillna("?").to_list() == ["Orange", "?", "S.F.R.", "Orange", "?"]
+    assert unknown == [1, 20899]
+
+
+def test_find_operator():
+    """
+    find_operator keeps raising on unknown codes
+    :return: Assertions ok
+    """
+    assert find_operator(20815) == "Lliad/FREE Mobile"
+    with pytest.raises(ValueError):
+        find_operator(20899)
+
+
+def test_save_to_db_unknown_operators(database):
+    """
+    Rows with unknown operators are skipped and reported
+    :param database: db session
+    :return: Assertions ok
+    """
+    report = crud.save_to_db(
+        io.BytesIO(
+            b"Operateur;x;y;2G;3G;4G\n"
+            b"20899;102980;6847973;1;1;0\n"
+            b"20801;102980;6847973;1;1;0\n"
+            b"1;102980;6847973;1;1;0\n"
+        )
+    )
+
+    assert report["unknown_operators"] == [1, 20899]
+    assert report["network_coverage"]["inserted"] == 1
+    assert list(crud.get_network_coverage(database, city="29155")) == ["Orange"]
@@ -0,0 +1,101 @@
+"""Test /cities and /operators pages, in json and NDJSON"""
+import json
+import os
+import re
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from starlette.testclient import TestClient
+
+from app import main
+from app import response_cache as response_cache_module
+from app.db.database import async_url, get_async_db
+from app.response_cache import ResponseCache
+
+NDJSON = {"Accept": "application/x-ndjson"}
+
+
+@pytest.fixture(name="client")
+def client_fixture(file_url, monkeypatch):
+    """
+    Provide a client of the api reading the sqlite file db,
+    with an empty response cache
+    """
+    # each request runs on an event loop of its own: no pooled connection
+    async_engine = create_async_engine(
+        async_url(file_url), poolclass=NullPool
+    ).execution_options(schema_translate_map={os.getenv("SCHEMA"): None})
+    sessions = sessionmaker(
+        bind=async_engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+    async def get_test_db():
+        async with sessions() as database:
+            yield database
+
+    monkeypatch.setattr(main, "AsyncSessionLocal", sessions)
+    monkeypatch.setattr(
+        response_cache_module, "response_cache", ResponseCache(max_size=10, ttl=60)
+    )
+    monkeypatch.setitem(main.app.dependency_overrides, get_async_db, get_test_db)
+    return TestClient(main.app)
+
+
+def next_url(response):
+    """
+    :param response: page
+    :return: url of the next page in the Link header, None on the last page
+    """
+    match = re.fullmatch(r'<(.+)>; rel="next"', response.headers.get("link", ""))
+    return match.group(1) if match else None
+
+
+def ndjson(response):
+    """
+    :param response: NDJSON response
+    :return: list of rows
+    """
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_follow_links(client):
+    """
+    Following the Link header reads every city once, page by page
+    :param client: TestClient of the api
+    :return: Assertions ok
+    """
+    pages = [client.get("/cities", params={"limit": 2})]
+    while next_url(pages[-1]):
+        pages.append(client.get(next_url(pages[-1])))
+
+    assert [[city["name"] for city in page.json()] for page in pages] == [
+        ["Le Conquet", "Ouessant"],
+        ["Plogoff", "Île-Molène"],
+        ["Île-de-Sein"],
+    ]
+    assert "after=Ouessant" in next_url(pages[0])
+    assert f"after_id={pages[0].json()[-1]['id']}" in next_url(pages[0])
+
+
+@pytest.mark.parametrize("path", ["/cities", "/operators"])
+def test_ndjson_pages(client, path):
+    """
+    NDJSON rows are the rows of the json response, and carry the cursor
+    of the next page
+    :param client: TestClient of the api
+    :param path: endpoint
+    :return: Assertions ok
+    """
+    first = client.get(path, params={"limit": 2})
+    streamed = client.get(path, params={"limit": 2}, headers=NDJSON)
+
+    assert streamed.headers["content-type"] == "application/x-ndjson"
+    assert ndjson(streamed) == first.json()
+
+    last = ndjson(streamed)[-1]
+    cursor = {"limit": 2, "after": last["name"], "after_id": last["id"]}
+    assert ndjson(client.get(path, params=cursor, headers=NDJSON)) == (
+        client.get(next_url(first)).json()
+    )
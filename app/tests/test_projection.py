@@ -0,0 +1,44 @@
+"""Test projection module"""
+import numpy
+import pytest
+
+from app.projection import lambert93_to_wgs84, wgs84_to_lambert93
+from app.utils import lambert93_to_lat_long
+
+
+def test_lambert93_to_wgs84_columns():
+    """
+    Whole columns are projected in one call
+    :return: Assertions ok
+    """
+    lon, lat = lambert93_to_wgs84(  # pylint: disable=E0633
+        numpy.array([102980, 112032]), numpy.array([6847973, 6840427])
+    )
+
+    assert lon == pytest.approx([-5.088856, -4.956782], abs=1e-6)
+    assert lat == pytest.approx([48.456575, 48.397297], abs=1e-6)
+
+
+def test_round_trip():
+    """
+    wgs84 -> lambert93 -> wgs84 gives back the same coords
+    :return: Assertions ok
+    """
+    lambert_x, lambert_y = wgs84_to_lambert93(  # pylint: disable=E0633
+        [3.0870, 2.3522], [45.7772, 48.8566]
+    )
+    lon, lat = lambert93_to_wgs84(lambert_x, lambert_y)  # pylint: disable=E0633
+
+    assert lon == pytest.approx([3.0870, 2.3522])
+    assert lat == pytest.approx([45.7772, 48.8566])
+
+
+def test_lambert93_to_lat_long_row():
+    """
+    Row helper still returns a (lon, lat) tuple of floats
+    :return: Assertions ok
+    """
+    long, lat = lambert93_to_lat_long({"x": 102980, "y": 6847973})
+
+    assert isinstance(long, float)
+    assert (long, lat) == pytest.approx((-5.088856, 48.456575), abs=1e-6)
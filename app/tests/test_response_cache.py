@@ -0,0 +1,147 @@
+"""Test response cache module"""
+import time
+
+import pytest
+from fastapi import FastAPI, Request
+from starlette.responses import JSONResponse
+from starlette.testclient import TestClient
+
+from app import response_cache as response_cache_module
+from app.response_cache import ResponseCache, cached_response, etag_matches
+
+
+@pytest.fixture(name="cache")
+def cache_fixture(monkeypatch):
+    """Provide an empty response cache used by cached_response"""
+    cache = ResponseCache(max_size=10, ttl=60)
+    monkeypatch.setattr(response_cache_module, "response_cache", cache)
+    return cache
+
+
+@pytest.fixture(name="client")
+def client_fixture(cache):  # pylint: disable=W0613
+    """
+    Provide a client of an app with a cached endpoint,
+    counting the computations of its content
+    """
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.get("/cities")
+    async def cities(request: Request, name: str = "Paris"):
+        async def fetch():
+            app.state.calls += 1
+            return [{"name": name}]
+
+        return await cached_response(request, fetch, JSONResponse)
+
+    client = TestClient(app)
+    client.app_state = app.state
+    return client
+
+
+def test_cached_response(client, cache):
+    """
+    Responses are computed once per parameters, and revalidated with their ETag
+    :return: Assertions ok
+    """
+    first = client.get("/cities", params={"name": "Paris"})
+    second = client.get("/cities", params={"name": "Paris"})
+    other = client.get("/cities", params={"name": "Brest"})
+
+    assert first.json() == second.json() == [{"name": "Paris"}]
+    assert other.json() == [{"name": "Brest"}]
+    assert first.headers["etag"] == second.headers["etag"] != other.headers["etag"]
+    assert first.headers["etag"].startswith(f'"{cache.version}-')
+    assert client.app_state.calls == 2
+
+    not_modified = client.get(
+        "/cities",
+        params={"name": "Paris"},
+        headers={"If-None-Match": first.headers["etag"]},
+    )
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["etag"] == first.headers["etag"]
+    assert cache.stats()["hits"] == 2
+
+
+def test_invalidate(client, cache):
+    """
+    Writes start a new dataset version: ETags change and content is recomputed
+    :return: Assertions ok
+    """
+    etag = client.get("/cities").headers["etag"]
+
+    cache.invalidate(cache.version + 1)
+    response = client.get("/cities", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert client.app_state.calls == 2
+    assert len(cache) == 1
+
+
+def test_stale_response_is_not_cached():
+    """
+    A response computed before an invalidation is not stored
+    :return: Assertions ok
+    """
+    cache = ResponseCache(max_size=10, ttl=60)
+    version = cache.version
+    cache.invalidate(version + 1)
+
+    cache.set("key", b"[]", version)
+
+    assert cache.get("key") is None
+
+
+def test_cached_headers(cache):
+    """
+    Headers filled while computing the content are served with it from the cache
+    :return: Assertions ok
+    """
+    app = FastAPI()
+
+    @app.get("/cities")
+    async def cities(request: Request):
+        headers = {}
+
+        async def fetch():
+            headers["Link"] = '</cities?after=Paris&after_id=2>; rel="next"'
+            return [{"name": "Paris"}]
+
+        return await cached_response(request, fetch, JSONResponse, headers)
+
+    client = TestClient(app)
+    first = client.get("/cities")
+    second = client.get("/cities")
+
+    assert first.headers["link"] == second.headers["link"]
+    assert second.headers["link"].endswith('rel="next"')
+    assert cache.stats()["hits"] == 1
+
+
+def test_expired_response(cache, monkeypatch):
+    """
+    Responses expire after ttl seconds, even without a new dataset version
+    :return: Assertions ok
+    """
+    now = time.time()
+    cache.set("key", b"[]", cache.version)
+    assert cache.get("key") == ('"0-97d170e1550eee4a"', b"[]", {})
+
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.get("key") is None
+
+
+def test_etag_matches():
+    """
+    If-None-Match lists, weak tags and wildcard
+    :return: Assertions ok
+    """
+    assert etag_matches('"a-1"', '"b-2", "a-1"')
+    assert etag_matches('"a-1"', 'W/"a-1"')
+    assert etag_matches('"a-1"', "*")
+    assert not etag_matches('"a-1"', '"a-2"')
+    assert not etag_matches('"a-1"', None)
@@ -0,0 +1,76 @@
+"""Test reverse geocoder module"""
+import pandas
+import pytest
+
+from app.reverse_geocoder import LocalReverseGeocoder
+from app.utils import csv_to_dataframe
+
+COMMUNES_FILE = "app/resources/communes_sample.csv"
+
+
+@pytest.fixture(name="geocoder")
+def geocoder_fixture():
+    """Provide a local reverse geocoder built on the bundled communes sample"""
+    return LocalReverseGeocoder.from_file(COMMUNES_FILE)
+
+
+def test_lookup(geocoder):
+    """
+    Whole columns are resolved to the closest commune
+    :param geocoder: LocalReverseGeocoder
+    :return: Assertions ok
+    """
+    citycodes, cities = geocoder.lookup([102980, 112032], [6847973, 6840427])
+
+    assert list(citycodes) == ["29155", "29150"]
+    assert list(cities) == ["Ouessant", "Île-Molène"]
+
+
+def test_lookup_too_far(geocoder):
+    """
+    Points far from every centroid are left without city
+    :param geocoder: LocalReverseGeocoder
+    :return: Assertions ok
+    """
+    citycodes, cities = geocoder.lookup([1200000], [6100000])
+
+    assert list(citycodes) == [None]
+    assert list(cities) == [None]
+
+
+def test_communes_without_citycode():
+    """
+    Communes without citycode are left out, not stored with a "nan" citycode
+    :return: Assertions ok
+    """
+    geocoder = LocalReverseGeocoder(
+        pandas.DataFrame(
+            {
+                "citycode": [None, "29150"],
+                "city": ["Ouessant", "Île-Molène"],
+                "lat": [48.4597, 48.3966],
+                "lon": [-5.0897, -4.9588],
+            }
+        )
+    )
+    citycodes, cities = geocoder.lookup([102980], [6847973])
+
+    assert len(geocoder) == 1
+    assert list(citycodes) == ["29150"]
+    assert list(cities) == ["Île-Molène"]
+
+
+def test_add_cities(geocoder):
+    """
+    add_cities keeps the get_cities interface
+    :param geocoder: LocalReverseGeocoder
+    :return: Assertions ok
+    """
+    dataframe = geocoder.add_cities(csv_to_dataframe("app/resources/data_short.csv"))
+
+    assert dataframe["city"].to_list() == ["Ouessant"] * 3 + [
+        "Île-Molène",
+        "Île-de-Sein",
+        "Le Conquet",
+        "Plogoff",
+    ]
@@ -0,0 +1,80 @@
+"""Test single flight module"""
+import asyncio
+
+import pytest
+
+from app.singleflight import SingleFlight
+
+
+def test_concurrent_calls_coalesced():
+    """
+    Concurrent calls with the same key run once and share the result
+    :return: Assertions ok
+    """
+    group = SingleFlight()
+    calls = []
+
+    async def lookup(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return {"city": key}
+
+    async def burst():
+        results = await asyncio.gather(
+            *(group.run(key, lambda key=key: lookup(key)) for key in "aaaab")
+        )
+        # finished calls are forgotten, the next one runs again
+        results.append(await group.run("a", lambda: lookup("a")))
+        return results
+
+    results = asyncio.run(burst())
+
+    assert results == [{"city": key} for key in "aaaaba"]
+    assert calls == ["a", "b", "a"]
+    assert group.stats() == {"executed": 3, "coalesced": 3, "in_flight": 0}
+
+
+def test_errors_shared():
+    """
+    The exception of a call is raised to every caller
+    :return: Assertions ok
+    """
+    group = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ValueError("No result found")
+
+    async def burst():
+        return await asyncio.gather(
+            *(group.run("key", failing) for _ in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(burst())
+
+    assert [type(result) for result in results] == [ValueError] * 3
+    assert group.executed == 1
+
+
+def test_cancelled_caller():
+    """
+    A cancelled caller does not cancel the call for the others
+    :return: Assertions ok
+    """
+    group = SingleFlight()
+
+    async def lookup():
+        await asyncio.sleep(0.02)
+        return "Paris"
+
+    async def burst():
+        first = asyncio.ensure_future(group.run("key", lookup))
+        second = asyncio.ensure_future(group.run("key", lookup))
+        await asyncio.sleep(0.005)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(burst()) == "Paris"
+    assert group.stats() == {"executed": 1, "coalesced": 1, "in_flight": 0}
@@ -0,0 +1,109 @@
+"""Test snapshot module"""
+import asyncio
+
+import pytest
+
+from app.db import crud
+from app.snapshot import (CoverageSnapshot, CoverageStore, MappedFileStore,
+                          export_snapshot_file)
+
+
+def test_snapshot_lookup():
+    """
+    Snapshot answers like crud.get_network_coverage
+    :return: Assertions ok
+    """
+    snapshot = CoverageSnapshot(
+        [
+            ("Paris", "Orange", True, False, True),
+            ("Paris", "S.F.R.", False, True, False),
+            ("Pytest", None, None, None, None),
+        ]
+    )
+
+    assert snapshot.get_network_coverage("Paris") == {
+        "Orange": {"2G": True, "3G": False, "4G": True},
+        "S.F.R.": {"2G": False, "3G": True, "4G": False},
+    }
+    assert snapshot.get_network_coverage("Pytest") == {}
+    assert snapshot.get_network_coverage("Lyon") is None
+
+
+def test_snapshot_version():
+    """
+    Version only depends on the content
+    :return: Assertions ok
+    """
+    rows = [("Paris", "Orange", True, False, True), ("Lyon", "Orange", 1, 1, 1)]
+
+    assert CoverageSnapshot(rows).version == CoverageSnapshot(rows[::-1]).version
+    assert CoverageSnapshot(rows).version != CoverageSnapshot(rows[:1]).version
+
+
+def test_store_reload(database):
+    """
+    A new snapshot is swapped in after an ingest
+    :param database: db session
+    :return: Assertions ok
+    """
+    store = CoverageStore(enabled=True)
+    empty = store.load(database)
+    with open("app/resources/data_short.csv", "rb") as file:
+        crud.save_to_db(file)
+
+    snapshot = store.load(database)
+
+    assert store.snapshot is snapshot
+    assert snapshot.version != empty.version
+    assert store.get_network_coverage("29168") == {
+        "Bouygues Telecom": {"2G": True, "3G": False, "4G": False},
+    }
+    assert store.info()["cities"] == 5
+
+
+def test_store_overrides():
+    """
+    A store must say how it loads and what it holds
+    :return: Assertions ok
+    """
+
+    class UnfinishedStore(MappedFileStore):  # pylint: disable=W0223
+        """Store without load"""
+
+        def current(self):
+            return None
+
+    with pytest.raises(TypeError):
+        UnfinishedStore()  # pylint: disable=E0110
+
+
+def test_store_lookup_before_load():
+    """
+    Lookups never load, handlers await ensure_loaded first
+    :return: Assertions ok
+    """
+    with pytest.raises(RuntimeError):
+        CoverageStore(enabled=True).get_network_coverage("29168")
+
+
+def test_store_ensure_loaded(database, tmp_path):
+    """
+    Concurrent first lookups share one load, run outside the event loop
+    :param database: db session
+    :param tmp_path: temporary directory
+    :return: Assertions ok
+    """
+    path = str(tmp_path / "coverage.snapshot")
+    with open("app/resources/data_short.csv", "rb") as file:
+        crud.save_to_db(file)
+    export_snapshot_file(path, database)
+    store = CoverageStore(enabled=True, file=path)
+
+    async def lookups():
+        return await asyncio.gather(*(store.ensure_loaded() for _ in range(3)))
+
+    snapshots = asyncio.run(lookups())
+
+    assert snapshots[0] is snapshots[1] is snapshots[2] is store.snapshot
+    assert store.flight.stats() == {"executed": 1, "coalesced": 2, "in_flight": 0}
+    assert store.get_network_coverage("29168")["Bouygues Telecom"]["2G"]
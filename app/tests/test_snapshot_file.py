@@ -0,0 +1,112 @@
+"""Test snapshot file module"""
+import asyncio
+import os
+
+import numpy
+import pytest
+
+from app.snapshot import CoverageSnapshot, CoverageStore
+from app.snapshot_file import MappedCoverageSnapshot, write_snapshot_file
+from app.spatial import AntennaIndex
+
+ROWS = [
+    ("Paris", "Orange", True, False, True),
+    ("Paris", "S.F.R.", False, True, False),
+    ("Besançon", "Free", True, True, True),
+    ("Pytest", None, None, None, None),
+]
+ANTENNAS = [
+    ("Orange", 652000.0, 6862000.0, True, False, True),
+    ("Orange", 653000.0, 6862000.0, False, True, False),
+    ("Free", 652500.0, 6861000.0, True, True, True),
+]
+
+
+def test_mapped_lookup(tmp_path):
+    """
+    Mapped file answers like the in-memory snapshot, with the same version
+    :param tmp_path: temporary directory
+    :return: Assertions ok
+    """
+    path = tmp_path / "coverage.snap"
+    version = write_snapshot_file(path, ROWS, ANTENNAS)
+
+    mapped = MappedCoverageSnapshot(path)
+    snapshot = CoverageSnapshot(ROWS)
+
+    assert mapped.version == version == snapshot.version
+    assert len(mapped) == 3
+    for city in ("Paris", "Besançon", "Pytest", "Lyon", ""):
+        assert mapped.get_network_coverage(city) == snapshot.get_network_coverage(city)
+    operators, coords, masks = mapped.antennas()
+    assert list(operators) == ["Orange", "Orange", "Free"]
+    assert coords.shape == (3, 2)
+    assert list(masks) == [0b101, 0b010, 0b111]
+    assert not coords.flags.writeable
+
+
+def test_antenna_index_from_arrays(tmp_path):
+    """
+    Index built from the file arrays answers like the one built from rows
+    :param tmp_path: temporary directory
+    :return: Assertions ok
+    """
+    path = tmp_path / "coverage.snap"
+    write_snapshot_file(path, ROWS, ANTENNAS)
+
+    index = AntennaIndex.from_arrays(*MappedCoverageSnapshot(path).antennas())
+
+    assert len(index) == 3
+    assert index.nearby(2.35, 48.85, 5000) == AntennaIndex(ANTENNAS).nearby(
+        2.35, 48.85, 5000
+    )
+
+
+def test_invalid_file(tmp_path):
+    """
+    Unknown files and format versions are rejected
+    :param tmp_path: temporary directory
+    :return: Assertions ok
+    """
+    path = tmp_path / "coverage.snap"
+    path.write_bytes(b"not a snapshot at all")
+    with pytest.raises(ValueError):
+        MappedCoverageSnapshot(path)
+
+    write_snapshot_file(path, ROWS)
+    content = bytearray(path.read_bytes())
+    content[8] = 99
+    path.write_bytes(bytes(content))
+    with pytest.raises(ValueError):
+        MappedCoverageSnapshot(path)
+
+
+def test_store_file_fallback(tmp_path, database):
+    """
+    Store maps the file when present, and falls back to the db otherwise
+    :param tmp_path: temporary directory
+    :param database: db session
+    :return: Assertions ok
+    """
+    path = tmp_path / "coverage.snap"
+    store = CoverageStore(enabled=True, file=str(path))
+
+    assert isinstance(store.load(database), CoverageSnapshot)
+    assert store.load_file() is None
+
+    write_snapshot_file(path, ROWS)
+    snapshot = store.load()
+    assert isinstance(snapshot, MappedCoverageSnapshot)
+    assert store.info()["source"] == str(path)
+    assert store.get_network_coverage("Pytest") == {}
+
+    # a newer file, written by another process, is mapped on next ensure_loaded
+    write_snapshot_file(path, ROWS[:2])
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    store.checked_at = 0.0
+    assert store.get_network_coverage("Pytest") == {}
+    asyncio.run(store.ensure_loaded())
+    assert store.get_network_coverage("Pytest") is None
+    assert store.snapshot is not snapshot
+    assert numpy.array_equal(store.snapshot.arrays["coverage_masks"], [0b101, 0b010])
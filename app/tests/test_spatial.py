@@ -0,0 +1,92 @@
+"""Test spatial module"""
+import pytest
+
+from app.db import crud
+from app.projection import lambert93_to_wgs84
+from app.spatial import AntennaIndex, AntennaStore
+
+# Lambert93 coords of the first antenna of data_short.csv, on Ouessant
+OUESSANT_X, OUESSANT_Y = 102980, 6847973
+
+
+@pytest.fixture(name="index")
+def index_fixture():
+    """Provide an antenna index of 3 antennas"""
+    return AntennaIndex(
+        [
+            ("Orange", OUESSANT_X, OUESSANT_Y, True, True, False),
+            ("Orange", OUESSANT_X + 3000, OUESSANT_Y, False, False, True),
+            ("S.F.R.", OUESSANT_X, OUESSANT_Y + 500, False, True, False),
+        ]
+    )
+
+
+def test_nearby(index):
+    """
+    Only antennas within the radius give coverage
+    :param index: AntennaIndex
+    :return: Assertions ok
+    """
+    lon, lat = lambert93_to_wgs84(OUESSANT_X, OUESSANT_Y)  # pylint: disable=E0633
+
+    results = index.nearby(lon=lon, lat=lat, radius=1000)
+
+    assert results["Orange"] == {"2G": True, "3G": True, "4G": False, "distance": 0}
+    assert results["S.F.R."] == {
+        "2G": False,
+        "3G": True,
+        "4G": False,
+        "distance": pytest.approx(500, abs=0.1),
+    }
+    assert index.nearby(lon=lon, lat=lat, radius=5000)["Orange"]["4G"]
+
+
+def test_nearby_out_of_radius(index):
+    """
+    Operators without antenna in the radius still give the nearest distance
+    :param index: AntennaIndex
+    :return: Assertions ok
+    """
+    lon, lat = lambert93_to_wgs84(  # pylint: disable=E0633
+        OUESSANT_X - 2000, OUESSANT_Y
+    )
+
+    results = index.nearby(lon=lon, lat=lat, radius=100)
+
+    assert results["Orange"] == {
+        "2G": False,
+        "3G": False,
+        "4G": False,
+        "distance": pytest.approx(2000, abs=0.1),
+    }
+
+
+def test_store_from_db(database):
+    """
+    Antennas saved at ingest are indexed
+    :param database: db session
+    :return: Assertions ok
+    """
+    with open("app/resources/data_short.csv", "rb") as file:
+        report = crud.save_to_db(file)
+    lon, lat = lambert93_to_wgs84(OUESSANT_X, OUESSANT_Y)  # pylint: disable=E0633
+
+    store = AntennaStore()
+    store.load(database)
+
+    assert report["antenna"]["inserted"] == len(store.index) == 7
+    assert store.nearby(lon=lon, lat=lat, radius=1000)["Bouygues Telecom"]["4G"]
+
+
+def test_store_empty_index(database):
+    """
+    An index without antenna is kept, not built again on every query
+    :param database: db session
+    :return: Assertions ok
+    """
+    store = AntennaStore()
+    index = store.load(database)
+
+    assert len(index) == 0
+    assert not store.nearby(lon=2.35, lat=48.85, radius=1000)
+    assert store.index is index
@@ -0,0 +1,24 @@
+"""Test api worker startup"""
+import subprocess
+import sys
+
+
+def test_serving_path_skips_ingest_stack():
+    """
+    Importing the api does not load pandas, pyproj nor scipy
+    :return: Assertions ok
+    """
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, app.main; "
+            "print([name for name in ('pandas', 'pyproj', 'scipy') "
+            "if name in sys.modules])",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+    assert output.strip().splitlines()[-1] == "[]"
@@ -1,25 +1,19 @@
 """
 Utils Module
+
+Ingest helpers (csv reading, projection, city and operator resolution),
+pulling in pandas and pyproj: only imported by the ingest path
 """
 import io
-import json
-import logging
-import os
-import sys
-from pathlib import Path
 
 import pandas
 import pyproj
 import requests
-from pandarallel import pandarallel
-from pyproj import Transformer
-
-logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
-
-logger = logging.getLogger("papernest_logger")
-
 
-pandarallel.initialize(nb_workers=os.cpu_count())
+from app.log import logger
+from app.operators import get_operator_registry
+from app.projection import lambert93_to_wgs84, wgs84_to_lambert93
+from app.reverse_geocoder import get_reverse_geocoder
 
 
 def csv_to_dataframe(file):
@@ -34,6 +28,27 @@ def csv_to_dataframe(file):
     return network_cov_dataframe
 
 
+def csv_to_dataframe_chunks(file, chunk_size, skip=0):
+    """
+    Read data file from csv by chunks of fixed size, to keep memory bounded
+    :param file: file
+    :param chunk_size: number of rows per chunk
+    :param skip: number of chunks skipped without being parsed
+    :return: iterator of dataframes
+    """
+    with pandas.read_csv(
+        file,
+        header=0,
+        delimiter=";",
+        chunksize=chunk_size,
+        skiprows=range(1, skip * chunk_size + 1) if skip else None,
+    ) as network_cov_chunks:
+        for network_cov_dataframe in network_cov_chunks:
+            network_cov_dataframe.dropna(subset=["x", "y"], inplace=True)
+            network_cov_dataframe.drop_duplicates(inplace=True)
+            yield network_cov_dataframe
+
+
 def extract_operators(dataframe):
     """
     Extract Operators from dataframe
@@ -43,17 +58,25 @@ def extract_operators(dataframe):
     return dataframe["Operateur"].drop_duplicates().to_list()
 
 
-def add_city_to_dataframe(dataframe):
+def add_city_to_dataframe(dataframe, stage=lambda name: None):
     """
     Add cities to each row, based on lambert 93 coord in each row,
-     using pyproj to convert coords to lat and long first
+     using pyproj to convert the whole x/y columns to lat and long first.
+     Cities are resolved offline when a communes file is configured
+     (COMMUNES_FILE), with the api-adresse reverse service otherwise
     :param dataframe: dataframe
-    :return: dataframe with 3 new cols: lat, lon and city
+    :param stage: called with "geocoding" once projected
+    :return: dataframe with 4 new cols: lat, lon, citycode and city
     """
-    dataframe["lon"], dataframe["lat"] = dataframe.parallel_apply(
-        lambert93_to_lat_long, axis=1, result_type="expand"
-    ).T.values
-    dataframe = get_cities(dataframe.to_csv())
+    dataframe["lon"], dataframe["lat"] = lambert93_to_wgs84(  # pylint: disable=E0633
+        dataframe["x"].to_numpy(), dataframe["y"].to_numpy()
+    )
+    stage("geocoding")
+    reverse_geocoder = get_reverse_geocoder()
+    if reverse_geocoder:
+        dataframe = reverse_geocoder.add_cities(dataframe)
+    else:
+        dataframe = get_cities(dataframe.to_csv())
     dataframe.dropna(inplace=True)
 
     return dataframe
@@ -72,7 +95,7 @@ def get_cities(file):
     """
     Reverse search: retrieve an address from gps coordinates
     :param file: csv file
-    :return: dataframe with city inside
+    :return: dataframe with citycode and city inside
     """
     res = requests.post(  # pylint: disable=W3101
         "https://api-adresse.data.gouv.fr/reverse/csv/",
@@ -80,8 +103,12 @@ def get_cities(file):
     )
     res.raise_for_status()
     data_file = io.StringIO(res.text)
-    dataframe = pandas.read_csv(data_file, header=0, delimiter=",")
-    dataframe.rename(columns={"result_city": "city"}, inplace=True)
+    dataframe = pandas.read_csv(
+        data_file, header=0, delimiter=",", dtype={"result_citycode": str}
+    )
+    dataframe.rename(
+        columns={"result_city": "city", "result_citycode": "citycode"}, inplace=True
+    )
     # remove unwanted columns
     dataframe = dataframe.loc[:, ~dataframe.columns.str.startswith("result")]
     dataframe = dataframe.iloc[:, 1:]
@@ -92,27 +119,11 @@ def lat_long_to_lambert93(lat, lon):
     """
     Not used for this project for the moment
     New way to transform gps coordinates wsg84 to lambert93
-    :param lat: x coord (lat)
-    :param lon: y coord (lon)
+    :param lat: latitude(s)
+    :param lon: longitude(s)
     :return: lambert93 coords
     """
-
-    proj_gps = {"proj": "longlat", "ellps": "WGS84", "datum": "WGS84", "no_defs": True}
-    proj_lambert = {
-        "proj": "lcc",
-        "lat_2": 44,
-        "lat_0": 46.5,
-        "lon_0": 3,
-        "x_0": 700000,
-        "y_0": 6600000,
-        "ellps": "GRS80",
-        "towgs84": "0, 0, 0, 0, 0, 0, 0",
-        "units": "m",
-        "no_defs": True,
-    }
-    transformer = Transformer.from_crs(proj_gps, proj_lambert, always_xy=True)
-    lambert_x, lambert_y = transformer.transform(lat, lon)  # pylint: disable=E0633
-    return lambert_x, lambert_y
+    return wgs84_to_lambert93(lon, lat)
 
 
 def lambert93_to_lat_long_old(lambert_x, lambert_y):
@@ -134,62 +145,24 @@ def lambert93_to_lat_long_old(lambert_x, lambert_y):
 
 def lambert93_to_lat_long(row):
     """
-    New way to transform lambert93 to gps coordinates wsg84
-    :param lambert_x: x coord (lambert93)
-    :param lambert_y: y coord (lambert93)
+    Transform lambert93 to gps coordinates wsg84 for a single row.
+    Prefer app.projection.lambert93_to_wgs84 on whole columns
+    :param row: row with x and y coords (lambert93)
     :return: lon, lat
     """
-    lambert_x, lambert_y = row["x"], row["y"]
-    proj_gps = {"proj": "longlat", "ellps": "WGS84", "datum": "WGS84"}
-    proj_lambert = {
-        "proj": "lcc",
-        "lat_2": 44,
-        "lat_1": 49,
-        "lat_0": 46.5,
-        "lon_0": 3,
-        "x_0": 700000,
-        "y_0": 6600000,
-        "ellps": "GRS80",
-        "towgs84": "0, 0, 0, 0, 0, 0, 0",
-        "units": "m",
-    }
-    # transformer = Transformer.from_crs("epsg:2154", "epsg:4326")
-    transformer = Transformer.from_crs(proj_lambert, proj_gps, proj_lambert)
-    long, lat = transformer.transform(lambert_x, lambert_y)  # pylint: disable=E0633
-    return long, lat
+    long, lat = lambert93_to_wgs84(row["x"], row["y"])  # pylint: disable=E0633
+    return float(long), float(lat)
 
 
 def find_operator(operator):
     """
-    Attempts to match the country of which matches the passed CC
-    and/or MCC/MNC. Prints respective MCC-MNC data if match is found.
-    :param user_mcc: User's desired Mobile Country Code (MCC)
-    :param user_mnc: User's desired Mobile Network Code (MNC)
-    :return:
-    """
-    operator = str(operator)
-    user_mcc = operator[:3]
-    user_mnc = operator[3:]
-    match_found = False
-    match = None
-    path_json = Path("app/resources/mccmnc.json")
-    try:
-        with open(path_json, "r", encoding="utf-8") as json_file:
-            json_data = json.load(json_file)
-
-        if user_mcc and user_mnc:
-            user_mcc = str(user_mcc)
-            user_mnc = str(user_mnc)
-            for country in json_data.keys():
-                if (
-                    user_mcc == json_data[country]["MCC"]
-                    and user_mnc == json_data[country]["MNC"]
-                ):
-                    return json_data[country]["NETWORK"]
-
-        if not match_found:
-            raise ValueError(f"No Match Found for op {operator}")
-    except (IndexError, KeyError, ValueError) as exc:
-        logger.exception(f"Error: The following exception has occurred: {exc}")
-        raise exc
+    Attempts to match the operator of the passed MCC/MNC code.
+    Prefer app.operators.OperatorRegistry.resolve on whole columns
+    :param operator: operator code, MCC followed by MNC (ex: 20801)
+    :return: operator name
+    """
+    match = get_operator_registry().find(operator)
+    if match is None:
+        logger.warning(f"No Match Found for op {operator}")
+        raise ValueError(f"No Match Found for op {operator}")
     return match
@@ -0,0 +1,106 @@
+"""
+Bulk load benchmark module
+
+Compare the rows/second of DataFrame.to_sql (batched INSERTs) against
+app.db.bulk.bulk_insert (COPY on PostgreSQL, executemany elsewhere),
+loading network coverage like rows into a scratch table.
+
+Usage: python -m benchmarks.bulk_load [csv_file] [--database-url URL]
+"""
+import argparse
+import time
+
+from sqlalchemy import (Boolean, Column, Integer, MetaData, String, Table,
+                        create_engine)
+
+from app.db.bulk import bulk_insert
+from app.utils import csv_to_dataframe
+from benchmarks.projection import DEFAULT_FILE
+
+
+def scratch_table(engine):
+    """
+    (Re)create the scratch table
+    :param engine: db engine
+    :return: Table
+    """
+    metadata = MetaData()
+    table = Table(
+        "bench_network_coverage",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("operator", String(50)),
+        Column("city", String(100)),
+        Column("2G", Boolean),
+        Column("3G", Boolean),
+        Column("4G", Boolean),
+    )
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    return table
+
+
+def coverage_rows(file):
+    """
+    Build network coverage like rows from the csv file, without geocoding
+    :param file: csv file
+    :return: dataframe
+    """
+    dataframe = csv_to_dataframe(file)
+    dataframe["operator"] = dataframe["Operateur"].astype(str)
+    dataframe["city"] = (
+        (dataframe["x"] // 5000).astype(str)
+        + "-"
+        + (dataframe["y"] // 5000).astype(str)
+    )
+    return dataframe[["operator", "city", "2G", "3G", "4G"]].astype(
+        {"2G": bool, "3G": bool, "4G": bool}
+    )
+
+
+def bench_to_sql(engine, table, dataframe):
+    """
+    Time DataFrame.to_sql
+    :return: elapsed seconds
+    """
+    start = time.perf_counter()
+    dataframe.to_sql(
+        table.name, con=engine, if_exists="append", index=False, chunksize=1000
+    )
+    return time.perf_counter() - start
+
+
+def bench_bulk_insert(engine, table, dataframe):
+    """
+    Time app.db.bulk.bulk_insert
+    :return: elapsed seconds
+    """
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        bulk_insert(connection, table, dataframe)
+    return time.perf_counter() - start
+
+
+def main():
+    """
+    Run the benchmark and print rows/second for both paths
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("file", nargs="?", default=DEFAULT_FILE)
+    parser.add_argument("--database-url", default="sqlite:///bench_bulk_load.sqlite")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    dataframe = coverage_rows(args.file)
+
+    print(f"{engine.dialect.name}: {len(dataframe)} rows")
+    print(f"{'path':<14}{'seconds':>10}{'rows/s':>12}")
+    for name, bench in (("to_sql", bench_to_sql), ("bulk_insert", bench_bulk_insert)):
+        table = scratch_table(engine)
+        elapsed = bench(engine, table, dataframe)
+        print(f"{name:<14}{elapsed:>10.3f}{len(dataframe) / elapsed:>12.0f}")
+    table.drop(engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Ingest benchmark module
+
+Run crud.save_to_db on csv files and report, for each stage of the pipeline
+(csv reading, projection, city resolution, operator mapping, the write of each
+table and the coverage summary), the wall time, rows/second and peak memory.
+SQLite stands in for PostgreSQL, and cities are resolved offline by a
+LocalReverseGeocoder built on a grid of fake communes (or on a real communes
+file), so runs do not depend on the network.
+
+Timings are the best of a few runs, peak memory (tracemalloc) comes from an
+extra run, as tracing slows the pipeline down. Each run uses a fresh db.
+Results can be saved as baselines and compared between runs.
+
+Usage: python -m benchmarks.ingest [csv_file ...] [--chunk-size N] [--repeat N]
+    [--communes FILE] [--save-baseline] [--compare] [--threshold 0.2]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy
+import pandas
+from sqlalchemy import create_engine
+
+from app import utils
+from app.db import crud
+from app.db.database import Base
+from app.projection import lambert93_to_wgs84
+from app.reverse_geocoder import LocalReverseGeocoder
+from app.utils import csv_to_dataframe
+from benchmarks.projection import DEFAULT_FILE
+
+DEFAULT_FILES = ("app/resources/data_short.csv", DEFAULT_FILE)
+BASELINES_DIR = Path(__file__).parent / "baselines"
+
+
+def grid_geocoder(file, cell=5000):
+    """
+    Reverse geocoder stub: one fake commune every cell meters
+    over the area covered by the file
+    :param file: csv file
+    :param cell: distance (meters) between two communes
+    :return: LocalReverseGeocoder
+    """
+    dataframe = csv_to_dataframe(file)
+    grid_x, grid_y = numpy.meshgrid(
+        numpy.arange(dataframe["x"].min(), dataframe["x"].max() + cell, cell),
+        numpy.arange(dataframe["y"].min(), dataframe["y"].max() + cell, cell),
+    )
+    lon, lat = lambert93_to_wgs84(  # pylint: disable=E0633
+        grid_x.ravel(), grid_y.ravel()
+    )
+    communes = pandas.DataFrame({"lon": lon, "lat": lat})
+    communes["citycode"] = communes.index.astype(str)
+    communes["city"] = "Commune " + communes["citycode"]
+    return LocalReverseGeocoder(communes, max_distance=cell)
+
+
+def sqlite_engine(path):
+    """
+    Create an empty sqlite db with the app tables
+    :param path: sqlite file
+    :return: engine
+    """
+    engine = create_engine(f"sqlite:///{path}").execution_options(
+        schema_translate_map={os.getenv("SCHEMA"): None}
+    )
+    Base.metadata.create_all(engine)
+    return engine
+
+
+def run(file, chunk_size, trace):
+    """
+    Ingest the file into a fresh sqlite db, timing each stage
+    :param file: csv file
+    :param chunk_size: number of rows per chunk
+    :param trace: measure the peak memory of each stage with tracemalloc
+    :return: rows ingested, {stage: {"seconds", "peak_mb"}}
+    """
+    stages = {}
+    current = {"stage": None, "start": None, "rows": 0}
+
+    def progress(stage, rows):
+        now = time.perf_counter()
+        previous = current["stage"]
+        if previous is not None:
+            measure = stages.setdefault(previous, {"seconds": 0.0, "peak_mb": 0.0})
+            measure["seconds"] += now - current["start"]
+            if trace:
+                measure["peak_mb"] = max(
+                    measure["peak_mb"], tracemalloc.get_traced_memory()[1] / 2**20
+                )
+                tracemalloc.reset_peak()
+        current.update(stage=stage, start=time.perf_counter(), rows=rows)
+
+    with tempfile.TemporaryDirectory() as directory:
+        crud.engine = sqlite_engine(Path(directory) / "ingest.sqlite")
+        if trace:
+            tracemalloc.start()
+        try:
+            with open(file, "rb") as csv_file:
+                crud.save_to_db(csv_file, chunk_size=chunk_size, progress=progress)
+            progress("done", current["rows"])
+        finally:
+            if trace:
+                tracemalloc.stop()
+            crud.engine.dispose()
+    return current["rows"], stages
+
+
+def bench(file, chunk_size, repeat=3):
+    """
+    Benchmark the ingest of a file, keeping the best time of each stage
+    :param file: csv file
+    :param chunk_size: number of rows per chunk
+    :param repeat: number of timed runs
+    :return: json structure, by stage: rows, seconds, rows/s and peak memory (MB)
+    """
+    timings = {}
+    for _ in range(repeat):
+        rows, stages = run(file, chunk_size, trace=False)
+        for stage, measure in stages.items():
+            best = timings.setdefault(stage, measure)
+            best["seconds"] = min(best["seconds"], measure["seconds"])
+    _, memory = run(file, chunk_size, trace=True)
+    results = {
+        stage: {
+            "rows": rows,
+            "seconds": round(measure["seconds"], 4),
+            "rows_per_second": round(rows / measure["seconds"], 1),
+            "peak_mb": round(memory.get(stage, {}).get("peak_mb", 0.0), 2),
+        }
+        for stage, measure in timings.items()
+    }
+    total = sum(measure["seconds"] for measure in timings.values())
+    results["total"] = {
+        "rows": rows,
+        "seconds": round(total, 4),
+        "rows_per_second": round(rows / total, 1),
+        "peak_mb": max(result["peak_mb"] for result in results.values()),
+    }
+    return results
+
+
+def baseline_path(file):
+    """
+    :param file: csv file
+    :return: json file holding the baseline of the file
+    """
+    return BASELINES_DIR / f"ingest_{Path(file).stem}.json"
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results to a baseline
+    :param results: bench results
+    :param baseline: bench results of the baseline
+    :param threshold: relative slowdown or memory growth counted as a regression
+    :return: {stage: (rows/s change, peak memory change)}, regressed stages
+    """
+    changes = {}
+    regressions = []
+    for stage, result in results.items():
+        reference = baseline.get(stage)
+        if not reference:
+            continue
+        speed = result["rows_per_second"] / reference["rows_per_second"] - 1
+        memory = (
+            result["peak_mb"] / reference["peak_mb"] - 1 if reference["peak_mb"] else 0
+        )
+        changes[stage] = (speed, memory)
+        if speed < -threshold or memory > threshold:
+            regressions.append(stage)
+    return changes, regressions
+
+
+def print_results(file, results, changes):
+    """
+    Print the results of a file as a table
+    :param file: csv file
+    :param results: bench results
+    :param changes: changes against the baseline, by stage
+    """
+    print(f"\n{file}")
+    header = f"{'stage':<26}{'rows':>8}{'seconds':>10}{'rows/s':>12}{'peak MB':>10}"
+    if changes:
+        header += f"{'rows/s %':>10}{'peak %':>9}"
+    print(header)
+    for stage, result in results.items():
+        line = (
+            f"{stage:<26}{result['rows']:>8}{result['seconds']:>10.3f}"
+            f"{result['rows_per_second']:>12.0f}{result['peak_mb']:>10.1f}"
+        )
+        if stage in changes:
+            speed, memory = changes[stage]
+            line += f"{speed:>+10.1%}{memory:>+9.1%}"
+        print(line)
+
+
+def main():
+    """
+    Run the benchmark on each file, save or compare baselines
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("files", nargs="*", default=list(DEFAULT_FILES))
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Timed runs, the best one is kept"
+    )
+    parser.add_argument(
+        "--communes",
+        help="Communes csv file for city resolution, a grid of fake communes "
+        "by default",
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="Save results as baselines"
+    )
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="Compare with the baselines, exit with 1 on regression",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Slowdown or memory growth counted as a regression",
+    )
+    args = parser.parse_args()
+
+    regressed = False
+    for file in args.files:
+        if args.communes:
+            geocoder = LocalReverseGeocoder.from_file(args.communes)
+        else:
+            geocoder = grid_geocoder(file)
+        utils.get_reverse_geocoder = lambda geocoder=geocoder: geocoder
+
+        results = bench(file, args.chunk_size, args.repeat)
+        changes = {}
+        if args.compare and baseline_path(file).exists():
+            baseline = json.loads(baseline_path(file).read_text(encoding="utf-8"))
+            changes, regressions = compare(results, baseline, args.threshold)
+            if regressions:
+                regressed = True
+                print(f"Regressions on {file}: {', '.join(regressions)}")
+        print_results(file, results, changes)
+        if args.save_baseline:
+            BASELINES_DIR.mkdir(exist_ok=True)
+            baseline_path(file).write_text(
+                json.dumps(results, indent=2) + "\n", encoding="utf-8"
+            )
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Projection benchmark module
+
+Compare the rows/second of the legacy per-row projection (a new pyproj
+Transformer built for every row) against the batched app.projection engine.
+
+Usage: python -m benchmarks.projection [csv_file] [--legacy-rows N]
+"""
+import argparse
+import time
+
+from pyproj import Transformer
+
+from app.projection import PROJ_GPS, PROJ_LAMBERT93, lambert93_to_wgs84
+from app.utils import csv_to_dataframe
+
+DEFAULT_FILE = (
+    "app/resources/2018_01_Sites_mobiles_2G_3G_4G_France_metropolitaine_L93.csv"
+)
+
+
+def legacy_lambert93_to_lat_long(row):
+    """
+    Per-row projection as it was done before app.projection
+    :param row: row with x and y coords (lambert93)
+    :return: lon, lat
+    """
+    transformer = Transformer.from_crs(PROJ_LAMBERT93, PROJ_GPS, always_xy=True)
+    return transformer.transform(row["x"], row["y"])  # pylint: disable=E0633
+
+
+def bench_legacy(dataframe):
+    """
+    Time the legacy per-row path
+    :param dataframe: dataframe with x and y cols
+    :return: elapsed seconds
+    """
+    start = time.perf_counter()
+    dataframe.apply(legacy_lambert93_to_lat_long, axis=1, result_type="expand")
+    return time.perf_counter() - start
+
+
+def bench_vectorized(dataframe):
+    """
+    Time the batched path
+    :param dataframe: dataframe with x and y cols
+    :return: elapsed seconds
+    """
+    start = time.perf_counter()
+    lambert93_to_wgs84(dataframe["x"].to_numpy(), dataframe["y"].to_numpy())
+    return time.perf_counter() - start
+
+
+def main():
+    """
+    Run the benchmark and print rows/second for both paths
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("file", nargs="?", default=DEFAULT_FILE)
+    parser.add_argument(
+        "--legacy-rows",
+        type=int,
+        default=5000,
+        help="Rows used for the (slow) legacy path, 0 for the whole file",
+    )
+    args = parser.parse_args()
+
+    dataframe = csv_to_dataframe(args.file)
+    legacy_df = dataframe.head(args.legacy_rows) if args.legacy_rows else dataframe
+
+    # warm up the cached transformer so we only measure the conversion
+    lambert93_to_wgs84(dataframe["x"].head(1), dataframe["y"].head(1))
+
+    legacy = bench_legacy(legacy_df)
+    vectorized = bench_vectorized(dataframe)
+    print(f"{'path':<12}{'rows':>10}{'seconds':>12}{'rows/s':>14}")
+    print(
+        f"{'legacy':<12}{len(legacy_df):>10}{legacy:>12.3f}"
+        f"{len(legacy_df) / legacy:>14.0f}"
+    )
+    print(
+        f"{'vectorized':<12}{len(dataframe):>10}{vectorized:>12.3f}"
+        f"{len(dataframe) / vectorized:>14.0f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
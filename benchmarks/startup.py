@@ -0,0 +1,90 @@
+"""
+Startup benchmark module
+
+Measure, in fresh interpreters, the import time and resident memory of an
+api worker in two modes:
+    serving: import app.main only, as a read-only worker does
+    ingest: import app.main, then the ingest stack (app.utils: pandas, pyproj,
+     reverse geocoder) and the radius query stack (scipy), as loaded on first use
+Timings are the best of a few runs, memory is the max RSS of the interpreter.
+
+Usage: python -m benchmarks.startup [--repeat N]
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+HEAVY_MODULES = ("pandas", "pyproj", "scipy", "pandarallel")
+MODES = {
+    "serving": "import app.main",
+    "ingest": "import app.main, app.utils, scipy.spatial",
+}
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+{statement}
+seconds = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": seconds,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": len(sys.modules),
+    "heavy": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure(statement):
+    """
+    Run an import statement in a fresh interpreter
+    :param statement: python statement
+    :return: seconds, max rss (MB), number of modules and heavy modules loaded
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(statement=statement, heavy=HEAVY_MODULES)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def bench(repeat=5):
+    """
+    Benchmark each mode, keeping the best time
+    :param repeat: number of runs per mode
+    :return: json structure, by mode
+    """
+    results = {}
+    for mode, statement in MODES.items():
+        runs = [measure(statement) for _ in range(repeat)]
+        results[mode] = {
+            "seconds": round(min(run["seconds"] for run in runs), 3),
+            "rss_mb": round(min(run["rss_mb"] for run in runs), 1),
+            "modules": runs[0]["modules"],
+            "heavy": runs[0]["heavy"],
+        }
+    return results
+
+
+def main():
+    """
+    Print startup time and memory of each mode
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Runs per mode, the best one is kept"
+    )
+    args = parser.parse_args()
+
+    results = bench(args.repeat)
+    print(f"{'mode':<10}{'seconds':>9}{'RSS MB':>9}{'modules':>9}  heavy modules")
+    for mode, result in results.items():
+        print(
+            f"{mode:<10}{result['seconds']:>9.3f}{result['rss_mb']:>9.1f}"
+            f"{result['modules']:>9}  {', '.join(result['heavy']) or '-'}"
+        )
+
+
+if __name__ == "__main__":
+    main()